@@ -1,12 +1,19 @@
 import streamlit as st
 import pandas as pd
-import joblib
 import os
+import threading
+import functools
 import matplotlib.pyplot as plt
 
-# Importamos la función de predicción
-# Asegúrate de que src.feature_eng tiene prepare_upcoming_matches
-from src.feature_eng import prepare_upcoming_matches
+# Importamos el modelo compilado y las instantáneas de predicciones
+from src.inference import load_compiled_model
+from src.snapshots import (build_snapshot, freeze_started_matches, load_latest_snapshot,
+                           snapshot_hashes, snapshot_paths, file_hash, result_codes)
+from src.leagues import LEAGUES, DEFAULT_LEAGUE, league_paths, available_leagues, fixtures_url
+from src.live import LivePoller, POLL_SECONDS
+from src.api_client import LIVE_STATUSES
+from src.registry import MODEL_CACHE, active_version, list_versions, load_version, version_paths
+from src.profiling import profiled
 
 # Configuración Inicial
 st.set_page_config(page_title="La Quiniela AI", page_icon="⚽", layout="centered")
@@ -44,54 +51,195 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Rutas actualizadas
-MODEL_PATH = 'data/model_winner.pkl'
-FIXTURES_PATH = 'data/laliga_fixtures.csv'
-HISTORY_PATH = 'data/laliga_advanced_stats.csv'
-
-def load_resources():
-    # 1. Cargar Modelo
-    if not os.path.exists(MODEL_PATH):
-        st.error("❌ No se encontró el modelo. Ejecuta src/models.py")
-        return None, None
-    model = joblib.load(MODEL_PATH)
-
-    # 2. Cargar Calendario
-    if not os.path.exists(FIXTURES_PATH):
-        st.error("❌ No hay calendario. Ejecuta src/api_client.py")
-        return model, pd.DataFrame()
+# Rutas: cada liga tiene las suyas (league_paths en src/leagues.py); LaLiga usa las de siempre en data/
+CACHE_ENTRIES = 2 * len(LEAGUES)  # Versión actual + anterior de cada liga
+MATCHDAY_ENTRIES = 50 * CACHE_ENTRIES  # Todas las jornadas de cada versión
+
+# --- CACHÉ COMPARTIDA ENTRE SESIONES ---
+# Todo lo pesado (modelo, features y predicciones) se calcula una vez por versión
+# de los ficheros de entrada y se comparte con todos los visitantes. La clave es la
+# firma (mtime + tamaño) de cada fichero: si el cron los reescribe, se invalida sola.
+def file_signature(path):
+    if not os.path.exists(path):
+        return None
+    st_info = os.stat(path)
+    return (path, st_info.st_mtime_ns, st_info.st_size)
+
+@st.cache_resource
+def cache_stats():
+    """Contadores de aciertos/fallos de la caché (compartidos por todas las sesiones)."""
+    return {'lock': threading.Lock(), 'model': {'hits': 0, 'misses': 0}, 'predictions': {'hits': 0, 'misses': 0},
+            'matchday': {'hits': 0, 'misses': 0}}
+
+def _record(name, missed):
+    stats = cache_stats()
+    with stats['lock']:
+        stats[name]['misses' if missed else 'hits'] += 1
+
+@st.cache_resource(max_entries=CACHE_ENTRIES, show_spinner=False)
+@profiled("app.load_model", rows=None)
+def _load_model(league, model_sig, compiled_sig):
+    _record('model', missed=True)
+    paths = league_paths(league)
+    # Preferimos el modelo compilado (solo NumPy, memory-map); el pickle queda de reserva
+    if compiled_sig is not None:
+        return load_compiled_model(paths['compiled'])
+    import joblib
+    return joblib.load(paths['model'])
+
+@st.cache_resource(max_entries=CACHE_ENTRIES, show_spinner=False)
+@profiled("app.predictions", rows=lambda res: len(res['fixtures']))
+def _load_predictions(league, version, model_sig, fixtures_sig, history_sig, state_sig, snapshot_sig):
+    """
+    Calendario + última instantánea para una versión de los datos, y si la instantánea
+    corresponde a este modelo y a estos datos ('fresh'). Aquí no se predice nada:
+    las predicciones se piden jornada a jornada (_matchday_predictions).
+    """
+    _record('predictions', missed=True)
+    paths = model_paths(league, version)
+    fixtures = pd.read_csv(paths['fixtures'])
+    fixtures['matchday'] = pd.to_numeric(fixtures['matchday'], errors='coerce').fillna(0).astype(int)
+    
+    snapshot = load_latest_snapshot(paths['predictions'])
+    hashes = (file_hash(paths['model']), file_hash(paths['fixtures'], paths['history']))
+    fresh = snapshot is not None and not snapshot.empty and snapshot_hashes(snapshot) == hashes
+    return {'fixtures': fixtures, 'snapshot': snapshot, 'fresh': fresh, 'model_hash': hashes[0]}
+
+@st.cache_resource(max_entries=MATCHDAY_ENTRIES, show_spinner="Calculando predicciones...")
+@profiled("app.matchday_predictions", rows=lambda res: len(res['preds']))
+def _matchday_predictions(league, matchday, version, *signatures):
+    """
+    Predicciones de UNA jornada, memoizadas por jornada y versión de los datos.
+    Se sirven de la instantánea escrita al entrenar si está al día; si no (fallo),
+    se calculan features y predicciones solo para los partidos de esta jornada.
+    """
+    _record('matchday', missed=True)
+    resources = _cached_call('predictions', _load_predictions, league, version, *signatures)
+    snapshot = resources['snapshot']
+    previous = snapshot.loc[snapshot.index == matchday] if snapshot is not None else None
+    if resources['fresh']:
+        return {'preds': previous, 'source': 'snapshot'}
     
-    fixtures = pd.read_csv(FIXTURES_PATH)
-    return model, fixtures
+    # Fallo (u otra versión del modelo): predecimos la jornada con ese modelo
+    paths = league_paths(league)
+    fresh = build_snapshot(load_model(league, version), paths['fixtures'], paths['history'],
+                           model_hash=resources['model_hash'], state_path=paths['state'], matchday=matchday)
+    if version is None:  # Lo ya jugado conserva lo que predijo el modelo en producción
+        fresh = freeze_started_matches(fresh, previous.reset_index(drop=True) if previous is not None else None)
+    return {'preds': fresh.set_index('matchday', drop=False).sort_index(), 'source': 'modelo'}
+
+def _cached_call(name, func, *args):
+    stats = cache_stats()
+    misses = stats[name]['misses']
+    result = func(*args)
+    if stats[name]['misses'] == misses:
+        _record(name, missed=False)
+    return result
+
+def model_paths(league=DEFAULT_LEAGUE, version=None):
+    """Rutas de la liga; con 'version', el modelo (pickle y compilado) es el de esa versión del registro."""
+    paths = league_paths(league)
+    if version is None:
+        return paths
+    registered = version_paths(league, version)
+    return {**paths, 'model': registered['model'], 'compiled': registered['compiled']}
+
+def model_signature(league=DEFAULT_LEAGUE, version=None):
+    paths = model_paths(league, version)
+    return file_signature(paths['model']), file_signature(os.path.join(paths['compiled'], 'meta.json'))
+
+def load_model(league=DEFAULT_LEAGUE, version=None):
+    if version is None:
+        return _cached_call('model', _load_model, league, *model_signature(league))
+    # Versiones del registro: su propia caché LRU acotada por memoria (compartida con el backtest)
+    misses = MODEL_CACHE.misses
+    model = load_version(league, version)
+    _record('model', missed=MODEL_CACHE.misses != misses)
+    return model
+
+def data_signatures(league=DEFAULT_LEAGUE, version=None):
+    """Firmas de todos los ficheros de los que dependen las predicciones de una liga."""
+    paths = league_paths(league)
+    snapshots = snapshot_paths(paths['predictions'])
+    latest_snapshot = file_signature(snapshots[-1]) if snapshots else None
+    return (model_signature(league, version), file_signature(paths['fixtures']),
+            file_signature(paths['history']), file_signature(paths['state']), latest_snapshot)
 
+@profiled("app.load_resources", rows=None)
+def load_resources(league=DEFAULT_LEAGUE, version=None):
+    paths = league_paths(league)
+    # 1. Comprobar Modelo
+    if not os.path.exists(paths['model']):
+        st.error(f"❌ No se encontró el modelo. Ejecuta src/models.py --leagues {league}")
+        return None
+
+    # 2. Comprobar Calendario
+    if not os.path.exists(paths['fixtures']):
+        st.error(f"❌ No hay calendario. Ejecuta src/api_client.py --leagues {league}")
+        return None
+    
+    # 3. Calendario e instantánea (de la caché si los ficheros no han cambiado)
+    return _cached_call('predictions', _load_predictions, league, version, *data_signatures(league, version))
+
+def load_matchday(league, matchday, version=None):
+    """Predicciones de una jornada (de la caché si ya se pidió con estos ficheros)."""
+    return _cached_call('matchday', _matchday_predictions, league, int(matchday), version,
+                        *data_signatures(league, version))
+
+def select_league():
+    """Selector de liga en la barra lateral (solo si hay más de una con modelo)."""
+    leagues = available_leagues() or [DEFAULT_LEAGUE]
+    if len(leagues) == 1:
+        return leagues[0]
+    return st.sidebar.selectbox("🏆 Liga", leagues, format_func=lambda code: LEAGUES[code]['name'])
+
+def select_version(league):
+    """
+    Selector de versión del modelo (solo si hay más de una en el registro).
+    None = el modelo en producción, que es el que tiene instantánea.
+    """
+    versions = list_versions(league)
+    if len(versions) <= 1:
+        return None
+    active = active_version(league)
+    options = [None] + [v for v in reversed(versions) if v != active]
+    return st.sidebar.selectbox("🧠 Modelo", options, key=f"model_{league}",
+                                format_func=lambda v: f"En producción ({active or 'actual'})" if v is None else v)
+
+@st.cache_resource(show_spinner=False)
+def live_poller(league):
+    """Un único hilo de directo por liga para todo el servidor (no uno por visitante)."""
+    return LivePoller(league).start()
+
+def show_cache_stats():
+    stats = cache_stats()
+    with st.sidebar.expander("⚙️ Caché"):
+        for name in ['model', 'predictions', 'matchday']:
+            st.caption(f"{name}: {stats[name]['hits']} aciertos / {stats[name]['misses']} fallos")
+
+@profiled("app.render", rows=None)
 def main():
     st.title("⚽ La Quiniela IA (Versión Experta)")
     
-    model, df_fixtures = load_resources()
-    if not model or df_fixtures.empty:
-        return
-
-    # Preparar datos para la IA
-    # Le pasamos el calendario y el historial para que calcule rachas y H2H
+    league = select_league()
+    version = select_version(league)
+    
+    # Preparar datos para la IA (compartidos entre sesiones, no se tocan aquí)
     try:
-        # DESEMPAQUETAMOS LOS DOS VALORES
-        X_pred, matches_info = prepare_upcoming_matches(df_fixtures, HISTORY_PATH)
+        resources = load_resources(league, version)
     except Exception as e:
         st.error(f"Error procesando datos: {e}")
         return
-
-    # Verificamos si X_pred es válido y no está vacío
-    if X_pred is None or X_pred.empty:
-        st.info("📅 Calendario actualizado, pero no hay datos suficientes para predecir (quizás inicio de temporada o equipos nuevos).")
+    if resources is None:
+        return
+    show_cache_stats()
+    
+    df_fixtures = resources['fixtures']
+    if df_fixtures.empty:
         return
-
-    # Predecir
-    predictions = model.predict(X_pred)
-    probs = model.predict_proba(X_pred)
 
     # --- LÓGICA DE JORNADA ---
-    # Igual que antes: Buscamos la próxima jornada activa
-    df_fixtures['matchday'] = pd.to_numeric(df_fixtures['matchday'], errors='coerce').fillna(0).astype(int)
+    # Por defecto, la próxima jornada activa; el usuario puede moverse a cualquier otra
     pending = df_fixtures[df_fixtures['status'] != 'FINISHED']
     
     if not pending.empty:
@@ -101,53 +249,108 @@ def main():
     else:
         active_matchday = df_fixtures['matchday'].max()
     
-    indices_predichos = X_pred.index
-    matches_to_show = df_fixtures.loc[indices_predichos]
+    matchdays = sorted(int(m) for m in df_fixtures['matchday'].unique() if m > 0)
+    selected = st.select_slider("📅 Jornada", options=matchdays, value=int(active_matchday), key=f"matchday_{league}")
     
-    # Filtramos por jornada activa
-    matches_to_show = matches_to_show[matches_to_show['matchday'] == active_matchday]
+    # Solo se predice (y se memoiza) la jornada elegida
+    try:
+        preds = load_matchday(league, selected, version)['preds']
+    except Exception as e:
+        st.error(f"Error procesando datos: {e}")
+        return
+    
+    # Verificamos si hay predicciones
+    if preds is None or preds.empty:
+        st.info(f"📅 Calendario actualizado, pero no hay predicciones para la Jornada {selected} (quizás inicio de temporada o equipos nuevos).")
+        return
 
+    matches_to_show = matchday_matches(df_fixtures, preds, selected)
     if matches_to_show.empty:
-        st.info(f"No hay predicciones disponibles para la Jornada {active_matchday}.")
+        st.info(f"No hay predicciones disponibles para la Jornada {selected}.")
         return
 
-    st.markdown(f"<h3 style='text-align:center; margin-bottom: 20px;'>Jornada {active_matchday}</h3>", unsafe_allow_html=True)
+    st.markdown(f"<h3 style='text-align:center; margin-bottom: 20px;'>Jornada {selected}</h3>", unsafe_allow_html=True)
+    show_accuracy(matches_to_show)
 
     # --- RENDERIZADO VISUAL ---
-    # Iteramos por los partidos filtrados
-    for idx, row in matches_to_show.iterrows():
-        # Buscamos la predicción correspondiente a este índice
-        # Como X_pred y matches_to_show comparten índice, podemos buscar por posición relativa
-        
-        loc_idx = X_pred.index.get_loc(idx)
-        
-        pred = predictions[loc_idx]
-        prob = probs[loc_idx]
-        
-        p1, pX, p2 = prob[0]*100, prob[1]*100, prob[2]*100
-        winner_code = "1" if pred == 0 else ("X" if pred == 1 else "2")
-        confidence = max(prob) * 100
-        color_class = f"pred-{winner_code}"
-        
-        status = row.get('status', 'SCHEDULED')
-        status_html = ""
-        result_display = "vs"
-        
-        if status in ['IN_PLAY', 'PAUSED', 'LIVE']:
-            status_html = "<span class='status-badge status-LIVE'>EN JUEGO</span>"
-        elif status == 'FINISHED':
-            status_html = "<span class='status-badge status-FINISHED'>FINALIZADO</span>"
-            result_display = row.get('real_result', 'vs')
-
-        st.markdown(f"""
+    live = selected == active_matchday and fixtures_url(league) is not None and st.sidebar.toggle(
+        "🔴 En directo", help=f"Marcadores en directo (se actualizan cada {POLL_SECONDS}s sin recargar la página)")
+    if live:
+        live_board(league, df_fixtures, preds, selected)
+    else:
+        render_cards(matches_to_show)
+
+def show_accuracy(matches):
+    """
+    Jornadas (o partidos) ya jugados: aciertos de la IA frente al resultado real.
+    Solo cuentan las predicciones hechas antes del inicio (las regeneradas después no).
+    """
+    finished = matches[(matches['status'] == 'FINISHED') & matches['pre_kickoff'].eq(True)]
+    outcome = result_codes(finished['real_result'])
+    played = pd.notna(outcome)
+    if not played.any():
+        return
+    hits = int((outcome[played] == finished['pred'].to_numpy()[played]).sum())
+    total = int(played.sum())
+    st.markdown(f"<p style='text-align:center; color:#bbb;'>🎯 Aciertos de la IA: <b>{hits}/{total}</b> "
+                f"({hits / total:.0%})</p>", unsafe_allow_html=True)
+
+def matchday_matches(df_fixtures, preds, matchday):
+    """Partidos de una jornada: estado/resultado del calendario + predicción (indexada por jornada)."""
+    # Lectura por índice de la jornada + estado/resultado del calendario
+    matchday_preds = preds.loc[preds.index == matchday, ['home_team', 'away_team', 'p1', 'pX', 'p2', 'pred',
+                                                         'pre_kickoff']]
+    return df_fixtures[df_fixtures['matchday'] == matchday].merge(
+        matchday_preds, on=['home_team', 'away_team'], how='inner')
+
+def render_cards(matches):
+    # Todas las tarjetas de la jornada en un único bloque HTML (un solo elemento en la página)
+    cards = [card_html(row.date_str, row.status, row.home_team, row.away_team, row.real_result,
+                       row.p1, row.pX, row.p2, row.pred) for row in matches.itertuples(index=False)]
+    st.markdown("".join(cards), unsafe_allow_html=True)
+
+@st.fragment(run_every=POLL_SECONDS)
+def live_board(league, df_fixtures, preds, matchday):
+    """
+    Directo: solo este bloque se vuelve a ejecutar cada POLL_SECONDS (no toda la página).
+    Lee el estado en memoria del hilo compartido, y el HTML de las tarjetas está memoizado:
+    solo se regeneran las que han cambiado de estado o marcador.
+    """
+    poller = live_poller(league)
+    render_cards(matchday_matches(poller.apply(df_fixtures), preds, matchday))
+    if poller.last_poll:
+        st.caption(f"🔴 En directo · última consulta {pd.Timestamp(poller.last_poll, unit='s', tz='UTC').tz_convert('Europe/Madrid'):%H:%M:%S}")
+    else:
+        st.caption("🔴 En directo · sin partidos en juego ahora mismo")
+
+@functools.lru_cache(maxsize=1024)
+def card_html(date_str, status, home_team, away_team, real_result, p1, pX, p2, winner_code):
+    """HTML de una tarjeta (memoizado: una tarjeta que no cambia no se vuelve a generar)."""
+    # La instantánea ya trae probabilidades y quiniela de cada partido
+    p1, pX, p2 = p1*100, pX*100, p2*100
+    confidence = max(p1, pX, p2)
+    color_class = f"pred-{winner_code}"
+    
+    status_html = ""
+    result_display = "vs"
+    
+    if status in LIVE_STATUSES:
+        status_html = "<span class='status-badge status-LIVE'>EN JUEGO</span>"
+        if isinstance(real_result, str) and real_result != "-":
+            result_display = real_result
+    elif status == 'FINISHED':
+        status_html = "<span class='status-badge status-FINISHED'>FINALIZADO</span>"
+        result_display = real_result if isinstance(real_result, str) else 'vs'
+
+    return f"""
 <div class="match-card">
 <div style="text-align:center; color:#aaa; font-size:0.8em; margin-bottom:5px;">
-{row['date_str']} {status_html}
+{date_str} {status_html}
 </div>
 <div class="team-row">
-<div style="flex:1; text-align:right; font-weight:bold; font-size:1.1em;">{row['home_team']}</div>
+<div style="flex:1; text-align:right; font-weight:bold; font-size:1.1em;">{home_team}</div>
 <div class="vs" style="color:white; font-size:1.2em;">{result_display}</div>
-<div style="flex:1; text-align:left; font-weight:bold; font-size:1.1em;">{row['away_team']}</div>
+<div style="flex:1; text-align:left; font-weight:bold; font-size:1.1em;">{away_team}</div>
 </div>
 <div style="display:flex; justify-content:center; align-items:center; gap:10px; margin-top:10px;">
 <span style="font-size:0.8em; color:#bbb;">IA:</span>
@@ -165,7 +368,7 @@ def main():
 <span>2: {p2:.0f}%</span>
 </div>
 </div>
-""", unsafe_allow_html=True)
+"""
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
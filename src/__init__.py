@@ -1,8 +1,20 @@
 # Esto permite que desde app.py poder hacer:
 # from src import prepare_data, train_and_evaluate
+# Los imports son perezosos: 'python -m src' no carga sklearn si no hay que entrenar.
+import importlib
 
-from .feature_eng import prepare_data, prepare_upcoming_matches
-from .models import train_and_evaluate
-from .stats_scraper import fetch_technical_stats
+_EXPORTS = {
+    'prepare_data': '.feature_eng',
+    'prepare_upcoming_matches': '.feature_eng',
+    'train_and_evaluate': '.models',
+    'fetch_technical_stats': '.stats_scraper',
+    'predict_matchups': '.matchups',
+    'league_matrix': '.matchups',
+}
 
-__version__ = '2.0.0'
\ No newline at end of file
+__version__ = '2.0.0'
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,10 @@
+# python -m src -> pipeline diario completo (ver pipeline.py)
+import os
+import sys
+
+# Truco para imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pipeline import main
+
+main()
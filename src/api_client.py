@@ -3,115 +3,248 @@ import requests
 import pandas as pd
 import logging
 import os
+import time
+import threading
+import argparse
+import sys
+
+# Truco para imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from teams import canonical_teams, quiet_unknown_teams
+from leagues import LEAGUES, DEFAULT_LEAGUE, league_paths, fixtures_url
+from profiling import profiled
+from match_db import store
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # esta es mi api key para la api de football-data.org
 API_KEY = "0f3d6700ed56499eaa6f67d1250a6901"
-BASE_URL = "https://api.football-data.org/v4/competitions/PD/matches"
+BASE_URL = fixtures_url(DEFAULT_LEAGUE)
 
 DATA_DIR = "data"
 os.makedirs(DATA_DIR, exist_ok=True)
 
-# Mapeo de nombre de equipos de la api a los nombres usados por el modelo
-API_TO_MODEL_MAPPING = {
-    "Athletic Club": "Athletic Bilbao",
-    "Club Atlético de Madrid": "Atletico Madrid",
-    "CA Osasuna": "Osasuna",
-    "FC Barcelona": "Barcelona",
-    "Getafe CF": "Getafe",
-    "Girona FC": "Girona",
-    "Rayo Vallecano de Madrid": "Rayo Vallecano",
-    "RC Celta de Vigo": "Celta de Vigo",
-    "RCD Espanyol de Barcelona": "Espanyol",
-    "RCD Mallorca": "Mallorca",
-    "Real Betis Balompié": "Real Betis",
-    "Real Madrid CF": "Real Madrid",
-    "Real Sociedad de Fútbol": "Real Sociedad",
-    "Real Valladolid CF": "Real Valladolid",
-    "Sevilla FC": "Sevilla",
-    "Valencia CF": "Valencia",
-    "Villarreal CF": "Villarreal",
-    "Deportivo Alavés": "Alaves",
-    "UD Las Palmas": "Las Palmas",
-    "CD Leganés": "Leganes",
-    "Elche CF": "Elche",
-    "Levante UD": "Levante",
-    "Real Oviedo": "Real Oviedo",
-}
+# Límite del plan gratuito de football-data.org: 10 peticiones por minuto
+REQUESTS_PER_MINUTE = 10
+REQUEST_TIMEOUT = 15
+MAX_RETRIES = 4
+FIXTURES_PATH = os.path.join(DATA_DIR, "laliga_fixtures.csv")
+LIVE_STATUSES = ("IN_PLAY", "PAUSED", "LIVE")
+FIXTURE_COLUMNS = ["match_id", "matchday", "utc_date", "date_str", "status", "home_team", "away_team", "real_result"]
+
+class TokenBucket:
+    """Limitador de peticiones: 'capacity' fichas que se rellenan a 'rate' por segundo."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Bloquea hasta que haya una ficha disponible y la consume."""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def drain(self, seconds):
+        """La API nos dice que esperemos: vaciamos el cubo durante 'seconds'."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, -seconds * self.rate + 1)
+
+RATE_LIMITER = TokenBucket(rate=REQUESTS_PER_MINUTE / 60.0, capacity=REQUESTS_PER_MINUTE)
+
+def _api_request(url, params=None, limiter=RATE_LIMITER, session=None, headers=None):
+    """GET a la API respetando la cuota (token bucket) con reintentos y backoff. Devuelve la respuesta."""
+    session = session or requests
+    headers = {'X-Auth-Token': API_KEY, **(headers or {})}
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            response = session.get(url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            if attempt == MAX_RETRIES:
+                raise
+            wait = 2 ** attempt
+            logger.warning(f"Error de red ({e}), reintento en {wait}s...")
+            time.sleep(wait)
+            continue
+        
+        # La API indica cuántas peticiones quedan y cuándo se reinicia el contador
+        reset = response.headers.get('X-RequestCounter-Reset') or response.headers.get('Retry-After')
+        if response.headers.get('X-Requests-Available-Minute') == '0' and reset:
+            limiter.drain(float(reset))
+        
+        if response.status_code == 429 or response.status_code >= 500:
+            if attempt == MAX_RETRIES:
+                response.raise_for_status()
+            wait = float(reset) if (response.status_code == 429 and reset) else 2 ** attempt
+            logger.warning(f"API respondió {response.status_code}, reintento en {wait:.0f}s...")
+            if response.status_code == 429:
+                # Cuota agotada: la espera la hace el propio limitador (así no se espera dos veces)
+                limiter.drain(wait)
+            else:
+                time.sleep(wait)
+            continue
+        
+        response.raise_for_status()
+        return response
+
+@profiled("api.request", rows=None)
+def api_get(url, params=None, limiter=RATE_LIMITER, session=None):
+    """GET a la API respetando la cuota (token bucket) con reintentos y backoff."""
+    return _api_request(url, params, limiter, session).json()
+
+@profiled("api.request_conditional", rows=None)
+def api_get_if_changed(url, params=None, etag=None, limiter=RATE_LIMITER, session=None):
+    """
+    GET condicional (If-None-Match): devuelve (datos, etag), con datos = None si la
+    respuesta no ha cambiado desde 'etag' (304, sin cuerpo que descargar ni parsear).
+    """
+    response = _api_request(url, params, limiter, session, {'If-None-Match': etag} if etag else None)
+    if response.status_code == 304:
+        return None, etag
+    return response.json(), response.headers.get('ETag')
+
+@profiled("api.parse")
+def parse_matches(data, live_scores=False):
+    """
+    Convierte la respuesta de la API en el DataFrame del calendario (sin bucles por partido).
+    Con live_scores=True también se rellena el marcador de los partidos en juego.
+    """
+    raw = pd.json_normalize(data.get('matches', []))
+    required = ['id', 'matchday', 'utcDate', 'status', 'homeTeam.name', 'awayTeam.name']
+    if raw.empty or any(c not in raw.columns for c in required):
+        return pd.DataFrame(columns=FIXTURE_COLUMNS)
+    raw = raw.dropna(subset=required)
+    for col in ['score.fullTime.home', 'score.fullTime.away']:
+        if col not in raw.columns:
+            raw[col] = None
+    
+    # Corrección Hora Madrid (vectorizada)
+    ts_madrid = pd.to_datetime(raw['utcDate'], utc=True).dt.tz_convert('Europe/Madrid')
+    
+    # Resultados de los partidos ya jugados (solo si el partido ya se jugó)
+    score_home = pd.to_numeric(raw['score.fullTime.home'], errors='coerce').astype('Int64').astype(object)
+    score_away = pd.to_numeric(raw['score.fullTime.away'], errors='coerce').astype('Int64').astype(object)
+    score_home = score_home.where(score_home.notna(), "").astype(str)
+    score_away = score_away.where(score_away.notna(), "").astype(str)
+    with_score = ['FINISHED'] + (list(LIVE_STATUSES) if live_scores else [])
+    result_str = (score_home + "-" + score_away).where(raw['status'].isin(with_score) & (score_home != ""), "-")
+    
+    df = pd.DataFrame({
+        "match_id": raw['id'].astype(int),
+        "matchday": raw['matchday'].astype(int),
+        "utc_date": raw['utcDate'], # Vital para ordenar por fechas
+        "date_str": ts_madrid.dt.strftime("%d/%m %H:%M"),
+        "status": raw['status'], # SCHEDULED, FINISHED, etc.
+        "home_team": canonical_teams(raw['homeTeam.name']).astype(str),
+        "away_team": canonical_teams(raw['awayTeam.name']).astype(str),
+        "real_result": result_str,
+    })
+    return df.reset_index(drop=True)
+
+def upsert_fixtures(existing, updates):
+    """Sustituye por match_id los partidos que han cambiado y añade los nuevos."""
+    if existing.empty:
+        merged = updates
+    else:
+        merged = pd.concat([existing, updates], ignore_index=True)
+        merged = merged.drop_duplicates(subset='match_id', keep='last')
+    return merged.sort_values(by=['matchday', 'utc_date']).reset_index(drop=True)
+
+def save_fixtures(df, output_path=FIXTURES_PATH):
+    # Ordenamos por Jornada y fecha
+    df = df.sort_values(by=['matchday', 'utc_date'])
+    df[FIXTURE_COLUMNS].to_csv(output_path, index=False)
 
 # Función principal para obtener el calendario completo de La Liga
-def fetch_fixtures():
-    headers = {'X-Auth-Token': API_KEY}
+@profiled("api.fetch_fixtures")
+def fetch_fixtures(base_url=BASE_URL, output_path=FIXTURES_PATH, league=DEFAULT_LEAGUE, persist=True):
     # pido todo el calendario de la temporada, todas las jornadas
-    
+    # (persist=False: solo el CSV, la base de datos la escribe después quien llama)
     try:
         logger.info("Descargando calendario COMPLETO de la temporada...")
-       # me conecto a la api y obtengo los datos
-        response = requests.get(BASE_URL, headers=headers)
-        # verifico el estado de la respuesta
-        response.raise_for_status()
-        data = response.json()
-        matches = []
-        
-        # recorro cada partido obtenido
-        for match in data.get('matches', []):
-            try:
-                matchday = match['matchday']
-                utc_date = match['utcDate']
-                status = match['status'] # SCHEDULED, FINISHED, etc.
-                
-                # Corrección Hora Madrid
-                ts = pd.Timestamp(utc_date)
-                ts_madrid = ts.tz_convert('Europe/Madrid')
-                date_str = ts_madrid.strftime("%d/%m %H:%M")
-                
-                # equipos y lugar del partido
-                home_api = match['homeTeam']['name']
-                away_api = match['awayTeam']['name']
-                
-                home = API_TO_MODEL_MAPPING.get(home_api, home_api)
-                away = API_TO_MODEL_MAPPING.get(away_api, away_api)
-                
-                # Resultados de los partidos ya jugados
-                score_home = match['score']['fullTime']['home']
-                score_away = match['score']['fullTime']['away']
-                
-                # manejo los nulos
-                if score_home is None: score_home = ""
-                if score_away is None: score_away = ""
-                
-                # el resultado solo si el partido ya se jugo
-                result_str = f"{score_home}-{score_away}" if status == 'FINISHED' else "-"
-
-                # guardo toda la info del partido
-                matches.append({
-                    "matchday": matchday,
-                    "utc_date": utc_date, # Vital para ordenar por fechas
-                    "date_str": date_str,
-                    "status": status,
-                    "home_team": home,
-                    "away_team": away,
-                    "real_result": result_str
-                })
-            except Exception as e:
-                continue
-        # creo el dataframe con todos los partidos        
-        df = pd.DataFrame(matches)
+        df = parse_matches(api_get(base_url))
         
         # guardo el calendario completo en un csv
-        output_path = os.path.join(DATA_DIR, "laliga_fixtures.csv")
         if not df.empty:
-            # Ordenamos por Jornada y fecha
-            df = df.sort_values(by=['matchday', 'utc_date'])
-            df.to_csv(output_path, index=False)
+            save_fixtures(df, output_path)
+            if persist:
+                store('fixtures', df, league)
             logger.info(f"Temporada completa guardada: {len(df)} partidos (Jornadas 1-38).")
         else:
             logger.warning("La API devolvió 0 partidos.")
+        return df
             
     except Exception as e:
         logger.error(f"Error en API: {e}")
+        return pd.DataFrame()
+
+@profiled("api.sync_fixtures")
+def sync_fixtures(base_url=BASE_URL, output_path=FIXTURES_PATH, date_from=None, date_to=None, league=DEFAULT_LEAGUE,
+                  persist=True):
+    """
+    Sincronización incremental: pide solo la ventana [date_from, date_to]
+    (por defecto de hace 3 días a dentro de 7) y actualiza esos partidos por match_id.
+    Si no hay calendario previo con match_id, descarga la temporada completa.
+    """
+    if not os.path.exists(output_path):
+        return fetch_fixtures(base_url, output_path, league, persist)
+    existing = pd.read_csv(output_path)
+    if 'match_id' not in existing.columns:
+        logger.info("Calendario sin match_id, hace falta una descarga completa.")
+        return fetch_fixtures(base_url, output_path, league, persist)
+
+    today = pd.Timestamp.now(tz='UTC').normalize()
+    date_from = date_from or (today - pd.Timedelta(days=3)).strftime("%Y-%m-%d")
+    date_to = date_to or (today + pd.Timedelta(days=7)).strftime("%Y-%m-%d")
+    try:
+        logger.info(f"Sincronizando partidos del {date_from} al {date_to}...")
+        updates = parse_matches(api_get(base_url, params={'dateFrom': date_from, 'dateTo': date_to}))
+    except Exception as e:
+        logger.error(f"Error en API: {e}")
+        return existing
+    
+    if updates.empty:
+        logger.info("Sin partidos en la ventana, nada que actualizar.")
+        return existing
+    
+    merged = upsert_fixtures(existing, updates)
+    save_fixtures(merged, output_path)
+    if persist:
+        store('fixtures', updates, league)  # En la base de datos basta con la ventana descargada
+    logger.info(f"Calendario actualizado: {len(updates)} partidos sincronizados ({len(merged)} en total).")
+    return merged
 
 if __name__ == "__main__":
-    fetch_fixtures()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Descarga el calendario de LaLiga")
+    parser.add_argument("--incremental", action="store_true", help="Solo la ventana de fechas cercana")
+    parser.add_argument("--leagues", nargs="+", choices=list(LEAGUES), default=[DEFAULT_LEAGUE],
+                        help="Ligas de las que descargar el calendario")
+    args = parser.parse_args()
+    for league in args.leagues:
+        base_url, output_path = fixtures_url(league), league_paths(league)['fixtures']
+        if base_url is None:
+            logger.warning(f"⚠️ {LEAGUES[league]['name']} no está disponible en la API, sin calendario.")
+            continue
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with quiet_unknown_teams(league != DEFAULT_LEAGUE):
+            if args.incremental:
+                sync_fixtures(base_url, output_path, league=league)
+            else:
+                fetch_fixtures(base_url, output_path, league)
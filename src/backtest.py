@@ -0,0 +1,261 @@
+# Backtest walk-forward: para cada jornada histórica se entrena SOLO con los partidos
+# anteriores y se predice esa jornada, como si estuviéramos en ese momento.
+# Las features se calculan una única vez (ya son "point in time": medias con shift(1),
+# H2H solo con partidos previos) y los folds se reparten entre procesos.
+# Uso: python src/backtest.py [--mode fast] [--workers 4] [--league SP1] [--version V | --compare]
+import pandas as pd
+import numpy as np
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Truco para imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sklearn.metrics import accuracy_score, log_loss
+from threadpoolctl import threadpool_limits
+from feature_eng import prepare_data
+from leagues import DEFAULT_LEAGUE, league_paths
+from models import TRAINING_MODES, fit_with_params, load_training_meta
+from registry import list_versions, load_version, load_version_meta
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BACKTEST_DIR = "data/backtest"
+MIN_TRAIN_MATCHES = 380   # Una temporada entera antes de empezar a predecir
+CALIBRATION_BINS = 10
+CLASSES = [0, 1, 2]       # 1 / X / 2
+
+# Hiperparámetros fijos por modo si no hay una búsqueda guardada para ese modo
+# (buscar en cada fold convertiría minutos en horas)
+DEFAULT_PARAMS = {
+    'fast': {'learning_rate': 0.05, 'max_depth': 3, 'max_leaf_nodes': 15,
+             'min_samples_leaf': 20, 'l2_regularization': 0.1},
+    'full': {'n_estimators': 100, 'learning_rate': 0.05, 'max_depth': 3,
+             'subsample': 0.8, 'min_samples_leaf': 4},
+}
+
+def assign_matchdays(dates):
+    """
+    El histórico no trae número de jornada: agrupamos por semanas de martes a lunes
+    (una jornada de liga va de viernes a lunes). Devuelve el martes de inicio de cada semana.
+    """
+    return pd.to_datetime(dates).dt.to_period('W-MON').dt.start_time
+
+def assign_seasons(dates):
+    """Temporada de cada partido: de julio a junio ('2024/25')."""
+    dates = pd.to_datetime(dates)
+    start = dates.dt.year - (dates.dt.month < 7)
+    return start.astype(str) + "/" + ((start + 1) % 100).astype(str).str.zfill(2)
+
+def backtest_params(mode, model_path=None, league=DEFAULT_LEAGUE, version=None):
+    """
+    Hiperparámetros de la última búsqueda (si se hizo en el mismo modo) o los de DEFAULT_PARAMS.
+    Con 'version', los de esa versión del registro (que debe ser del mismo modo).
+    """
+    if version:
+        meta = load_version_meta(league, version)
+        if meta.get('mode') != mode or not meta.get('best_params'):
+            raise ValueError(f"La versión {version} es del modo {meta.get('mode')}, no de {mode}")
+        return meta['best_params']
+    meta = load_training_meta(model_path) if model_path else None
+    if meta and meta.get('mode') == mode and meta.get('best_params'):
+        return meta['best_params']
+    return DEFAULT_PARAMS[mode]
+
+def build_folds(matchdays, min_train=MIN_TRAIN_MATCHES, step=1):
+    """
+    (inicio, fin) de cada fold sobre las filas ordenadas por fecha: se entrena con
+    [0, inicio) y se predice [inicio, fin). Con step > 1 cada modelo cubre varias jornadas.
+    """
+    starts = np.flatnonzero(np.r_[True, matchdays[1:] != matchdays[:-1]])
+    starts = starts[starts >= min_train]
+    bounds = np.r_[starts[::step], len(matchdays)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+# --- Procesos de trabajo: reciben X/y una sola vez (initializer), no en cada fold ---
+_WORKER = {}
+
+def _init_worker(X, y, mode, params, threads=None):
+    _WORKER.update(X=X, y=y, mode=mode, params=params)
+    logging.getLogger('models').setLevel(logging.WARNING)  # Sin un log por fold
+    if threads:
+        # HistGradientBoosting usa OpenMP con todos los núcleos: con N procesos serían
+        # N x núcleos hilos peleándose por la CPU. Se limita mientras viva el proceso.
+        _WORKER['thread_limits'] = threadpool_limits(limits=threads)
+
+def _run_fold(bounds):
+    start, end = bounds
+    X, y = _WORKER['X'], _WORKER['y']
+    model = fit_with_params(_WORKER['mode'], _WORKER['params'], X[:start], y[:start])
+    probs = np.zeros((end - start, len(CLASSES)))
+    probs[:, np.searchsorted(CLASSES, model.classes_)] = model.predict_proba(X[start:end])
+    return start, end, probs
+
+def calibration_table(y_true, probs, n_bins=CALIBRATION_BINS):
+    """Probabilidad media predicha frente a frecuencia real, por tramos (todas las clases juntas)."""
+    p = probs.ravel()
+    hit = (np.asarray(y_true)[:, None] == np.array(CLASSES)[None, :]).ravel()
+    bins = np.minimum((p * n_bins).astype(int), n_bins - 1)
+    table = pd.DataFrame({'bin': bins, 'p': p, 'hit': hit}).groupby('bin').agg(
+        n=('p', 'size'), mean_pred=('p', 'mean'), freq=('hit', 'mean'))
+    return table
+
+def expected_calibration_error(y_true, probs, n_bins=CALIBRATION_BINS):
+    table = calibration_table(y_true, probs, n_bins)
+    return float((table['n'] * (table['mean_pred'] - table['freq']).abs()).sum() / table['n'].sum())
+
+def season_report(predictions):
+    """Accuracy, log-loss, Brier y error de calibración (ECE) por temporada."""
+    rows = []
+    for season, g in predictions.groupby('season', sort=True):
+        probs = g[['p1', 'pX', 'p2']].to_numpy()
+        y = g['TARGET'].to_numpy()
+        onehot = np.eye(len(CLASSES))[y]
+        rows.append({
+            'season': season,
+            'matches': len(g),
+            'matchdays': g['matchday'].nunique(),
+            'accuracy': accuracy_score(y, probs.argmax(axis=1)),
+            'log_loss': log_loss(y, probs, labels=CLASSES),
+            'brier': float(((probs - onehot) ** 2).sum(axis=1).mean()),
+            'ece': expected_calibration_error(y, probs),
+        })
+    return pd.DataFrame(rows)
+
+def run_backtest(league=DEFAULT_LEAGUE, mode="fast", workers=None, min_train=MIN_TRAIN_MATCHES,
+                 step=1, input_path=None, params=None, version=None):
+    """
+    Backtest walk-forward completo. Devuelve (predicciones por partido, informe por temporada).
+    """
+    if mode not in TRAINING_MODES:
+        raise ValueError(f"Modo de entrenamiento desconocido: {mode} (usa {TRAINING_MODES})")
+    paths = league_paths(league)
+    start_time = time.perf_counter()
+
+    # 1. Features una sola vez (ordenadas por fecha)
+    df = prepare_data(input_path or paths['history'], train_mode=True)
+    if df.empty:
+        logger.error("❌ No hay datos. Ejecuta 'src/stats_scraper.py' primero.")
+        return pd.DataFrame(), pd.DataFrame()
+    df = df.sort_values('date', kind='stable').reset_index(drop=True)
+    df['matchday'] = assign_matchdays(df['date'])
+    df['season'] = assign_seasons(df['date'])
+
+    features = [c for c in df.columns if c not in ['date', 'home_team', 'away_team', 'TARGET', 'matchday', 'season']]
+    X = df[features].to_numpy(dtype=np.float64)
+    y = df['TARGET'].to_numpy()
+    params = params or backtest_params(mode, paths['model'], league, version)
+    folds = build_folds(df['matchday'].to_numpy(), min_train, step)
+    if not folds:
+        logger.error(f"❌ Hacen falta más de {min_train} partidos para el backtest.")
+        return pd.DataFrame(), pd.DataFrame()
+
+    # 2. Un modelo por jornada, en paralelo
+    workers = min(workers or os.cpu_count() or 1, len(folds))
+    logger.info(f"🔁 Backtest {league} ({mode}): {len(folds)} jornadas, {workers} procesos, params {params}")
+    probs = np.full((len(df), len(CLASSES)), np.nan)
+    if workers <= 1:
+        _init_worker(X, y, mode, params)
+        results = map(_run_fold, folds)
+        for start, end, fold_probs in results:
+            probs[start:end] = fold_probs
+    else:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(X, y, mode, params, threads)) as pool:
+            for start, end, fold_probs in pool.map(_run_fold, folds):
+                probs[start:end] = fold_probs
+
+    # 3. Tabla de predicciones y métricas por temporada
+    predicted = ~np.isnan(probs[:, 0])
+    predictions = df.loc[predicted, ['date', 'season', 'matchday', 'home_team', 'away_team', 'TARGET']].copy()
+    predictions[['p1', 'pX', 'p2']] = probs[predicted]
+    predictions['pred'] = probs[predicted].argmax(axis=1)
+    report = season_report(predictions)
+    logger.info(f"⏱️ Backtest terminado en {time.perf_counter() - start_time:.1f}s")
+    return predictions, report
+
+def compare_versions(league=DEFAULT_LEAGUE, versions=None, holdout=0.15, input_path=None):
+    """
+    Puntúa las versiones del registro (por defecto todas) sobre los mismos partidos: el
+    último 'holdout' del histórico actual. Los modelos salen de la caché LRU del registro.
+    'unseen' = partidos posteriores a los datos con los que se entrenó cada versión.
+    """
+    versions = versions or list_versions(league)
+    df = prepare_data(input_path or league_paths(league)['history'], train_mode=True)
+    if df.empty or not versions:
+        return pd.DataFrame()
+    df = df.sort_values('date', kind='stable').reset_index(drop=True)
+    test = df.iloc[int(len(df) * (1 - holdout)):]
+    y = test['TARGET'].to_numpy()
+
+    rows = []
+    for version in versions:
+        meta = load_version_meta(league, version)
+        model = load_version(league, version)
+        features = list(model.feature_names_in_)
+        if any(f not in test.columns for f in features):
+            logger.warning(f"⚠️ {version}: usa features que ya no existen, se omite.")
+            continue
+        probs = np.zeros((len(test), len(CLASSES)))
+        probs[:, np.searchsorted(CLASSES, model.classes_)] = model.predict_proba(test[features])
+        trained_until = pd.Timestamp(meta['last_date']) if meta.get('last_date') else pd.Timestamp.min
+        rows.append({
+            'version': version,
+            'mode': meta.get('mode'),
+            'matches': len(test),
+            'unseen': int((test['date'] > trained_until).sum()),
+            'accuracy': accuracy_score(y, probs.argmax(axis=1)),
+            'log_loss': log_loss(y, probs, labels=CLASSES),
+            'brier': float(((probs - np.eye(len(CLASSES))[y]) ** 2).sum(axis=1).mean()),
+            'ece': expected_calibration_error(y, probs),
+        })
+    return pd.DataFrame(rows)
+
+def save_backtest(predictions, report, league=DEFAULT_LEAGUE, mode="fast", out_dir=BACKTEST_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, f"{league}_{mode}")
+    predictions.to_csv(base + "_predictions.csv", index=False)
+    with open(base + "_report.json", 'w') as f:
+        json.dump(report.to_dict(orient='records'), f, indent=2)
+    logger.info(f"💾 Backtest guardado en {base}_*.csv/json")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest walk-forward jornada a jornada")
+    parser.add_argument("--league", default=DEFAULT_LEAGUE)
+    parser.add_argument("--mode", choices=TRAINING_MODES, default="fast")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos (por defecto, todos los núcleos)")
+    parser.add_argument("--min-train", type=int, default=MIN_TRAIN_MATCHES,
+                        help="Partidos mínimos de entrenamiento antes del primer fold")
+    parser.add_argument("--step", type=int, default=1, help="Jornadas predichas por cada modelo")
+    parser.add_argument("--save", action="store_true", help=f"Guardar predicciones e informe en {BACKTEST_DIR}")
+    parser.add_argument("--version", help="Hiperparámetros de esta versión del registro")
+    parser.add_argument("--compare", action="store_true",
+                        help="Comparar las versiones del registro sobre los últimos partidos (sin reentrenar)")
+    args = parser.parse_args()
+
+    if args.compare:
+        comparison = compare_versions(args.league)
+        print("\n🗂️ VERSIONES DEL REGISTRO (mismos partidos)")
+        print(comparison.to_string(index=False, float_format=lambda x: f"{x:.4f}") if not comparison.empty
+              else "Sin versiones registradas.")
+        sys.exit(0)
+
+    predictions, report = run_backtest(args.league, args.mode, args.workers, args.min_train, args.step,
+                                       version=args.version)
+    if not report.empty:
+        print("\n📅 BACKTEST POR TEMPORADA")
+        print(report.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+        total = season_report(predictions.assign(season='TOTAL'))
+        print(total.to_string(index=False, header=False, float_format=lambda x: f"{x:.4f}"))
+        print("\n🎯 CALIBRACIÓN (probabilidad predicha vs frecuencia real)")
+        print(calibration_table(predictions['TARGET'], predictions[['p1', 'pX', 'p2']].to_numpy())
+              .to_string(float_format=lambda x: f"{x:.3f}"))
+        if args.save:
+            save_backtest(predictions, report, args.league, args.mode)
@@ -0,0 +1,427 @@
+# Benchmarks de rendimiento del pipeline
+# Uso: python src/benchmark.py [--suite pipeline | training | inference | all] [--output res.json] [--baseline base.json]
+import pandas as pd
+import numpy as np
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Truco para imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from feature_eng import (calculate_h2h_balance, get_h2h_balance, load_match_history, normalize_names,
+                         calculate_rolling_stats, calculate_rest_days, prepare_data, prepare_upcoming_matches,
+                         rolling_feature_bank, lookup_h2h_balance, sync_team_state)
+import match_db
+from matchups import probability_matrix
+from storage import save_history, columnar_path
+from stage_cache import disable_cache, enable_cache, is_cache_enabled
+from teams import TEAMS, temporary_team_ids
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def _synthetic_stats(rng, n_matches, home_rate=1.5, away_rate=1.1):
+    # Goles, tiros, córners y tarjetas con distribuciones razonables
+    home_shots = rng.poisson(13 * np.sqrt(home_rate / 1.5), n_matches)
+    away_shots = rng.poisson(10 * np.sqrt(away_rate / 1.1), n_matches)
+    return pd.DataFrame({
+        'home_score': rng.poisson(home_rate, n_matches),
+        'away_score': rng.poisson(away_rate, n_matches),
+        'home_shots': home_shots,
+        'away_shots': away_shots,
+        'home_shots_on_target': rng.binomial(home_shots, 0.35),
+        'away_shots_on_target': rng.binomial(away_shots, 0.35),
+        'home_corners': rng.poisson(5, n_matches),
+        'away_corners': rng.poisson(4, n_matches),
+        'home_yellow': rng.poisson(2, n_matches),
+        'away_yellow': rng.poisson(2, n_matches),
+        'home_red': rng.binomial(1, 0.05, n_matches),
+        'away_red': rng.binomial(1, 0.05, n_matches),
+    })
+
+def generate_synthetic_matches(n_matches, n_teams=20, seed=42):
+    """Genera un histórico falso con la misma forma que laliga_advanced_stats.csv."""
+    rng = np.random.default_rng(seed)
+    # Nombres reales del registro mientras alcancen (así no salen avisos de equipos desconocidos)
+    teams = np.array(league_team_names(n_teams))
+
+    home_idx = rng.integers(0, n_teams, n_matches)
+    # Desplazamiento aleatorio para que nunca juegue un equipo contra sí mismo
+    away_idx = (home_idx + rng.integers(1, n_teams, n_matches)) % n_teams
+
+    # Varios partidos por día, como en una jornada real
+    days = np.sort(rng.integers(0, max(n_matches // 5, 1), n_matches))
+    dates = pd.Timestamp("2000-01-01") + pd.to_timedelta(days, unit="D")
+
+    df = _synthetic_stats(rng, n_matches)
+    df.insert(0, 'date', dates)
+    df.insert(1, 'home_team', teams[home_idx])
+    df.insert(2, 'away_team', teams[away_idx])
+    return df
+
+def _round_robin(n_teams):
+    """Calendario de ida y vuelta (método del círculo): lista de jornadas con pares (local, visitante)."""
+    teams = list(range(n_teams)) + ([-1] if n_teams % 2 else [])  # -1 = descansa
+    n = len(teams)
+    first_leg = []
+    for _ in range(n - 1):
+        pairs = [(teams[i], teams[n - 1 - i]) for i in range(n // 2)]
+        first_leg.append([(h, a) for h, a in pairs if h >= 0 and a >= 0])
+        teams = [teams[0], teams[-1]] + teams[1:-1]
+    return first_leg + [[(a, h) for h, a in md] for md in first_leg]
+
+def league_team_names(n_teams, league=0):
+    """Liga 0: nombres reales del registro mientras alcancen; el resto, nombres inventados."""
+    if league == 0:
+        return TEAMS[:n_teams] + [f"Team {i:03d}" for i in range(len(TEAMS), n_teams)]
+    return [f"L{league} Team {i:02d}" for i in range(n_teams)]
+
+def generate_synthetic_league(n_teams=20, n_seasons=5, n_leagues=1, seed=42):
+    """
+    Histórico sintético con la forma de laliga_advanced_stats.csv: n_leagues ligas de
+    n_teams equipos jugando n_seasons temporadas de ida y vuelta (una jornada por semana).
+    Cada equipo tiene una fuerza oculta para que el modelo tenga algo que aprender.
+    """
+    rng = np.random.default_rng(seed)
+    schedule = _round_robin(n_teams)
+    frames = []
+    for league in range(n_leagues):
+        names = np.array(league_team_names(n_teams, league))
+        strength = rng.normal(0, 0.3, n_teams)
+        for season in range(n_seasons):
+            start = pd.Timestamp(f"{2000 + season}-08-15")
+            home = np.concatenate([[h for h, _ in md] for md in schedule])
+            away = np.concatenate([[a for _, a in md] for md in schedule])
+            matchday = np.concatenate([[k] * len(md) for k, md in enumerate(schedule)])
+            # Cada jornada se reparte entre viernes y lunes
+            dates = start + pd.to_timedelta(matchday * 7 + rng.integers(0, 4, len(home)), unit="D")
+            diff = strength[home] - strength[away]
+            df = _synthetic_stats(rng, len(home), home_rate=np.exp(0.35 + diff), away_rate=np.exp(0.1 - diff))
+            df.insert(0, 'date', dates)
+            df.insert(1, 'home_team', names[home])
+            df.insert(2, 'away_team', names[away])
+            frames.append(df)
+    return pd.concat(frames, ignore_index=True).sort_values('date', kind='stable').reset_index(drop=True)
+
+def generate_synthetic_fixtures(history, n_matchdays=2):
+    """Próximas jornadas (formato laliga_fixtures.csv) entre los equipos del histórico."""
+    teams = pd.unique(pd.concat([history['home_team'], history['away_team']]).astype(str))
+    schedule = _round_robin(len(teams))[:n_matchdays]
+    start = pd.Timestamp(history['date'].max()) + pd.Timedelta(days=7)
+    rows = []
+    for k, md in enumerate(schedule):
+        kickoff = (start + pd.Timedelta(days=7 * k)).tz_localize("UTC")
+        for h, a in md:
+            rows.append({'match_id': len(rows) + 1, 'matchday': k + 1,
+                         'utc_date': kickoff.strftime("%Y-%m-%dT%H:%M:%SZ"), 'date_str': kickoff.strftime("%d/%m %H:%M"),
+                         'status': 'SCHEDULED', 'home_team': teams[h], 'away_team': teams[a], 'real_result': None})
+    return pd.DataFrame(rows)
+
+def _timeit(func, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def benchmark_h2h(sizes=(1_000, 10_000, 100_000), legacy_size=1_500):
+    """Comprueba que el H2H vectorizado coincide con el original y mide cómo escala."""
+    # 1. Equivalencia con la versión fila a fila (solo en tamaño pequeño, es O(n²))
+    df = generate_synthetic_matches(legacy_size)
+    start = time.perf_counter()
+    legacy = df.apply(lambda x: get_h2h_balance(x, df), axis=1).to_numpy()
+    legacy_time = time.perf_counter() - start
+    fast = calculate_h2h_balance(df)
+    if not np.allclose(legacy, fast):
+        raise AssertionError("❌ El H2H vectorizado no coincide con get_h2h_balance")
+    logger.info(f"✅ H2H idéntico en {legacy_size} partidos (fila a fila: {legacy_time:.2f}s)")
+
+    # 2. Escalado
+    results = []
+    for n in sizes:
+        df = generate_synthetic_matches(n)
+        elapsed = _timeit(calculate_h2h_balance, df)
+        results.append({'n_matches': n, 'seconds': elapsed, 'us_per_match': elapsed / n * 1e6})
+        logger.info(f"   ⏱️ H2H {n:>8} partidos: {elapsed:.4f}s ({elapsed / n * 1e6:.2f} µs/partido)")
+    return pd.DataFrame(results)
+
+def _load_csv_legacy(path):
+    # Camino anterior: parsear CSV, normalizar nombres y fechas en cada carga
+    df = pd.read_csv(path)
+    df = normalize_names(df)
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+def benchmark_storage(sizes=(1_500, 100_000)):
+    """Tiempo de carga y memoria del histórico: CSV frente a Feather con memory-map."""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            csv_path = os.path.join(tmp, f"history_{n}.csv")
+            save_history(generate_synthetic_matches(n), csv_path)
+            for name, loader in [('csv', _load_csv_legacy), ('columnar', load_match_history)]:
+                if name == 'columnar' and not os.path.exists(columnar_path(csv_path)):
+                    continue
+                elapsed = _timeit(loader, csv_path)
+                tracemalloc.start()
+                df = loader(csv_path)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                mem = df.memory_usage(deep=True).sum()
+                results.append({'n_matches': n, 'format': name, 'seconds': elapsed,
+                                'frame_mb': mem / 1e6, 'peak_alloc_mb': peak / 1e6})
+                logger.info(f"   ⏱️ Carga {name:>8} {n:>8} partidos: {elapsed:.4f}s | "
+                            f"{mem / 1e6:.2f} MB en memoria | pico {peak / 1e6:.2f} MB")
+    return pd.DataFrame(results)
+
+def benchmark_training(modes=("full", "fast"), tolerance=0.02):
+    """Entrena en ambos modos (sin guardar el modelo) y compara tiempo y log-loss en holdout."""
+    from models import train_and_evaluate  # Import tardío: carga sklearn solo si hace falta
+
+    results = pd.DataFrame([train_and_evaluate(mode=m, model_path=None) for m in modes])
+    print("\n⏱️ COMPARATIVA DE ENTRENAMIENTO")
+    print(results[['mode', 'accuracy', 'log_loss', 'fit_seconds', 'total_seconds']].to_string(index=False))
+    if {'full', 'fast'} <= set(results['mode']):
+        by_mode = results.set_index('mode')
+        delta = by_mode.loc['fast', 'log_loss'] - by_mode.loc['full', 'log_loss']
+        speedup = by_mode.loc['full', 'fit_seconds'] / by_mode.loc['fast', 'fit_seconds']
+        status = "✅" if delta <= tolerance else "⚠️"
+        print(f"{status} Δ log-loss (fast - full): {delta:+.4f} (tolerancia {tolerance}) | {speedup:.1f}x más rápido")
+    return results
+
+def _cold_start(code):
+    # Intérprete nuevo: mide import + carga como en el primer render de la app
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=src_dir)
+    return time.perf_counter() - start
+
+def benchmark_inference(model_path="data/model_winner.pkl", batch_size=10, repeat=200):
+    """Arranque en frío y latencia por lote: pickle de sklearn frente al modelo compilado."""
+    import joblib
+    from inference import load_compiled_model
+
+    model_path = os.path.abspath(model_path)
+    compiled_dir = os.path.splitext(model_path)[0] + "_compiled"
+    cold = {
+        'pickle': _cold_start(f"import joblib; joblib.load({model_path!r})"),
+        'compiled': _cold_start(f"from inference import load_compiled_model; load_compiled_model({compiled_dir!r})"),
+    }
+
+    models = {'pickle': joblib.load(model_path), 'compiled': load_compiled_model(compiled_dir)}
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(batch_size, models['pickle'].n_features_in_)),
+                     columns=models['pickle'].feature_names_in_)
+    if not np.allclose(models['pickle'].predict_proba(X), models['compiled'].predict_proba(X)):
+        raise AssertionError("❌ El modelo compilado no coincide con el pickle")
+
+    results = []
+    for name, model in models.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            model.predict_proba(X)
+        latency = (time.perf_counter() - start) / repeat
+        results.append({'format': name, 'cold_start_s': cold[name], 'batch_latency_ms': latency * 1e3})
+        logger.info(f"   ⏱️ {name:>8}: arranque en frío {cold[name]:.3f}s | "
+                    f"lote de {batch_size}: {latency * 1e3:.3f} ms")
+    return pd.DataFrame(results)
+
+# --- PIPELINE COMPLETO (tiempo + memoria por etapa) ---
+PIPELINE_SIZES = ((20, 2, 1), (20, 5, 1), (20, 10, 4))  # (equipos, temporadas, ligas)
+PIPELINE_STAGES = ['rolling_stats', 'feature_bank', 'rest_days', 'h2h', 'prepare_data', 'prepare_data_cached',
+                   'db_reingest', 'db_h2h_lookup', 'prepare_upcoming', 'train_fast', 'app_predict', 'matchup_matrix']
+BENCH_KEY = ['suite', 'stage', 'n_teams', 'n_seasons', 'n_leagues', 'n_matches']
+SUITES = ["h2h", "storage", "training", "inference", "pipeline"]
+
+def _measure(func, *args, repeat=1, memory=True, **kwargs):
+    """
+    Mejor tiempo de 'repeat' ejecuciones + pico de memoria (tracemalloc) en una pasada
+    aparte (tracemalloc ralentiza mucho, así no contamina los tiempos).
+    """
+    result, peak = None, float("nan")
+    if memory:
+        tracemalloc.start()
+        result = func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return result, best, peak / 1e6
+
+def benchmark_pipeline(sizes=PIPELINE_SIZES, stages=PIPELINE_STAGES, repeat=1, memory=True,
+                       compiled_dir="data/model_winner_compiled"):
+    """
+    Mide cada etapa del pipeline sobre ligas sintéticas de distintos tamaños:
+    features (rolling, banco de ventanas, descanso, H2H), prepare_data (sin caché y con la caché de etapas
+    ya caliente), la base de datos local (volver a cargar el mismo histórico y un H2H suelto),
+    prepare_upcoming_matches, entrenamiento rápido, la predicción de la app
+    (modelo compilado sobre el calendario) y la matriz de todos los cruces. Salvo en 'prepare_data_cached', todo se mide
+    sin caché de etapas.
+    """
+    from models import train_and_evaluate  # Import tardío: carga sklearn solo si hace falta
+    from inference import load_compiled_model
+
+    # Los equipos inventados de las ligas extra no están en teams.py: sin avisos por cada carga
+    logging.getLogger('teams').setLevel(logging.ERROR)
+    model = load_compiled_model(compiled_dir) if os.path.exists(os.path.join(compiled_dir, "meta.json")) else None
+
+    results = []
+    cache_was_enabled = is_cache_enabled()
+    disable_cache()
+    try:
+        with temporary_team_ids(), tempfile.TemporaryDirectory() as tmp:
+            for n_teams, n_seasons, n_leagues in sizes:
+                history = generate_synthetic_league(n_teams, n_seasons, n_leagues)
+                csv_path = os.path.join(tmp, f"history_{n_teams}_{n_seasons}_{n_leagues}.csv")
+                save_history(history, csv_path)
+                fixtures = generate_synthetic_fixtures(history)
+                df = load_match_history(csv_path).sort_values('date')
+                state_path = os.path.join(tmp, "no_state.csv")  # Sin estado guardado: se calcula entero
+                db_path = os.path.join(tmp, f"matches_{n_teams}_{n_seasons}_{n_leagues}.db")
+                match_db.upsert_matches(history, db_path=db_path)  # Las etapas miden la base ya cargada
+                last = df.iloc[-1]
+
+                runs = {
+                    'rolling_stats': lambda: calculate_rolling_stats(df, window=5),
+                    'feature_bank': lambda: rolling_feature_bank(df),
+                    'rest_days': lambda: calculate_rest_days(df),
+                    'h2h': lambda: calculate_h2h_balance(df),
+                    'prepare_data': lambda: prepare_data(csv_path, train_mode=False),
+                    'prepare_data_cached': lambda: prepare_data(csv_path, train_mode=False, cache=True,
+                                                                cache_dir=os.path.join(tmp, "cache")),
+                    'db_reingest': lambda: match_db.upsert_matches(history, db_path=db_path),
+                    'db_h2h_lookup': lambda: lookup_h2h_balance(last['home_team'], last['away_team'], last['date'],
+                                                                db_path=db_path),
+                    'prepare_upcoming': lambda: prepare_upcoming_matches(fixtures, csv_path, state_path=state_path),
+                    'train_fast': lambda: train_and_evaluate(mode="fast", model_path=None, input_path=csv_path),
+                }
+                if model is not None:
+                    X_pred, _ = prepare_upcoming_matches(fixtures, csv_path, state_path=state_path)
+                    runs['app_predict'] = lambda: model.predict_proba(X_pred)
+                    # Todos los cruces de la primera liga (n x (n - 1)) en una sola predicción,
+                    # con el estado de equipos ya guardado (como tras el pipeline diario)
+                    teams = sorted(set(history['home_team'].astype(str)))[:n_teams]
+                    matrix_state = os.path.join(tmp, f"state_{n_teams}_{n_seasons}_{n_leagues}.csv")
+                    sync_team_state(df, state_path=matrix_state)
+                    runs['matchup_matrix'] = lambda: probability_matrix(model, teams, history['date'].max(),
+                                                                        csv_path, matrix_state)
+
+                if 'prepare_data_cached' in stages:
+                    runs['prepare_data_cached']()  # Calienta la caché: se mide solo la lectura
+                for stage in stages:
+                    if stage not in runs:
+                        continue
+                    _, seconds, peak_mb = _measure(runs[stage], repeat=repeat, memory=memory)
+                    results.append({'suite': 'pipeline', 'stage': stage, 'n_teams': n_teams, 'n_seasons': n_seasons,
+                                    'n_leagues': n_leagues, 'n_matches': len(history),
+                                    'seconds': seconds, 'peak_mb': peak_mb})
+                    logger.info(f"   ⏱️ {stage:>19} | {len(history):>7} partidos: {seconds:.4f}s | pico {peak_mb:.1f} MB")
+    finally:
+        if cache_was_enabled:
+            enable_cache()
+    return pd.DataFrame(results)
+
+# --- RESULTADOS EN JSON Y COMPARACIÓN CON UNA BASE ---
+def save_results(results, path):
+    """Guarda las mediciones (lista de registros) junto con datos de la máquina."""
+    payload = {
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'results': results.to_dict(orient='records'),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2, default=str)
+    logger.info(f"💾 Resultados guardados en {path}")
+
+def load_results(path):
+    with open(path) as f:
+        return pd.DataFrame(json.load(f)['results'])
+
+def compare_with_baseline(results, baseline, tolerance=0.25):
+    """
+    Cruza las mediciones con una ejecución anterior (mismas etapas y tamaños) y marca
+    como regresión lo que sea más de un 'tolerance' más lento o consuma más memoria.
+    """
+    key = [c for c in BENCH_KEY if c in results.columns and c in baseline.columns]
+    merged = results.merge(baseline, on=key, how='inner', suffixes=('', '_base'))
+    if merged.empty:
+        logger.warning("⚠️ La base no tiene etapas/tamaños en común con esta ejecución.")
+        return merged
+    merged['time_ratio'] = merged['seconds'] / merged['seconds_base']
+    merged['regression'] = merged['time_ratio'] > 1 + tolerance
+    if 'peak_mb' in merged.columns and 'peak_mb_base' in merged.columns:
+        merged['mem_ratio'] = merged['peak_mb'] / merged['peak_mb_base']
+        merged['regression'] |= merged['mem_ratio'] > 1 + tolerance
+
+    print("\n📊 COMPARACIÓN CON LA BASE")
+    cols = [c for c in key + ['seconds_base', 'seconds', 'time_ratio', 'mem_ratio'] if c in merged.columns]
+    print(merged[cols].to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    n_regressions = int(merged['regression'].sum())
+    if n_regressions:
+        print(f"❌ {n_regressions} regresiones (tolerancia {tolerance:.0%})")
+    else:
+        print(f"✅ Sin regresiones (tolerancia {tolerance:.0%})")
+    return merged
+
+def _parse_size(text):
+    # "20x5x1" -> (20 equipos, 5 temporadas, 1 liga)
+    n_teams, n_seasons, n_leagues = (int(x) for x in text.lower().split("x"))
+    return n_teams, n_seasons, n_leagues
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks del pipeline de LaLiga")
+    parser.add_argument("--suite", nargs="+", choices=SUITES + ["all"], default=["h2h", "storage"])
+    parser.add_argument("--sizes", nargs="+", type=_parse_size, default=list(PIPELINE_SIZES),
+                        help="Tamaños del pipeline como EQUIPOSxTEMPORADASxLIGAS (ej. 20x5x1)")
+    parser.add_argument("--repeat", type=int, default=1, help="Repeticiones por etapa (se queda el mejor tiempo)")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="No medir el pico de memoria (ahorra una pasada por etapa, el entrenamiento es lento con tracemalloc)")
+    parser.add_argument("--output", help="Fichero JSON donde guardar los resultados")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior con la que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Margen antes de marcar regresión (0.25 = 25%%)")
+    args = parser.parse_args()
+    suites = SUITES if "all" in args.suite else args.suite
+
+    frames = []
+    # Los equipos inventados ("Team 035", "L1 Team 00"...) no deben entrar en data/team_ids.csv
+    with temporary_team_ids():
+        if "h2h" in suites:
+            frames.append(benchmark_h2h().assign(suite='h2h', stage='h2h_vectorized'))
+        if "storage" in suites:
+            storage = benchmark_storage()
+            frames.append(storage.assign(suite='storage', stage='load_' + storage['format']))
+        if "training" in suites:
+            training = benchmark_training()[['mode', 'accuracy', 'log_loss', 'fit_seconds', 'total_seconds']]
+            frames.append(training.assign(suite='training', stage='train_' + training['mode'],
+                                          seconds=training['fit_seconds']))
+        if "inference" in suites:
+            inference = benchmark_inference()
+            frames.append(inference.assign(suite='inference', stage='predict_' + inference['format'],
+                                           seconds=inference['batch_latency_ms'] / 1e3))
+        if "pipeline" in suites:
+            frames.append(benchmark_pipeline(sizes=args.sizes, repeat=args.repeat, memory=not args.no_memory))
+    results = pd.concat(frames, ignore_index=True)
+
+    if args.output:
+        save_results(results, args.output)
+    if args.baseline:
+        comparison = compare_with_baseline(results, load_results(args.baseline), args.tolerance)
+        if not comparison.empty and comparison['regression'].any():
+            sys.exit(1)
@@ -1,46 +1,65 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from scipy.signal import lfilter
 
-# --- CONFIGURACIÓN DE NOMBRES ---
-TEAM_MAPPING = {
-    "Ath Bilbao": "Athletic Bilbao", "Athletic Club": "Athletic Bilbao",
-    "Ath Madrid": "Atletico Madrid", "Atlético de Madrid": "Atletico Madrid",
-    "Espanol": "Espanyol", "RCD Espanyol": "Espanyol",
-    "Celta": "Celta de Vigo", "Celta Vigo": "Celta de Vigo",
-    "Betis": "Real Betis", "Real Betis Balompie": "Real Betis",
-    "Sociedad": "Real Sociedad", "Real Sociedad de Futbol": "Real Sociedad",
-    "Real Madrid": "Real Madrid",
-    "Barcelona": "Barcelona", "FC Barcelona": "Barcelona",
-    "Girona": "Girona", "Girona FC": "Girona",
-    "Valencia": "Valencia", "Valencia CF": "Valencia",
-    "Mallorca": "Mallorca", "RCD Mallorca": "Mallorca",
-    "Osasuna": "Osasuna", "CA Osasuna": "Osasuna",
-    "Sevilla": "Sevilla", "Sevilla FC": "Sevilla",
-    "Villarreal": "Villarreal", "Villarreal CF": "Villarreal",
-    "Alaves": "Alaves", "Deportivo Alavés": "Alaves",
-    "Las Palmas": "Las Palmas", "UD Las Palmas": "Las Palmas",
-    "Leganes": "Leganes", "CD Leganés": "Leganes",
-    "Valladolid": "Real Valladolid", "Real Valladolid CF": "Real Valladolid",
-    "Getafe": "Getafe", "Getafe CF": "Getafe",
-    "Rayo Vallecano": "Rayo Vallecano", "Rayo": "Rayo Vallecano",
-    "Oviedo": "Real Oviedo", "Levante": "Levante", "Elche": "Elche"
-}
+# Truco para imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from storage import load_history, columnar_path
+from teams import TEAM_ALIASES, canonical_name, canonical_teams, is_canonical, resolve_team_ids, quiet_unknown_teams
+from leagues import DEFAULT_LEAGUE, league_paths
+from profiling import stage, profiled
+from stage_cache import cached, hash_files, stage_key
+import match_db
 
+# --- CONFIGURACIÓN DE NOMBRES ---
+# Los alias de cada equipo viven en teams.py (registro único con IDs enteros)
 def normalize_names(df: pd.DataFrame) -> pd.DataFrame:
-    if 'home_team' in df.columns:
-        df['home_team'] = df['home_team'].replace(TEAM_MAPPING).str.strip()
-    if 'away_team' in df.columns:
-        df['away_team'] = df['away_team'].replace(TEAM_MAPPING).str.strip()
+    """
+    Pasa home_team/away_team a su nombre canónico (Categorical compartido) y añade
+    home_id/away_id, que son las claves que usa todo el pipeline en cruces y groupbys.
+    """
+    cols = [c for c in ['home_team', 'away_team'] if c in df.columns]
+    if not cols:
+        return df
+    
+    # Si ya vienen resueltas (p. ej. del histórico columnar) no hay nada que buscar
+    resolved = all(
+        isinstance(df[c].dtype, pd.CategoricalDtype) and is_canonical(df[c].cat.categories)
+        for c in cols
+    ) and len({tuple(df[c].cat.categories) for c in cols}) == 1
+    if not resolved:
+        n = len(df)
+        teams = canonical_teams(np.concatenate([df[c].to_numpy(dtype=object) for c in cols]))
+        for k, col in enumerate(cols):
+            df[col] = teams[k * n:(k + 1) * n]
+    for col in cols:
+        df[col.replace('_team', '_id')] = df[col].cat.codes.to_numpy(dtype=np.int16)
     return df
 
+def with_team_ids(df):
+    """Devuelve df con home_id/away_id (resolviendo los nombres en una copia si faltan)."""
+    if 'home_id' in df.columns and 'away_id' in df.columns:
+        return df
+    return normalize_names(df.copy())
+
+def load_match_history(path="data/laliga_advanced_stats.csv"):
+    """Histórico tipado (columnar si existe) con los nombres ya normalizados."""
+    history = load_history(path)
+    if history.empty:
+        return history
+    return normalize_names(history)
+
 # --- CÁLCULO DE DÍAS DE DESCANSO ---
 def calculate_rest_days(df):
     """Calcula los días de descanso desde el último partido para cada equipo."""
-    # Creamos una lista vertical de todos los partidos jugados por cualquier equipo
-    home = df[['date', 'home_team']].rename(columns={'home_team': 'team'})
-    away = df[['date', 'away_team']].rename(columns={'away_team': 'team'})
+    # Creamos una lista vertical de todos los partidos jugados por cualquier equipo (por ID)
+    df = with_team_ids(df)
+    home = df[['date', 'home_id']].rename(columns={'home_id': 'team'})
+    away = df[['date', 'away_id']].rename(columns={'away_id': 'team'})
     all_matches = pd.concat([home, away]).sort_values(['team', 'date'])
     
     # Calculamos la diferencia de días con el partido anterior
@@ -85,16 +104,88 @@ def get_h2h_balance(row, df_history):
             
     return points / len(past_games) # Promedio de puntos H2H
 
+# --- CONSULTA PUNTUAL (base de datos local, por índice) ---
+# Para una pareja suelta no hace falta cargar ni filtrar todo el histórico
+def lookup_h2h_balance(home_team, away_team, date, league=DEFAULT_LEAGUE, db_path=None):
+    """Mismo valor que get_h2h_balance para un partido suelto, consultando la base de datos."""
+    n_games, points = match_db.pair_points(canonical_name(home_team), canonical_name(away_team), league,
+                                           before=date, db_path=db_path)
+    return points / n_games if n_games else 1.5
+
+def calculate_h2h_balance(df):
+    """
+    Versión vectorizada de get_h2h_balance para todo el histórico de golpe.
+    Agrupa por pareja de equipos (sin importar quién es local), ordena por fecha
+    y acumula los puntos de cada lado estrictamente ANTERIORES a cada partido.
+    Devuelve un array alineado con las filas de df (1.5 si no hay precedentes).
+    """
+    n = len(df)
+    if n == 0:
+        return np.empty(0, dtype=float)
+
+    df = with_team_ids(df)
+    home_code = df['home_id'].to_numpy(dtype=np.int64)
+    away_code = df['away_id'].to_numpy(dtype=np.int64)
+    home_score = df['home_score'].to_numpy(dtype=float)
+    away_score = df['away_score'].to_numpy(dtype=float)
+    dates = df['date'].to_numpy(dtype='datetime64[ns]')
+
+    # Clave de pareja NO ordenada (lo, hi) a partir de los IDs de equipo
+    swap = home_code > away_code
+    lo = np.where(swap, away_code, home_code)
+    hi = np.where(swap, home_code, away_code)
+    pair = lo * (int(hi.max()) + 1) + hi
+
+    # Puntos de cada equipo en el partido (misma regla que get_h2h_balance)
+    pts_home = np.where(home_score > away_score, 3, np.where(home_score == away_score, 1, 0))
+    pts_away = np.where(away_score > home_score, 3, np.where(away_score == home_score, 1, 0))
+    pts_lo = np.where(swap, pts_away, pts_home)
+    pts_hi = np.where(swap, pts_home, pts_away)
+
+    # Una única pasada ordenada por (pareja, fecha)
+    order = np.lexsort((dates.view(np.int64), pair))
+    s_pair, s_date = pair[order], dates[order]
+    idx = np.arange(n)
+    new_pair = np.r_[True, s_pair[1:] != s_pair[:-1]]
+    new_block = new_pair | np.r_[True, s_date[1:] != s_date[:-1]]
+    pair_start = np.maximum.accumulate(np.where(new_pair, idx, 0))
+    block_start = np.maximum.accumulate(np.where(new_block, idx, 0))
+
+    def _prior(values):
+        # Suma acumulada exclusiva, reiniciada por pareja y sin contar partidos del mismo día
+        excl = np.cumsum(values) - values
+        return excl[block_start] - excl[pair_start]
+
+    prev_lo = _prior(pts_lo[order])
+    prev_hi = _prior(pts_hi[order])
+    prev_n = block_start - pair_start
+
+    # Puntos del equipo que hoy es LOCAL
+    s_swap = swap[order]
+    prev_home = np.where(s_swap, prev_hi, prev_lo)
+    balance_sorted = np.full(n, 1.5)
+    has_games = prev_n > 0
+    balance_sorted[has_games] = prev_home[has_games] / prev_n[has_games]
+
+    balance = np.empty(n, dtype=float)
+    balance[order] = balance_sorted
+    return balance
+
 # --- MÉTRICAS DE RENDIMIENTO (ROLLING STATS) ---
-def calculate_rolling_stats(df, window=5):
+def build_team_rows(df):
+    """
+    Pasa el histórico a formato largo (una fila por equipo y partido) con puntos y ataque.
+    La columna 'team' es el ID del equipo y 'name' su nombre canónico.
+    """
+    df = with_team_ids(df)
     # Selección de columnas 
-    cols_home = ['date', 'home_team', 'home_score', 'away_score', 'home_shots', 'home_shots_on_target', 'home_corners']
+    cols_home = ['date', 'home_id', 'home_team', 'home_score', 'away_score', 'home_shots', 'home_shots_on_target', 'home_corners']
     home_stats = df[cols_home].copy()
-    home_stats.columns = ['date', 'team', 'goals_for', 'goals_against', 'shots', 'shots_ot', 'corners']
+    home_stats.columns = ['date', 'team', 'name', 'goals_for', 'goals_against', 'shots', 'shots_ot', 'corners']
     
-    cols_away = ['date', 'away_team', 'away_score', 'home_score', 'away_shots', 'away_shots_on_target', 'away_corners']
+    cols_away = ['date', 'away_id', 'away_team', 'away_score', 'home_score', 'away_shots', 'away_shots_on_target', 'away_corners']
     away_stats = df[cols_away].copy()
-    away_stats.columns = ['date', 'team', 'goals_for', 'goals_against', 'shots', 'shots_ot', 'corners']
+    away_stats.columns = ['date', 'team', 'name', 'goals_for', 'goals_against', 'shots', 'shots_ot', 'corners']
     
     stats_df = pd.concat([home_stats, away_stats]).sort_values(['team', 'date'])
     
@@ -115,55 +206,337 @@ def calculate_rolling_stats(df, window=5):
         (stats_df['corners'] * 0.7)
     )
     
-    # Medias Móviles (EMA) - Usamos solo lo necesario para el modelo
+    return stats_df
+
+# --- BANCO DE FEATURES RODANTES (varias ventanas en una pasada) ---
+# Todas las medias se calculan sobre los partidos ANTERIORES de cada equipo (equivale
+# al shift(1) por equipo): la fila de un partido nunca ve su propio resultado.
+BANK_COLS = ['points', 'goals_for', 'goals_against', 'attack_power', 'shots', 'shots_ot', 'shots_off', 'corners']
+BANK_SPANS = (3, 5, 10)     # Medias exponenciales (EWM, adjust=True)
+BANK_SUMS = (3,)            # Sumas de los últimos N partidos (3 = racha de forma)
+
+def _team_blocks(team):
+    """Para filas ordenadas por equipo: nº de bloque, posición dentro del bloque e inicio de cada fila."""
+    n = len(team)
+    starts = np.flatnonzero(np.r_[True, team[1:] != team[:-1]])
+    lengths = np.diff(np.r_[starts, n])
+    block = np.repeat(np.arange(len(starts)), lengths)
+    first = starts[block]
+    return block, np.arange(n) - first, first, int(lengths.max())
+
+def _prior_ewm(values, valid, block, pos, max_len, span):
+    """
+    EWM de los partidos previos de cada equipo, todas las columnas a la vez. Igual que
+    x.shift(1).ewm(span, min_periods=1).mean() (adjust=True, los huecos también decaen):
+    media = num / den con num_t = d * num_t-1 + x_t y den_t = d * den_t-1 + [x_t no es NaN].
+    """
+    decay = 1.0 - 2.0 / (span + 1.0)
+    n_blocks, n_cols = block.max() + 1, values.shape[1]
+    # Matriz equipo x partido x columna: el filtro recorre el eje de partidos de todos a la vez
+    num = np.zeros((n_blocks, max_len, n_cols))
+    den = np.zeros((n_blocks, max_len, n_cols))
+    num[block, pos] = values
+    den[block, pos] = valid
+    num = lfilter([1.0], [1.0, -decay], num, axis=1)
+    den = lfilter([1.0], [1.0, -decay], den, axis=1)
+
+    # Valor ANTES de cada partido: el acumulado hasta el partido anterior
+    out = np.zeros_like(values)
+    prev = pos > 0
+    prev_num = num[block[prev], pos[prev] - 1]
+    prev_den = den[block[prev], pos[prev] - 1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out[prev] = np.where(prev_den > 0, prev_num / prev_den, 0.0)
+    return out
+
+def _prior_window(cum, rows, start):
+    """Suma exclusiva de cum entre start y rows (cum = suma acumulada con un 0 delante)."""
+    return cum[rows] - cum[start]
+
+def rolling_feature_bank(df, spans=BANK_SPANS, sums=BANK_SUMS, season_mean=True, cols=BANK_COLS):
+    """
+    Features rodantes de cada equipo antes de cada partido, en una única pasada vectorizada
+    sobre las filas ordenadas por equipo y fecha:
+    - ewm{span}_{col}: media exponencial de los partidos previos
+    - sum{n}_{col}: suma de los últimos n partidos previos
+    - season_{col}: media de los partidos previos de la misma temporada (julio a junio)
+    Sin partidos previos el valor es 0. Devuelve date, team y las features (mismo índice
+    y orden que build_team_rows).
+    """
+    stats_df = build_team_rows(df)
+    team = stats_df['team'].to_numpy()
+    bank = {'date': stats_df['date'].to_numpy(), 'team': team}
+    if len(stats_df) == 0:
+        return pd.DataFrame(bank, index=stats_df.index)
+
+    raw = stats_df[cols].to_numpy(dtype=np.float64)
+    valid = ~np.isnan(raw)
+    values = np.where(valid, raw, 0.0)
+    block, pos, first, max_len = _team_blocks(team)
+
+    for span in spans:
+        ewm = _prior_ewm(values, valid, block, pos, max_len, span)
+        for k, col in enumerate(cols):
+            bank[f'ewm{span}_{col}'] = ewm[:, k]
+
+    # Sumas por ventana: diferencias de la suma acumulada (los huecos cuentan como 0)
+    rows = np.arange(len(stats_df))
+    cum = np.vstack([np.zeros((1, len(cols))), np.cumsum(values, axis=0)])
+    for n in sums:
+        window = _prior_window(cum, rows, np.maximum(rows - n, first))
+        for k, col in enumerate(cols):
+            bank[f'sum{n}_{col}'] = window[:, k]
+
+    if season_mean:
+        dates = pd.to_datetime(stats_df['date'])
+        season = (dates.dt.year - (dates.dt.month < 7)).to_numpy()
+        new_season = np.r_[True, (team[1:] != team[:-1]) | (season[1:] != season[:-1])]
+        season_start = np.maximum.accumulate(np.where(new_season, rows, 0))
+        count = np.vstack([np.zeros((1, len(cols))), np.cumsum(valid, axis=0)])
+        total = _prior_window(cum, rows, season_start)
+        played = _prior_window(count, rows, season_start)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(played > 0, total / played, 0.0)
+        for k, col in enumerate(cols):
+            bank[f'season_{col}'] = mean[:, k]
+
+    return pd.DataFrame(bank, index=stats_df.index)
+
+def calculate_rolling_stats(df, window=5):
+    # Medias Móviles (EMA) - Usamos solo lo necesario para el modelo (+ racha de 3 partidos)
     cols = ['points', 'goals_for', 'goals_against', 'attack_power']
+    bank = rolling_feature_bank(df, spans=(window,), sums=(3,), season_mean=False, cols=cols)
+    stats_df = bank[['date', 'team']].copy()
     for col in cols:
-        stats_df[f'avg_{col}'] = stats_df.groupby('team')[col].transform(
-            lambda x: x.shift(1).ewm(span=window, min_periods=1).mean()
-        ).fillna(0)
+        stats_df[f'avg_{col}'] = bank[f'ewm{window}_{col}']
     
     # Racha de forma
-    stats_df['form_streak'] = stats_df.groupby('team')['points'].transform(
-        lambda x: x.shift(1).rolling(window=3, min_periods=1).sum()
-    ).fillna(0)
+    stats_df['form_streak'] = bank['sum3_points']
     
-    return stats_df[['date', 'team', 'avg_points', 'avg_goals_for', 'avg_goals_against', 'avg_attack_power', 'form_streak']]
+    return stats_df
 
-def prepare_data(input_path="data/laliga_advanced_stats.csv", train_mode=True):
-    if not os.path.exists(input_path):
-        print("❌ Error: Falta el archivo de datos.")
-        return pd.DataFrame()
+# --- ESTADO INCREMENTAL POR EQUIPO ---
+# Guardamos los acumuladores de las medias móviles (EWM), los últimos 3 resultados y la
+# fecha del último partido de cada equipo, para no recalcular toda la historia cuando
+# entra un resultado nuevo.
+STATE_PATH = "data/team_state.csv"
+EWM_COLS = ['points', 'goals_for', 'goals_against', 'attack_power']
+STREAK_LEN = 3
+STATE_COLUMNS = (
+    ['team', 'name', 'span', 'n_matches', 'last_date']
+    + [f'num_{c}' for c in EWM_COLS] + [f'den_{c}' for c in EWM_COLS]
+    + [f'last_pts_{i}' for i in range(1, STREAK_LEN + 1)]
+)
+STATE_FEATURES = ['avg_points', 'avg_goals_for', 'avg_goals_against', 'avg_attack_power', 'form_streak']
 
-    df = pd.read_csv(input_path)
-    df = normalize_names(df)
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values('date')
-    
-    # 1. Calcular Estadísticas Rodantes (Forma, Ataque)
-    stats = calculate_rolling_stats(df, window=5)
-    
-    # 2. Calcular Días de Descanso
-    rest_stats = calculate_rest_days(df)
-    
-    # 3. Fusionar Local
-    df = df.merge(stats, left_on=['date', 'home_team'], right_on=['date', 'team'], how='left').drop(columns=['team'])
-    df = df.rename(columns={c: f'home_{c}' for c in stats.columns if c not in ['date', 'team']})
-    df = df.merge(rest_stats, left_on=['date', 'home_team'], right_on=['date', 'team'], how='left').drop(columns=['team'])
-    df = df.rename(columns={'rest_days': 'home_rest_days'})
-    
-    # 4. Fusionar Visitante
-    df = df.merge(stats, left_on=['date', 'away_team'], right_on=['date', 'team'], how='left').drop(columns=['team'])
-    df = df.rename(columns={c: f'away_{c}' for c in stats.columns if c not in ['date', 'team']})
-    df = df.merge(rest_stats, left_on=['date', 'away_team'], right_on=['date', 'team'], how='left').drop(columns=['team'])
-    df = df.rename(columns={'rest_days': 'away_rest_days'})
-    
-    # 5. Calcular H2H (Histórico Directo)
-    if train_mode:
-        print("⏳ Calculando H2H (Paternidad)...")
-        # Usamos una lambda optimizada
-        df['h2h_balance'] = df.apply(lambda x: get_h2h_balance(x, df), axis=1)
+def empty_team_state():
+    return pd.DataFrame(columns=STATE_COLUMNS).set_index('team')
+
+def _new_team_entry(name, window):
+    entry = {'name': name, 'span': window, 'n_matches': 0, 'last_date': pd.NaT}
+    for c in EWM_COLS:
+        entry[f'num_{c}'] = 0.0
+        entry[f'den_{c}'] = 0.0
+    for i in range(1, STREAK_LEN + 1):
+        entry[f'last_pts_{i}'] = np.nan
+    return entry
+
+def _entry_features(entry):
+    """Features PRE-partido a partir del estado (mismas reglas que calculate_rolling_stats)."""
+    feats = {}
+    for c in EWM_COLS:
+        den = entry[f'den_{c}']
+        feats[f'avg_{c}'] = entry[f'num_{c}'] / den if den > 0 else 0.0
+    feats['form_streak'] = float(np.nansum([entry[f'last_pts_{i}'] for i in range(1, STREAK_LEN + 1)]))
+    return feats
+
+def update_team_state(state, new_matches, window=5):
+    """
+    Incorpora partidos nuevos al estado en O(partidos nuevos).
+    Un partido solo cuenta para un equipo si es posterior a su último partido guardado,
+    así que volver a pasar partidos ya incorporados no cambia nada.
+    Devuelve (estado actualizado, features pre-partido de cada fila incorporada).
+    """
+    decay = 1.0 - 2.0 / (window + 1.0)
+    entries = {team: row.to_dict() for team, row in state.iterrows()}
+
+    emitted = []
+    rows = build_team_rows(new_matches)
+    for rec in rows[['date', 'team', 'name'] + EWM_COLS].itertuples(index=False):
+        entry = entries.get(rec.team)
+        if entry is None or entry['span'] != window:
+            entry = entries[rec.team] = _new_team_entry(rec.name, window)
+        last_date = entry['last_date']
+        if not pd.isna(last_date) and rec.date <= last_date:
+            continue
+
+        # 1. Lo que sabíamos del equipo ANTES de este partido (equivale al shift(1))
+        feats = _entry_features(entry)
+        rest = 7 if pd.isna(last_date) else (rec.date - last_date).days
+        feats.update({'date': rec.date, 'team': rec.team, 'rest_days': float(np.clip(rest, 2, 14))})
+        emitted.append(feats)
+
+        # 2. Acumuladores EWM (adjust=True): media = num / den con decaimiento geométrico
+        for c in EWM_COLS:
+            value = getattr(rec, c)
+            entry[f'num_{c}'] *= decay
+            entry[f'den_{c}'] *= decay
+            if not pd.isna(value):
+                entry[f'num_{c}'] += value
+                entry[f'den_{c}'] += 1.0
+
+        # 3. Buffer de los últimos 3 puntos (last_pts_1 = el más reciente)
+        for i in range(STREAK_LEN, 1, -1):
+            entry[f'last_pts_{i}'] = entry[f'last_pts_{i - 1}']
+        entry['last_pts_1'] = rec.points
+        entry['last_date'] = rec.date
+        entry['n_matches'] += 1
+
+    new_state = pd.DataFrame.from_dict(entries, orient='index', columns=STATE_COLUMNS[1:]).rename_axis('team')
+    new_state['last_date'] = pd.to_datetime(new_state['last_date'])
+    new_state['n_matches'] = new_state['n_matches'].astype(int)
+    emitted_df = pd.DataFrame(emitted, columns=['date', 'team'] + STATE_FEATURES + ['rest_days'])
+    return new_state.sort_index(), emitted_df
+
+def build_team_state(history, window=5):
+    """Construye el estado desde cero con todo el histórico."""
+    state, _ = update_team_state(empty_team_state(), history.sort_values('date', kind='stable'), window=window)
+    return state
+
+def team_state_features(state):
+    """Estadísticas actuales de cada equipo (índice = ID), incluyendo ya su último partido."""
+    feats = {team: _entry_features(row) for team, row in state.iterrows()}
+    latest = pd.DataFrame.from_dict(feats, orient='index', columns=STATE_FEATURES).rename_axis('team')
+    latest['name'] = state['name']
+    latest['last_date'] = state['last_date']
+    return latest
+
+def load_team_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return empty_team_state()
+    state = pd.read_csv(path, index_col='team')
+    if 'name' not in state.columns:
+        # Formato antiguo: el índice era el nombre del equipo
+        state.insert(0, 'name', state.index.astype(str))
+    # Los IDs se vuelven a resolver desde el nombre por si el registro ha cambiado
+    state.index = pd.Index(resolve_team_ids(state['name']), name='team')
+    state['last_date'] = pd.to_datetime(state['last_date'])
+    return state.sort_index()
+
+def save_team_state(state, path=STATE_PATH):
+    state.to_csv(path)
+
+def _pending_matches(history, state):
+    """
+    Partidos que aún no están en el estado: los posteriores al último partido guardado de
+    alguno de sus dos equipos (no al más reciente de todos: un partido que llega tarde con
+    fecha anterior al último de OTRO equipo también entra).
+    Devuelve None si a algún equipo le falta un partido anterior a su último guardado
+    (eso no se puede añadir de forma incremental: hay que reconstruir).
+    """
+    n = len(history)
+    names = np.concatenate([history['home_team'].astype(str).to_numpy(), history['away_team'].astype(str).to_numpy()])
+    dates = np.concatenate([history['date'].to_numpy()] * 2)
+    last = state.set_index('name')['last_date']
+    team_last = pd.Series(names).map(last).to_numpy(dtype='datetime64[ns]')
+    applied = dates <= team_last  # NaT (equipo nuevo) -> False
+    counts = pd.Series(names[applied]).value_counts().reindex(last.index, fill_value=0)
+    if (counts.to_numpy() != state['n_matches'].to_numpy()).any():
+        return None
+    return history[~(applied[:n] & applied[n:])]
+
+def sync_team_state(history, state_path=STATE_PATH, window=5, save=True):
+    """
+    Carga el estado guardado y le añade solo los partidos que aún no tiene.
+    Si no existe, se guardó con otra ventana o le faltan partidos antiguos, se reconstruye.
+    """
+    state = load_team_state(state_path)
+    new_matches = None
+    if not state.empty and (state['span'] == window).all():
+        new_matches = _pending_matches(history, state)
+        if new_matches is None:
+            print("⚠️ Estado de equipos sin partidos anteriores a su último guardado: se reconstruye.")
+    if new_matches is None:
+        state = build_team_state(history, window=window)
     else:
-        df['h2h_balance'] = 1.5 # Valor neutro por defecto si no hay histórico cargado
+        state, _ = update_team_state(state, new_matches.sort_values('date', kind='stable'), window=window)
+    if save:
+        save_team_state(state, state_path)
+    return state
+
+def verify_team_state(history, state_path=STATE_PATH, window=5):
+    """
+    Comprueba que el estado guardado es el mismo que reconstruyéndolo con todo el histórico.
+    Si no lo es, guarda el reconstruido. Devuelve True si ya coincidía.
+    """
+    state = load_team_state(state_path)
+    full = build_team_state(history, window=window)
+    saved, rebuilt = team_state_features(state), team_state_features(full)
+    same = (saved.index.equals(rebuilt.index) and saved['name'].equals(rebuilt['name'])
+            and (saved['last_date'] == rebuilt['last_date']).all()
+            and np.allclose(saved[STATE_FEATURES], rebuilt[STATE_FEATURES]))
+    if not same:
+        print(f"⚠️ El estado de equipos de {state_path} no coincide con el histórico: se reconstruye.")
+        save_team_state(full, state_path)
+    return same
+
+def check_state_consistency(history, split=0.8, window=5):
+    """
+    Prueba de consistencia: construye el estado con el primer 80% del histórico,
+    añade el resto de forma incremental y compara con el recálculo completo.
+    """
+    history = history.sort_values('date', kind='stable').reset_index(drop=True)
+    cut_date = history['date'].iloc[int(len(history) * split)]
+    state = build_team_state(history[history['date'] < cut_date], window=window)
+    state, emitted = update_team_state(state, history[history['date'] >= cut_date], window=window)
+
+    # Recálculo completo de las mismas filas
+    full = calculate_rolling_stats(history, window=window).merge(calculate_rest_days(history), on=['date', 'team'])
+    full = full[full['date'] >= cut_date]
+    merged = emitted.merge(full, on=['date', 'team'], suffixes=('_inc', '_full'))
+    if len(merged) != len(full):
+        raise AssertionError(f"Filas incrementales: {len(merged)} vs recálculo completo: {len(full)}")
+    for col in STATE_FEATURES + ['rest_days']:
+        if not np.allclose(merged[f'{col}_inc'], merged[f'{col}_full']):
+            raise AssertionError(f"{col} incremental no coincide con el recálculo completo")
+
+    # El estado final debe ser el mismo que construyéndolo de una vez
+    pd.testing.assert_frame_equal(team_state_features(state),
+                                  team_state_features(build_team_state(history, window=window)))
+    print(f"✅ Estado incremental consistente ({len(merged)} filas comprobadas).")
+    return True
+
+# --- PIPELINE DE ENTRENAMIENTO POR ETAPAS (con caché en disco) ---
+# Cada etapa se guarda con una clave que depende del contenido del histórico y de sus
+# parámetros: cambiar 'window' solo recalcula las medias móviles (descanso y H2H salen
+# de la caché) y con los mismos datos todo prepare_data es una lectura.
+# Sube FEATURES_VERSION si cambia el cálculo de alguna etapa (invalida la caché).
+FEATURES_VERSION = 3
+
+def history_key(input_path):
+    """Clave del histórico: contenido del CSV/.feather + versión de las features + registro de equipos."""
+    return stage_key("history", hash_files(input_path, columnar_path(input_path)),
+                     version=FEATURES_VERSION, teams=TEAM_ALIASES)
+
+def build_features(df, stats, rest_stats, h2h=None, train_mode=True):
+    """Cruza el histórico con las stats de cada equipo, calcula diferenciales y TARGET."""
+    df = df.copy()
+    # 5. H2H (Histórico Directo), alineado con las filas del histórico
+    # Valor neutro por defecto si no hay histórico cargado
+    df['h2h_balance'] = h2h if h2h is not None else 1.5
+
+    with stage("features.merges", rows=len(df)):
+        # 3. Fusionar Local (los cruces van por ID de equipo, no por nombre)
+        df = df.merge(stats, left_on=['date', 'home_id'], right_on=['date', 'team'], how='left').drop(columns=['team'])
+        df = df.rename(columns={c: f'home_{c}' for c in stats.columns if c not in ['date', 'team']})
+        df = df.merge(rest_stats, left_on=['date', 'home_id'], right_on=['date', 'team'], how='left').drop(columns=['team'])
+        df = df.rename(columns={'rest_days': 'home_rest_days'})
+    
+        # 4. Fusionar Visitante
+        df = df.merge(stats, left_on=['date', 'away_id'], right_on=['date', 'team'], how='left').drop(columns=['team'])
+        df = df.rename(columns={c: f'away_{c}' for c in stats.columns if c not in ['date', 'team']})
+        df = df.merge(rest_stats, left_on=['date', 'away_id'], right_on=['date', 'team'], how='left').drop(columns=['team'])
+        df = df.rename(columns={'rest_days': 'away_rest_days'})
         
     # 6. Diferenciales (Inputs finales para la IA)
     df['diff_points'] = df['home_avg_points'] - df['away_avg_points']
@@ -194,8 +567,60 @@ def prepare_data(input_path="data/laliga_advanced_stats.csv", train_mode=True):
         'diff_points', 'diff_attack', 'diff_rest',
         'TARGET'
     ]
+    return df[features].copy()
+
+@profiled("features.prepare_data")
+def prepare_data(input_path="data/laliga_advanced_stats.csv", train_mode=True, window=5,
+                 cache=None, cache_dir=None):
+    """
+    Dataset de entrenamiento. Las etapas (medias móviles, descanso, H2H y el cruce final)
+    se guardan en la caché de etapas; cache=False lo recalcula todo sin tocar el disco.
+    """
+    if not os.path.exists(input_path) and not os.path.exists(columnar_path(input_path)):
+        print("❌ Error: Falta el archivo de datos.")
+        return pd.DataFrame()
+
+    with stage("features.hash"):
+        data_key = history_key(input_path)
+    cache_opts = {'enabled': cache, 'cache_dir': cache_dir}
+
+    # El histórico solo se lee si alguna etapa no está en la caché
+    loaded = {}
+    def history():
+        if 'df' not in loaded:
+            with stage("features.load") as s:
+                loaded['df'] = load_match_history(input_path).sort_values('date')
+                s.rows = len(loaded['df'])
+        return loaded['df']
+
+    # 1. Calcular Estadísticas Rodantes (Forma, Ataque)
+    def rolling():
+        with stage("features.rolling_stats", rows=len(history())):
+            return calculate_rolling_stats(history(), window=window)
     
-    final_df = df[features].copy()
+    # 2. Calcular Días de Descanso
+    def rest_days():
+        with stage("features.rest_days", rows=len(history())):
+            return calculate_rest_days(history())
+
+    def h2h():
+        print("⏳ Calculando H2H (Paternidad)...")
+        # Pasada única vectorizada (equivale a aplicar get_h2h_balance fila a fila)
+        with stage("features.h2h", rows=len(history())):
+            return calculate_h2h_balance(history())
+
+    rolling_key = stage_key("rolling_stats", data_key, window=window)
+    rest_key = stage_key("rest_days", data_key)
+    h2h_key = stage_key("h2h", data_key) if train_mode else None
+
+    def assemble():
+        stats = cached("rolling_stats", rolling_key, rolling, **cache_opts)
+        rest_stats = cached("rest_days", rest_key, rest_days, **cache_opts)
+        balance = cached("h2h", h2h_key, h2h, **cache_opts) if train_mode else None
+        return build_features(history(), stats, rest_stats, balance, train_mode)
+
+    final_key = stage_key("prepare_data", rolling_key, rest_key, h2h_key, train_mode=train_mode)
+    final_df = cached("prepare_data", final_key, assemble, **cache_opts)
     
     if train_mode:
         print(f"✅ Datos Expertos: {len(final_df)} filas.")
@@ -203,14 +628,152 @@ def prepare_data(input_path="data/laliga_advanced_stats.csv", train_mode=True):
         
     return final_df
 
-def prepare_upcoming_matches(fixtures_input, history_path="data/laliga_advanced_stats.csv"):
+# --- VARIAS LIGAS (una partición por liga, un proceso por partición) ---
+def _prepare_league(item):
+    # Se ejecuta en un proceso aparte: debe ser una función de módulo (picklable)
+    league, history_path = item
+    with quiet_unknown_teams(league != DEFAULT_LEAGUE):
+        return league, prepare_data(history_path, train_mode=True)
+
+def prepare_leagues(leagues, max_workers=None):
+    """
+    Features de entrenamiento de varias ligas a la vez. 'leagues' es una lista de códigos
+    (rutas de league_paths) o un dict liga -> ruta del histórico. Las ligas no comparten
+    nada, así que cada una va a su propio proceso. Devuelve {liga: DataFrame}.
+    """
+    if not isinstance(leagues, dict):
+        leagues = {league: league_paths(league)['history'] for league in leagues}
+    workers = min(len(leagues), max_workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return dict(map(_prepare_league, leagues.items()))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(_prepare_league, leagues.items()))
+
+# --- MATRIZ DE PREDICCIÓN (PARTIDOS FUTUROS) ---
+PREDICT_FEATURES = [
+    'home_avg_points', 'away_avg_points',
+    'home_avg_attack_power', 'away_avg_attack_power',
+    'home_form_streak', 'away_form_streak',
+    'home_rest_days', 'away_rest_days',
+    'h2h_balance',
+    'diff_points', 'diff_attack', 'diff_rest'
+]
+
+def calculate_pair_h2h(history):
+    """
+    H2H de cada pareja ORDENADA (equipo, rival) sobre todo el histórico:
+    puntos medios que saca 'home_id' contra 'away_id', juegue donde juegue.
+    """
+    history = with_team_ids(history)
+    pts_home = np.where(history['home_score'] > history['away_score'], 3,
+                        np.where(history['home_score'] == history['away_score'], 1, 0))
+    pts_away = np.where(history['away_score'] > history['home_score'], 3,
+                        np.where(history['away_score'] == history['home_score'], 1, 0))
+    as_home = pd.DataFrame({'home_id': history['home_id'].to_numpy(),
+                            'away_id': history['away_id'].to_numpy(), 'points': pts_home})
+    as_away = pd.DataFrame({'home_id': history['away_id'].to_numpy(),
+                            'away_id': history['home_id'].to_numpy(), 'points': pts_away})
+    h2h = pd.concat([as_home, as_away]).groupby(['home_id', 'away_id'])['points'].mean()
+    return h2h.rename('h2h_balance')
+
+def calculate_fixture_rest_days(fixtures_df, last_played=None):
+    """
+    Días de descanso de cada equipo en cada partido del calendario, según su partido
+    anterior en el propio calendario (utc_date). Para el primero se usa la fecha
+    de su último partido en el histórico (last_played, indexado por ID) o, si no hay, 7 días.
+    Devuelve (home_rest_days, away_rest_days) alineados con fixtures_df.
+    """
+    # Fecha local (Madrid) sin hora, igual que las fechas del histórico
+    dates = pd.to_datetime(fixtures_df['utc_date'], utc=True).dt.tz_convert('Europe/Madrid')
+    dates = dates.dt.tz_localize(None).dt.normalize()
+    n = len(fixtures_df)
+    long = pd.DataFrame({
+        'row': np.tile(np.arange(n), 2),
+        'side': np.repeat([0, 1], n),
+        'team': np.concatenate([fixtures_df['home_id'].to_numpy(), fixtures_df['away_id'].to_numpy()]),
+        'date': np.concatenate([dates.to_numpy(), dates.to_numpy()]),
+    }).sort_values(['team', 'date'], kind='stable')
+    
+    prev = long.groupby('team')['date'].shift(1)
+    if last_played is not None:
+        prev = prev.fillna(long['team'].map(last_played))
+    rest = (long['date'] - prev).dt.days.fillna(7).clip(2, 14)
+    
+    rest_matrix = np.full((2, n), 7.0)
+    rest_matrix[long['side'].to_numpy(), long['row'].to_numpy()] = rest.to_numpy()
+    return rest_matrix[0], rest_matrix[1]
+
+def matchup_rest_days(fixtures_df, last_played=None):
+    """
+    Días de descanso de cada fila por separado, contando desde el último partido del
+    histórico de cada equipo (last_played, indexado por ID) hasta 'date'. Para
+    enfrentamientos sueltos o hipotéticos, que no forman un calendario entre sí.
+    """
+    dates = pd.to_datetime(fixtures_df['date']).to_numpy(dtype='datetime64[ns]')
+    if last_played is None:
+        last_played = pd.Series(dtype='datetime64[ns]')
+    rest = []
+    for side in ['home', 'away']:
+        prev = last_played.reindex(fixtures_df[f'{side}_id']).to_numpy(dtype='datetime64[ns]')
+        days = (dates - prev) / np.timedelta64(1, 'D')
+        rest.append(np.clip(np.where(np.isnan(days), 7, np.floor(days)), 2, 14))
+    return rest[0], rest[1]
+
+def build_prediction_matrix(fixtures_df, latest_stats, pair_h2h, rows=None, rest_days=None):
+    """
+    Cruza el calendario con las stats de cada equipo y el H2H de cada pareja (sin bucles).
+    Con 'rows' (máscara booleana) solo se construyen esas filas; el descanso se sigue
+    calculando con todo el calendario. 'rest_days' = (local, visitante) ya calculados
+    (alineados con fixtures_df) en vez del descanso según el calendario.
+    """
+    fixtures_df = with_team_ids(fixtures_df)
+    # Un equipo es "conocido" si tiene estado con ese ID (los IDs son los mismos en todas las tablas)
+    known = np.ones(len(fixtures_df), dtype=bool) if rows is None else np.asarray(rows, dtype=bool).copy()
+    for side in ['home', 'away']:
+        known &= fixtures_df[f'{side}_id'].isin(latest_stats.index).to_numpy()
+    fixtures = fixtures_df[known]
+    if fixtures.empty:
+        return pd.DataFrame(columns=PREDICT_FEATURES)
+    
+    h_stats = latest_stats.reindex(fixtures['home_id'])
+    a_stats = latest_stats.reindex(fixtures['away_id'])
+    pairs = pd.MultiIndex.from_arrays([fixtures['home_id'], fixtures['away_id']])
+    h2h = pair_h2h.reindex(pairs).fillna(1.5).to_numpy()
+    
+    # Descanso real según el calendario (aquí sí usamos todos los partidos del calendario)
+    if rest_days is None:
+        rest_days = calculate_fixture_rest_days(fixtures_df, latest_stats.get('last_date'))
+    home_rest, away_rest = rest_days
+    home_rest, away_rest = home_rest[known], away_rest[known]
+    
+    X_pred = pd.DataFrame({
+        'home_avg_points': h_stats['avg_points'].to_numpy(),
+        'away_avg_points': a_stats['avg_points'].to_numpy(),
+        'home_avg_attack_power': h_stats['avg_attack_power'].to_numpy(),
+        'away_avg_attack_power': a_stats['avg_attack_power'].to_numpy(),
+        'home_form_streak': h_stats['form_streak'].to_numpy(),
+        'away_form_streak': a_stats['form_streak'].to_numpy(),
+        'home_rest_days': home_rest,
+        'away_rest_days': away_rest,
+        'h2h_balance': h2h,
+    }, index=fixtures.index)
+    X_pred['diff_points'] = X_pred['home_avg_points'] - X_pred['away_avg_points']
+    X_pred['diff_attack'] = X_pred['home_avg_attack_power'] - X_pred['away_avg_attack_power']
+    X_pred['diff_rest'] = X_pred['home_rest_days'] - X_pred['away_rest_days']
+    return X_pred[PREDICT_FEATURES]
+
+@profiled("features.prepare_upcoming")
+def prepare_upcoming_matches(fixtures_input, history_path="data/laliga_advanced_stats.csv", state_path=STATE_PATH,
+                             matchday=None):
     """
     Prepara los partidos de la próxima jornada (fixtures) pegándoles 
     las estadísticas históricas (history) para que la IA pueda predecir.
     Acepta tanto una ruta de archivo (str) como un DataFrame ya cargado.
+    Las stats de cada equipo salen del estado incremental guardado (state_path).
+    Con 'matchday' solo se preparan los partidos de esa jornada.
     """
     # 1. Validar Historial (Siempre es una ruta)
-    if not os.path.exists(history_path):
+    if not os.path.exists(history_path) and not os.path.exists(columnar_path(history_path)):
         return pd.DataFrame(), pd.DataFrame()
     
     # 2. Gestionar el input de Fixtures (Puede ser ruta o DataFrame)
@@ -227,67 +790,67 @@ def prepare_upcoming_matches(fixtures_input, history_path="data/laliga_advanced_
         return pd.DataFrame(), pd.DataFrame()
 
     # 3. Cargar Histórico (La "Enciclopedia")
-    history = pd.read_csv(history_path)
-    history = normalize_names(history)
-    history['date'] = pd.to_datetime(history['date'])
+    with stage("upcoming.load") as s:
+        history = load_match_history(history_path)
+        s.rows = len(history)
     
-    # Calcular stats actuales hasta el día de hoy
-    stats = calculate_rolling_stats(history)
-    
-    # Nos quedamos con la ÚLTIMA fila de stats de cada equipo
-    latest_stats = stats.sort_values('date').groupby('team').tail(1).set_index('team')
+    # Stats actuales de cada equipo: leemos el estado guardado y solo le añadimos
+    # en memoria los partidos que aún no tenga (sin recalcular toda la historia)
+    with stage("upcoming.team_state") as s:
+        state = sync_team_state(history, state_path=state_path, save=False)
+        latest_stats = team_state_features(state)
+        s.rows = len(latest_stats)
     
     # Normalizar nombres del calendario
     fixtures_df = normalize_names(fixtures_df)
     
-    predict_data = []
+    # 4. Construir toda la matriz de golpe con joins indexados
+    rows = None
+    if matchday is not None:
+        rows = (pd.to_numeric(fixtures_df['matchday'], errors='coerce') == matchday).to_numpy()
+    with stage("upcoming.matrix", rows=len(fixtures_df)):
+        X_pred = build_prediction_matrix(fixtures_df, latest_stats, calculate_pair_h2h(history), rows=rows)
     
-    # 4. Cruzar datos: Para cada partido futuro, buscamos cómo vienen los equipos
-    for idx, row in fixtures_df.iterrows():
-        home = row['home_team']
-        away = row['away_team']
-        
-        # Si un equipo es nuevo y no tiene historia, no podemos predecir
-        if home not in latest_stats.index or away not in latest_stats.index:
-            # Añadimos fila vacía para mantener el índice alineado
-            predict_data.append({}) 
-            continue
-            
-        h_stats = latest_stats.loc[home]
-        a_stats = latest_stats.loc[away]
-        
-        # Simular H2H
-        dummy_row = {'date': datetime.now(), 'home_team': home, 'away_team': away}
-        h2h = get_h2h_balance(dummy_row, history)
-        
-        # Construir la fila exacta que necesita la IA
-        match_features = {
-            'home_avg_points': h_stats['avg_points'],
-            'away_avg_points': a_stats['avg_points'],
-            'home_avg_attack_power': h_stats['avg_attack_power'], 
-            'away_avg_attack_power': a_stats['avg_attack_power'], 
-            'home_form_streak': h_stats['form_streak'],
-            'away_form_streak': a_stats['form_streak'],
-            'home_rest_days': 7,
-            'away_rest_days': 7,
-            'h2h_balance': h2h,
-            'diff_points': h_stats['avg_points'] - a_stats['avg_points'],
-            'diff_attack': h_stats['avg_attack_power'] - a_stats['avg_attack_power'],
-            'diff_rest': 0
-        }
-        predict_data.append(match_features)
-        
-    # Crear DataFrame y limpiar filas vacías si hubo equipos desconocidos
-    X_pred = pd.DataFrame(predict_data)
+    # Avisar (en vez de descartarlos en silencio) de los equipos sin histórico
+    selected = fixtures_df if rows is None else fixtures_df[rows]
+    fixture_teams = set(selected['home_team'].astype(str)) | set(selected['away_team'].astype(str))
+    missing = sorted(fixture_teams - set(latest_stats['name']))
+    if missing:
+        print(f"⚠️ Equipos sin histórico, sus partidos no se pueden predecir: {missing}")
     
     # Devolvemos X_pred (para la IA) y fixtures_df (para mostrar en pantalla)
-    # Es vital que tengan el mismo número de filas, por eso rellenamos con {} arriba
+    # Ambos comparten índice; los partidos con equipos sin historia se descartan
     if not X_pred.empty:
-        valid_indices = X_pred.dropna().index
-        return X_pred.loc[valid_indices], fixtures_df.loc[valid_indices]
+        return X_pred, fixtures_df.loc[X_pred.index]
     
     return pd.DataFrame(), pd.DataFrame()
 
+def prepare_matchups(matchups, history_path="data/laliga_advanced_stats.csv", state_path=STATE_PATH):
+    """
+    Features de enfrentamientos arbitrarios (no hace falta calendario): DataFrame con
+    home_team, away_team y date (None = hoy). Cada fila es independiente: el descanso se
+    cuenta desde el último partido de cada equipo en el histórico.
+    Devuelve (X_pred, matchups) con el mismo índice; sin las filas de equipos sin histórico.
+    """
+    if not os.path.exists(history_path) and not os.path.exists(columnar_path(history_path)):
+        return pd.DataFrame(), pd.DataFrame()
+    with stage("matchups.load") as s:
+        history = load_match_history(history_path)
+        state = sync_team_state(history, state_path=state_path, save=False)
+        latest_stats = team_state_features(state)
+        s.rows = len(history)
+
+    matchups = normalize_names(matchups.copy())
+    today = pd.Timestamp.now(tz='Europe/Madrid').tz_localize(None).normalize()
+    dates = pd.to_datetime(matchups['date'])
+    if dates.dt.tz is not None:  # Hora UTC de la API -> fecha de Madrid, como el histórico
+        dates = dates.dt.tz_convert('Europe/Madrid').dt.tz_localize(None)
+    matchups['date'] = dates.fillna(today).dt.normalize()
+    with stage("matchups.matrix", rows=len(matchups)):
+        X_pred = build_prediction_matrix(matchups, latest_stats, calculate_pair_h2h(history),
+                                         rest_days=matchup_rest_days(matchups, latest_stats['last_date']))
+    return X_pred, matchups.loc[X_pred.index]
+
 if __name__ == "__main__":
     # Solo para probar que no explota
     df = prepare_data(train_mode=True)
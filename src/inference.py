@@ -0,0 +1,76 @@
+# Predicción sin scikit-learn: los árboles del modelo entrenado se aplanan en arrays
+# NumPy contiguos (ver export_compiled_model en models.py) y se evalúan aquí de forma
+# vectorizada. La app solo necesita NumPy para puntuar los partidos de la jornada.
+import numpy as np
+import json
+import os
+
+COMPILED_DIR = "data/model_winner_compiled"
+ARRAYS = ['feature', 'threshold', 'left', 'right', 'missing_left', 'value', 'roots', 'tree_class', 'tree_scale', 'baseline']
+
+class CompiledForest:
+    """
+    Ensemble de árboles aplanado:
+    - feature/threshold/left/right/missing_left/value: un elemento por nodo (feature = -1 en hojas)
+    - roots: nodo raíz de cada árbol | tree_class: clase a la que suma | tree_scale: learning rate
+    - baseline: predicción inicial (raw) de cada clase
+    """
+
+    def __init__(self, arrays, meta):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.classes_ = np.asarray(meta['classes'])
+        self.feature_names_in_ = np.asarray(meta['feature_names'], dtype=object)
+        self.n_features_in_ = len(self.feature_names_in_)
+        self.max_depth = int(meta['max_depth'])
+        self.meta = meta
+        # Matriz árbol -> clase para sumar todas las hojas de golpe
+        self._class_matrix = np.zeros((len(self.roots), len(self.classes_)))
+        self._class_matrix[np.arange(len(self.roots)), self.tree_class] = self.tree_scale
+
+    def _as_array(self, X):
+        if hasattr(X, 'columns'):
+            X = X[list(self.feature_names_in_)]
+        return np.asarray(X, dtype=np.float64)
+
+    def decision_function(self, X):
+        X = self._as_array(X)
+        n_rows = X.shape[0]
+        rows = np.arange(n_rows)[:, None]
+        # Todas las filas recorren todos los árboles a la vez: un paso por nivel de profundidad
+        node = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            feat = self.feature[node]
+            is_leaf = feat < 0
+            if is_leaf.all():
+                break
+            x = X[rows, np.where(is_leaf, 0, feat)]
+            go_left = np.where(np.isnan(x), self.missing_left[node] == 1, x <= self.threshold[node])
+            node = np.where(is_leaf, node, np.where(go_left, self.left[node], self.right[node]))
+        return self.baseline + self.value[node] @ self._class_matrix
+
+    def predict_proba(self, X):
+        raw = self.decision_function(X)
+        # Softmax estable
+        raw = raw - raw.max(axis=1, keepdims=True)
+        exp = np.exp(raw)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.decision_function(X), axis=1)]
+
+def save_compiled_model(arrays, meta, out_dir=COMPILED_DIR):
+    """Un .npy por array (se pueden abrir con memory-map) + meta.json."""
+    os.makedirs(out_dir, exist_ok=True)
+    for name in ARRAYS:
+        np.save(os.path.join(out_dir, f"{name}.npy"), np.ascontiguousarray(arrays[name]))
+    with open(os.path.join(out_dir, "meta.json"), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+def load_compiled_model(out_dir=COMPILED_DIR, mmap=True):
+    """Carga el modelo aplanado (por defecto con memory-map, sin copiar a memoria)."""
+    with open(os.path.join(out_dir, "meta.json")) as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(out_dir, f"{name}.npy"), mmap_mode='r' if mmap else None)
+              for name in ARRAYS}
+    return CompiledForest(arrays, meta)
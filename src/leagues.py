@@ -0,0 +1,81 @@
+# Ligas soportadas: la liga es la clave de partición de todo el pipeline.
+# Cada liga tiene su histórico, calendario, estado de equipos, modelo e instantáneas
+# en su propia carpeta. LaLiga (SP1) conserva las rutas de siempre en data/.
+import os
+from datetime import date
+
+DATA_DIR = "data"
+DEFAULT_LEAGUE = "SP1"
+
+# Código de Football-Data.co.uk -> nombre y código de la API de football-data.org
+# (api_code None = la competición no está en el plan gratuito de la API)
+LEAGUES = {
+    "SP1": {"name": "LaLiga", "api_code": "PD"},
+    "SP2": {"name": "LaLiga Hypermotion", "api_code": None},
+    "E0": {"name": "Premier League", "api_code": "PL"},
+    "E1": {"name": "Championship", "api_code": "ELC"},
+    "I1": {"name": "Serie A", "api_code": "SA"},
+    "D1": {"name": "Bundesliga", "api_code": "BL1"},
+    "F1": {"name": "Ligue 1", "api_code": "FL1"},
+    "N1": {"name": "Eredivisie", "api_code": "DED"},
+    "P1": {"name": "Primeira Liga", "api_code": "PPL"},
+}
+
+FD_BASE_URL = "https://www.football-data.co.uk/mmz4281"
+API_BASE_URL = "https://api.football-data.org/v4/competitions"
+SEASON_START_MONTH = 7  # Desde julio cuenta la temporada nueva (Football-Data publica su CSV en verano)
+
+def current_season(today=None):
+    """Año en que empezó la temporada en curso (2025 = 25/26), según la fecha."""
+    today = today or date.today()
+    return today.year if today.month >= SEASON_START_MONTH else today.year - 1
+
+def recent_seasons(n_seasons=4, latest=None):
+    """Códigos de temporada de Football-Data, de la actual hacia atrás: ['2526', '2425', ...]"""
+    latest = latest if latest is not None else current_season()
+    return [f"{year % 100:02d}{(year + 1) % 100:02d}" for year in range(latest, latest - n_seasons, -1)]
+
+def season_end(season):
+    """Día en que se da por cerrada una temporada de Football-Data ('2425' -> 1 de julio de 2025)."""
+    start = int(season[:2])
+    start += 2000 if start < 90 else 1900
+    return date(start + 1, SEASON_START_MONTH, 1)
+
+def season_urls(league=DEFAULT_LEAGUE, seasons=None):
+    """URLs de los CSV de una liga (la primera es la temporada en curso)."""
+    seasons = seasons or recent_seasons()
+    return [f"{FD_BASE_URL}/{season}/{league}.csv" for season in seasons]
+
+def fixtures_url(league=DEFAULT_LEAGUE):
+    """Endpoint de partidos de la API (None si la liga no está en la API)."""
+    api_code = LEAGUES[league]["api_code"]
+    return f"{API_BASE_URL}/{api_code}/matches" if api_code else None
+
+def league_paths(league=DEFAULT_LEAGUE, data_dir=DATA_DIR):
+    """Ficheros de una liga: data/ para LaLiga, data/leagues/<código>/ para el resto."""
+    if league not in LEAGUES:
+        raise ValueError(f"Liga desconocida: {league} (usa {list(LEAGUES)})")
+    if league == DEFAULT_LEAGUE:
+        return {
+            'history': os.path.join(data_dir, "laliga_advanced_stats.csv"),
+            'fixtures': os.path.join(data_dir, "laliga_fixtures.csv"),
+            'state': os.path.join(data_dir, "team_state.csv"),
+            'model': os.path.join(data_dir, "model_winner.pkl"),
+            'compiled': os.path.join(data_dir, "model_winner_compiled"),
+            'predictions': os.path.join(data_dir, "predictions"),
+            'registry': os.path.join(data_dir, "models"),
+        }
+    base = os.path.join(data_dir, "leagues", league)
+    return {
+        'history': os.path.join(base, "advanced_stats.csv"),
+        'fixtures': os.path.join(base, "fixtures.csv"),
+        'state': os.path.join(base, "team_state.csv"),
+        'model': os.path.join(base, "model_winner.pkl"),
+        'compiled': os.path.join(base, "model_winner_compiled"),
+        'predictions': os.path.join(base, "predictions"),
+        'registry': os.path.join(base, "models"),
+    }
+
+def available_leagues(data_dir=DATA_DIR):
+    """Ligas con modelo entrenado en disco (en el orden de LEAGUES)."""
+    return [code for code in LEAGUES if os.path.exists(league_paths(code, data_dir)['model'])]
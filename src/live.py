@@ -0,0 +1,135 @@
+# Modo en directo: UN hilo por liga consulta la API durante la jornada y guarda en
+# memoria el estado/marcador de los partidos que se están jugando. La app lee de aquí
+# (nunca llama a la API por visitante), así que el coste no depende de cuántos miren.
+# - Solo se pregunta por los partidos de hoy que ya han empezado o van a empezar
+#   (filtro de estado en la API) y con GET condicional (If-None-Match)
+# - Sin partidos en juego ni a punto de empezar, el hilo no hace peticiones
+# - Cada cambio de estado o marcador sube 'version'
+import pandas as pd
+import logging
+import os
+import sys
+import threading
+import time
+
+# Truco para imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from api_client import LIVE_STATUSES, api_get_if_changed, parse_matches
+from leagues import DEFAULT_LEAGUE, fixtures_url, league_paths
+from teams import quiet_unknown_teams
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = 30                 # Plan gratuito: 10 peticiones/minuto para todo
+KICKOFF_MARGIN = pd.Timedelta(minutes=10)    # Empezar a consultar un poco antes del inicio
+MATCH_WINDOW = pd.Timedelta(hours=3)         # Un partido empezado hace más de esto ya acabó
+LIVE_KEY = ['matchday', 'home_team', 'away_team']  # Misma clave que las instantáneas
+LIVE_FILTER = ",".join(LIVE_STATUSES[:2] + ("FINISHED",))  # IN_PLAY,PAUSED,FINISHED
+
+def active_window(fixtures, now=None):
+    """Partidos no terminados cuyo inicio está entre (ahora - 3h) y (ahora + 10 min)."""
+    now = now or pd.Timestamp.now(tz='UTC')
+    kickoff = pd.to_datetime(fixtures['utc_date'], utc=True)
+    pending = fixtures['status'] != 'FINISHED'
+    return fixtures[pending & (kickoff <= now + KICKOFF_MARGIN) & (kickoff >= now - MATCH_WINDOW)]
+
+class LivePoller:
+    """Estado en directo de una liga, compartido por todas las sesiones de la app."""
+
+    def __init__(self, league=DEFAULT_LEAGUE, interval=POLL_SECONDS, base_url=None, fixtures_path=None):
+        self.league = league
+        self.interval = interval
+        self.base_url = base_url or fixtures_url(league)
+        self.fixtures_path = fixtures_path or league_paths(league)['fixtures']
+        self.live = {}            # (jornada, local, visitante) -> {'status', 'real_result'}
+        self.version = 0
+        self.etag = None
+        self.last_poll = None
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.base_url is None:
+            logger.warning(f"⚠️ {self.league} no está en la API: sin modo en directo.")
+            return self
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"live-{self.league}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:  # Un fallo de red no debe matar el hilo
+                logger.warning(f"⚠️ Directo {self.league}: {e}")
+            self._stop.wait(self.interval)
+
+    def _fixtures(self):
+        if not os.path.exists(self.fixtures_path):
+            return pd.DataFrame(columns=['utc_date', 'status'])
+        return pd.read_csv(self.fixtures_path, usecols=['utc_date', 'status'])
+
+    def poll_once(self, now=None):
+        """Una consulta (si hay partidos en ventana). Devuelve las claves de los partidos que cambiaron."""
+        now = now or pd.Timestamp.now(tz='UTC')
+        window = active_window(self._fixtures(), now)
+        if window.empty and not any(m['status'] in LIVE_STATUSES for m in self.live.values()):
+            return []
+        # Desde el día en que empezó el partido más antiguo posible (los que cruzan la medianoche UTC)
+        params = {'dateFrom': (now - MATCH_WINDOW).strftime("%Y-%m-%d"), 'dateTo': now.strftime("%Y-%m-%d"),
+                  'status': LIVE_FILTER}
+        data, etag = api_get_if_changed(self.base_url, params, self.etag)
+        self.requests += 1
+        self.last_poll = time.time()
+        if data is None:  # 304: nada nuevo
+            return []
+        with quiet_unknown_teams(self.league != DEFAULT_LEAGUE):
+            updates = parse_matches(data, live_scores=True)
+        return self.apply_updates(updates, etag)
+
+    def apply_updates(self, updates, etag=None):
+        changed = []
+        with self._lock:
+            self.etag = etag
+            for rec in updates[LIVE_KEY + ['status', 'real_result']].itertuples(index=False):
+                key = (int(rec.matchday), rec.home_team, rec.away_team)
+                state = {'status': rec.status, 'real_result': rec.real_result}
+                if self.live.get(key) != state:
+                    self.live[key] = state
+                    changed.append(key)
+            if changed:
+                self.version += 1
+        if changed:
+            logger.info(f"🔴 Directo {self.league}: {len(changed)} partidos actualizados (versión {self.version})")
+        return changed
+
+    def snapshot(self):
+        """(versión, copia del estado en directo) para pintar sin bloquear al hilo."""
+        with self._lock:
+            return self.version, dict(self.live)
+
+    def apply(self, fixtures):
+        """Calendario con el estado y marcador en directo encima (por jornada y equipos)."""
+        _, live = self.snapshot()
+        if not live:
+            return fixtures
+        fixtures = fixtures.copy()
+        overrides = pd.DataFrame.from_dict(live, orient='index')
+        overrides.index = pd.MultiIndex.from_tuples(overrides.index, names=LIVE_KEY)
+        keys = pd.MultiIndex.from_arrays([fixtures['matchday'].astype(int), fixtures['home_team'].astype(str),
+                                          fixtures['away_team'].astype(str)], names=LIVE_KEY)
+        found = keys.isin(overrides.index)
+        rows = overrides.loc[keys[found]]
+        # Columnas como object: en un calendario sin resultados 'real_result' se lee como float
+        fixtures[['status', 'real_result']] = fixtures[['status', 'real_result']].astype(object)
+        fixtures.loc[found, 'status'] = rows['status'].to_numpy()
+        fixtures.loc[found, 'real_result'] = rows['real_result'].to_numpy()
+        return fixtures
@@ -0,0 +1,228 @@
+# Base de datos local (SQLite, sin servidor) con el histórico, el calendario y los equipos.
+# Las features y el entrenamiento leen SIEMPRE el CSV/Feather (la fuente de verdad, que es
+# lo que se sube al repo); esto es una copia consultable para trabajar en local: SQL a mano,
+# el H2H de una pareja suelta (feature_eng.lookup_h2h_balance) sin cargar todo el histórico.
+# No se sube al repo (.gitignore): en GitHub Actions se crea de cero en cada ejecución y
+# nada depende de ella; en local persiste y las recargas diarias son baratas.
+# - Escrituras idempotentes (UPSERT): volver a cargar una temporada solo toca las filas
+#   que han cambiado de verdad; el resto ni se reescribe
+# - Índices: (liga, local, fecha), (liga, visitante, fecha) y la clave (liga, local, visitante, fecha);
+#   el calendario va por (liga, jornada, local, visitante), como las instantáneas
+# Uso: python src/match_db.py [--leagues SP1 E0] [--import]
+import pandas as pd
+import numpy as np
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+from contextlib import closing, contextmanager
+
+# Truco para imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from leagues import DATA_DIR, DEFAULT_LEAGUE, LEAGUES, league_paths
+from storage import HISTORY_SCHEMA, load_history
+from teams import canonical_teams, resolve_team_ids
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.environ.get("LALIGA_DB", os.path.join(DATA_DIR, "matches.db"))
+
+MATCH_COLUMNS = list(HISTORY_SCHEMA)
+MATCH_KEY = ['league', 'home_team', 'away_team', 'date']
+FIXTURE_DB_COLUMNS = ["match_id", "matchday", "utc_date", "date_str", "status", "home_team", "away_team", "real_result"]
+FIXTURE_KEY = ['league', 'matchday', 'home_team', 'away_team']  # Misma clave que las instantáneas
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS teams (
+    league TEXT NOT NULL,
+    name TEXT NOT NULL,
+    team_id INTEGER,              -- ID del registro de teams.py (NULL si no está registrado)
+    PRIMARY KEY (league, name)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS matches (
+    league TEXT NOT NULL,
+    date TEXT NOT NULL,           -- YYYY-MM-DD
+    home_team TEXT NOT NULL,
+    away_team TEXT NOT NULL,
+    {", ".join(f"{c} INTEGER" for c in MATCH_COLUMNS[3:])},
+    PRIMARY KEY (league, home_team, away_team, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_matches_home ON matches (league, home_team, date);
+CREATE INDEX IF NOT EXISTS idx_matches_away ON matches (league, away_team, date);
+
+CREATE TABLE IF NOT EXISTS fixtures (
+    league TEXT NOT NULL,
+    match_id INTEGER,             -- ID de la API (los calendarios antiguos no lo traen)
+    matchday INTEGER NOT NULL,
+    utc_date TEXT,
+    date_str TEXT,
+    status TEXT,
+    home_team TEXT NOT NULL,
+    away_team TEXT NOT NULL,
+    real_result TEXT,
+    PRIMARY KEY (league, matchday, home_team, away_team)
+) WITHOUT ROWID;
+"""
+
+_READY = set()  # Rutas cuyo esquema ya se ha creado en este proceso
+
+@contextmanager
+def connect(db_path=None):
+    """Conexión con el esquema creado; confirma la transacción al salir (o la deshace si hay error)."""
+    db_path = db_path or DB_PATH
+    if db_path not in _READY:
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    with closing(sqlite3.connect(db_path)) as conn:
+        if db_path not in _READY:
+            conn.execute("PRAGMA journal_mode=WAL")  # Lectores (app) sin bloquear al que escribe
+            conn.executescript(SCHEMA)
+            _READY.add(db_path)
+        with conn:
+            yield conn
+
+def _upsert_sql(table, columns, key):
+    """INSERT ... ON CONFLICT DO UPDATE que solo escribe si algún valor es distinto."""
+    values = [c for c in columns if c not in key]
+    assign = ", ".join(f"{c} = excluded.{c}" for c in values)
+    differs = " OR ".join(f"{table}.{c} IS NOT excluded.{c}" for c in values)
+    return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT ({', '.join(key)}) DO UPDATE SET {assign} WHERE {differs}")
+
+def _upsert(conn, table, columns, key, rows):
+    """Ejecuta el UPSERT y devuelve (insertadas, actualizadas)."""
+    before = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    changes = conn.total_changes
+    conn.executemany(_upsert_sql(table, columns, key), rows)
+    written = conn.total_changes - changes
+    inserted = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] - before
+    return inserted, written - inserted
+
+def _records(df, columns):
+    # Filas como tuplas de tipos nativos de Python (NaN -> NULL)
+    df = df[columns].astype(object)
+    return list(df.where(df.notna(), None).itertuples(index=False, name=None))
+
+def _upsert_teams(conn, league, names):
+    names = sorted(set(names))
+    # Mismo ID que en el histórico y el estado (también para los equipos sin registrar)
+    rows = [(league, name, int(team_id)) for name, team_id in zip(names, resolve_team_ids(names))]
+    return _upsert(conn, 'teams', ['league', 'name', 'team_id'], ['league', 'name'], rows)
+
+def upsert_matches(history, league=DEFAULT_LEAGUE, db_path=None):
+    """Guarda el histórico (columnas de HISTORY_SCHEMA). Devuelve (insertados, actualizados)."""
+    if history.empty:
+        return 0, 0
+    df = history[[c for c in MATCH_COLUMNS if c in history.columns]].copy()
+    for col in MATCH_COLUMNS[3:]:
+        if col not in df.columns:
+            df[col] = None
+        # Enteros de Python (los huecos de las columnas float32 quedan en NULL)
+        df[col] = df[col].astype('Int64')
+    df['date'] = pd.to_datetime(df['date']).dt.strftime("%Y-%m-%d")
+    df['home_team'] = df['home_team'].astype(str)
+    df['away_team'] = df['away_team'].astype(str)
+    df['league'] = league
+    with connect(db_path) as conn:
+        _upsert_teams(conn, league, pd.concat([df['home_team'], df['away_team']]))
+        return _upsert(conn, 'matches', ['league'] + MATCH_COLUMNS, MATCH_KEY, _records(df, ['league'] + MATCH_COLUMNS))
+
+def upsert_fixture_rows(fixtures, league=DEFAULT_LEAGUE, db_path=None):
+    """Guarda partidos del calendario por (jornada, local, visitante). Devuelve (insertados, actualizados)."""
+    if fixtures.empty:
+        return 0, 0
+    df = fixtures.reindex(columns=FIXTURE_DB_COLUMNS)
+    df['match_id'] = pd.to_numeric(df['match_id'], errors='coerce').astype('Int64')
+    df['matchday'] = pd.to_numeric(df['matchday'], errors='coerce').astype('Int64')
+    df = df.dropna(subset=['matchday', 'home_team', 'away_team'])
+    # Mismos nombres canónicos que el histórico (los calendarios antiguos traen los de la API)
+    for col in ['home_team', 'away_team']:
+        df[col] = np.asarray(canonical_teams(df[col]).astype(str))
+    for col in ['utc_date', 'date_str', 'status', 'home_team', 'away_team', 'real_result']:
+        df[col] = df[col].astype(object).where(df[col].notna(), None)
+    df['league'] = league
+    columns = ['league'] + FIXTURE_DB_COLUMNS
+    with connect(db_path) as conn:
+        _upsert_teams(conn, league, pd.concat([df['home_team'], df['away_team']]).astype(str))
+        return _upsert(conn, 'fixtures', columns, FIXTURE_KEY, _records(df, columns))
+
+def store(kind, df, league=DEFAULT_LEAGUE, db_path=None):
+    """
+    Vuelca 'matches' o 'fixtures' a la base de datos sin interrumpir al que llama:
+    los ficheros ya están guardados, un fallo aquí solo se avisa.
+    """
+    writer = upsert_matches if kind == 'matches' else upsert_fixture_rows
+    try:
+        inserted, updated = writer(df, league, db_path)
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ No se pudo actualizar la base de datos ({kind}): {e}")
+        return None
+    logger.info(f"🗄️ Base de datos {league}/{kind}: {inserted} nuevos, {updated} modificados, "
+                f"{len(df) - inserted - updated} sin cambios.")
+    return inserted, updated
+
+# --- CONSULTAS (todas van por índice) ---
+def _query(sql, params, db_path=None):
+    with connect(db_path) as conn:
+        cursor = conn.execute(sql, params)
+        columns = [d[0] for d in cursor.description]
+        return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+def _date_filter(before, after):
+    sql, params = "", []
+    if before is not None:
+        sql += " AND date < ?"
+        params.append(pd.Timestamp(before).strftime("%Y-%m-%d"))
+    if after is not None:
+        sql += " AND date >= ?"
+        params.append(pd.Timestamp(after).strftime("%Y-%m-%d"))
+    return sql, params
+
+def pair_points(team, rival, league=DEFAULT_LEAGUE, before=None, db_path=None):
+    """
+    (partidos, puntos) de 'team' contra 'rival' antes de 'before', sumados en SQLite:
+    para un H2H suelto no hace falta traer los partidos a pandas.
+    """
+    dates, params = _date_filter(before, None)
+    points = ("CASE WHEN {own} > {rival} THEN 3 WHEN {own} = {rival} THEN 1 ELSE 0 END")
+    sql = (f"SELECT COUNT(*), COALESCE(SUM(points), 0) FROM ("
+           f"SELECT {points.format(own='home_score', rival='away_score')} AS points FROM matches "
+           f"WHERE league = ? AND home_team = ? AND away_team = ?{dates} UNION ALL "
+           f"SELECT {points.format(own='away_score', rival='home_score')} FROM matches "
+           f"WHERE league = ? AND home_team = ? AND away_team = ?{dates})")
+    with connect(db_path) as conn:
+        return conn.execute(sql, [league, team, rival, *params, league, rival, team, *params]).fetchone()
+
+def league_teams(league=DEFAULT_LEAGUE, db_path=None):
+    return _query("SELECT name, team_id FROM teams WHERE league = ? ORDER BY name", [league], db_path)
+
+# --- CARGA INICIAL DESDE LOS FICHEROS ---
+def import_league(league=DEFAULT_LEAGUE, db_path=None):
+    """Vuelca a la base de datos el histórico y el calendario que ya hay en disco."""
+    paths = league_paths(league)
+    history = load_history(paths['history'])
+    if not history.empty:
+        store('matches', history, league, db_path)
+    if os.path.exists(paths['fixtures']):
+        store('fixtures', pd.read_csv(paths['fixtures']), league, db_path)
+
+def table_counts(league=DEFAULT_LEAGUE, db_path=None):
+    with connect(db_path) as conn:
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table} WHERE league = ?", [league]).fetchone()[0]
+                for table in ['matches', 'fixtures', 'teams']}
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Base de datos local de partidos (SQLite)")
+    parser.add_argument("--leagues", nargs="+", choices=list(LEAGUES), default=[DEFAULT_LEAGUE])
+    parser.add_argument("--import", dest="do_import", action="store_true",
+                        help="Cargar el histórico y el calendario de disco (idempotente)")
+    args = parser.parse_args()
+    for league in args.leagues:
+        if args.do_import:
+            import_league(league)
+        counts = table_counts(league)
+        print(f"🗄️ {LEAGUES[league]['name']} ({league}) en {DB_PATH}: {counts['matches']} partidos, "
+              f"{counts['fixtures']} del calendario, {counts['teams']} equipos")
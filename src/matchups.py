@@ -0,0 +1,163 @@
+# Probabilidades de CUALQUIER enfrentamiento, no solo los del calendario: una lista de
+# (local, visitante, fecha) o la matriz completa de la liga (20 x 19 cruces) se
+# convierte en features y se puntúa con una sola llamada vectorizada al modelo.
+# La matriz de cada liga se memoriza por proceso; la clave incluye la firma del modelo
+# compilado, del histórico y del estado de equipos, así que se invalida sola al reentrenar.
+# Uso: python src/matchups.py [--league SP1] [--date 2026-05-01] [--pair Barcelona "Real Madrid"]
+import pandas as pd
+import numpy as np
+import argparse
+import functools
+import logging
+import os
+import sys
+import time
+
+# Truco para imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from feature_eng import STATE_PATH, load_team_state, prepare_matchups
+from inference import load_compiled_model
+from leagues import DEFAULT_LEAGUE, LEAGUES, league_paths
+from profiling import profiled
+from snapshots import FIXTURES_PATH, HISTORY_PATH, PRED_CODES
+from storage import columnar_path
+from teams import canonical_teams, quiet_unknown_teams
+
+logger = logging.getLogger(__name__)
+
+MATCHUP_COLUMNS = ['home_team', 'away_team', 'date', 'p1', 'pX', 'p2', 'pred']
+MATRIX_ENTRIES = 2 * len(LEAGUES)  # Matriz actual + anterior de cada liga
+
+def as_matchups(matchups):
+    """Lista de (local, visitante[, fecha]) o DataFrame -> DataFrame home_team/away_team/date."""
+    if isinstance(matchups, pd.DataFrame):
+        df = matchups.reset_index(drop=True)
+    else:
+        rows = [tuple(m) + (None,) * (3 - len(m)) for m in matchups]
+        df = pd.DataFrame(rows, columns=['home_team', 'away_team', 'date'], dtype=object)
+    if 'date' not in df.columns:
+        df = df.assign(date=None)
+    return df[['home_team', 'away_team', 'date']]
+
+@profiled("matchups.predict")
+def predict_matchups(model, matchups, history_path=HISTORY_PATH, state_path=STATE_PATH):
+    """
+    Tabla ordenada (una fila por enfrentamiento, en el orden de entrada) con p1/pX/p2 y
+    la predicción. Los enfrentamientos con equipos sin histórico quedan con NaN.
+    """
+    matchups = as_matchups(matchups)
+    X_pred, prepared = prepare_matchups(matchups, history_path, state_path)
+    probs = np.full((len(matchups), 3), np.nan)
+    if not X_pred.empty:
+        probs[X_pred.index.to_numpy()] = model.predict_proba(X_pred)
+
+    known = ~np.isnan(probs[:, 0])
+    pred = np.full(len(matchups), None, dtype=object)
+    pred[known] = PRED_CODES[np.argmax(probs[known], axis=1)]
+    table = pd.DataFrame({
+        'home_team': matchups['home_team'].astype(str),
+        'away_team': matchups['away_team'].astype(str),
+        'date': pd.NaT, 'p1': probs[:, 0], 'pX': probs[:, 1], 'p2': probs[:, 2], 'pred': pred,
+    })
+    # Nombres canónicos y fecha efectiva (la que se usó para el descanso) de las filas puntuadas
+    if not prepared.empty:
+        rows = prepared.index.to_numpy()
+        table.loc[rows, 'home_team'] = prepared['home_team'].astype(str).to_numpy()
+        table.loc[rows, 'away_team'] = prepared['away_team'].astype(str).to_numpy()
+        table.loc[rows, 'date'] = prepared['date'].to_numpy()
+    return table[MATCHUP_COLUMNS]
+
+def league_teams(fixtures_path=FIXTURES_PATH, state_path=STATE_PATH):
+    """Equipos de la temporada: los del calendario o, si no hay, los del estado guardado."""
+    if os.path.exists(fixtures_path):
+        fixtures = pd.read_csv(fixtures_path, usecols=['home_team', 'away_team'])
+        names = canonical_teams(pd.concat([fixtures['home_team'], fixtures['away_team']])).astype(str)
+        return sorted(set(names))
+    state = load_team_state(state_path)
+    if state.empty:
+        return []
+    # Los que han jugado en el último año (los descendidos hace tiempo no)
+    recent = state['last_date'] >= state['last_date'].max() - pd.Timedelta(days=365)
+    return sorted(state.loc[recent, 'name'].astype(str))
+
+def probability_matrix(model, teams=None, date=None, history_path=HISTORY_PATH, state_path=STATE_PATH,
+                       fixtures_path=FIXTURES_PATH):
+    """
+    Todos los cruces entre 'teams' (por defecto los de la temporada) en una sola predicción.
+    Devuelve (equipos, probs) con probs[i, j] = (p1, pX, p2) de i en casa contra j
+    (NaN en la diagonal y en los equipos sin histórico).
+    """
+    teams = np.asarray(teams if teams is not None else league_teams(fixtures_path, state_path), dtype=object)
+    n = len(teams)
+    home, away = np.nonzero(~np.eye(n, dtype=bool))
+    table = predict_matchups(model, pd.DataFrame({'home_team': teams[home], 'away_team': teams[away],
+                                                  'date': date}), history_path, state_path)
+    probs = np.full((n, n, 3), np.nan)
+    probs[home, away] = table[['p1', 'pX', 'p2']].to_numpy()
+    return teams, probs
+
+def matrix_table(teams, probs):
+    """(equipos, probs) -> tabla ordenada de los n x (n - 1) cruces."""
+    home, away = np.nonzero(~np.eye(len(teams), dtype=bool))
+    return pd.DataFrame({'home_team': teams[home], 'away_team': teams[away], 'p1': probs[home, away, 0],
+                         'pX': probs[home, away, 1], 'p2': probs[home, away, 2]})
+
+# --- MATRIZ MEMORIZADA POR LIGA ---
+def file_signature(path):
+    if not os.path.exists(path):
+        return None
+    info = os.stat(path)
+    return (path, info.st_mtime_ns, info.st_size)
+
+@functools.lru_cache(maxsize=MATRIX_ENTRIES)
+def _league_matrix(league, date, teams, *signatures):
+    # 'signatures' solo forma parte de la clave: si cambia algún fichero, es otra entrada
+    paths = league_paths(league)
+    with quiet_unknown_teams(league != DEFAULT_LEAGUE):
+        teams, probs = probability_matrix(load_compiled_model(paths['compiled']), teams, date,
+                                          paths['history'], paths['state'], paths['fixtures'])
+    probs.flags.writeable = False  # Copia compartida entre llamadas: que nadie la modifique
+    return teams, probs
+
+def league_matrix(league=DEFAULT_LEAGUE, date=None, teams=None):
+    """
+    Matriz de probabilidades de la liga con el modelo compilado, memorizada.
+    Se recalcula si cambia el modelo, el histórico, el estado de equipos o el calendario.
+    """
+    paths = league_paths(league)
+    date = pd.Timestamp(date) if date is not None else pd.Timestamp.now(tz='Europe/Madrid').tz_localize(None)
+    signatures = [file_signature(p) for p in (os.path.join(paths['compiled'], "meta.json"), paths['history'],
+                                              columnar_path(paths['history']), paths['state'], paths['fixtures'])]
+    return _league_matrix(league, date.strftime("%Y-%m-%d"), tuple(teams) if teams is not None else None,
+                          *signatures)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Probabilidades de cualquier enfrentamiento")
+    parser.add_argument("--league", choices=list(LEAGUES), default=DEFAULT_LEAGUE)
+    parser.add_argument("--date", help="Fecha de los partidos (por defecto hoy)")
+    parser.add_argument("--pair", nargs=2, metavar=("LOCAL", "VISITANTE"), help="Un único enfrentamiento")
+    parser.add_argument("--output", help="CSV donde guardar la tabla de todos los cruces")
+    args = parser.parse_args()
+
+    if args.pair:
+        paths = league_paths(args.league)
+        with quiet_unknown_teams(args.league != DEFAULT_LEAGUE):
+            row = predict_matchups(load_compiled_model(paths['compiled']), [(*args.pair, args.date)],
+                                   paths['history'], paths['state']).iloc[0]
+        if pd.isna(row['p1']):
+            print(f"⚠️ Sin histórico para {row['home_team']} o {row['away_team']}.")
+        else:
+            print(f"⚽ {row['home_team']} vs {row['away_team']}: 1 {row['p1']:.1%} | X {row['pX']:.1%} | "
+                  f"2 {row['p2']:.1%} -> {row['pred']}")
+    else:
+        start = time.perf_counter()
+        teams, probs = league_matrix(args.league, args.date)
+        logger.info(f"🧮 {len(teams) * (len(teams) - 1)} cruces en {time.perf_counter() - start:.2f}s")
+        home_win = pd.DataFrame(probs[:, :, 0], index=teams, columns=teams)
+        print(f"\n🏟️ {LEAGUES[args.league]['name'].upper()}: PROBABILIDAD DE VICTORIA LOCAL (fila = local)")
+        print(home_win.to_string(float_format=lambda x: f"{x:.2f}", na_rep="-"))
+        if args.output:
+            matrix_table(teams, probs).to_csv(args.output, index=False)
+            logger.info(f"💾 Tabla guardada en {args.output}")
@@ -4,14 +4,27 @@ import logging
 import os
 import sys
 import numpy as np
+import time
+import argparse
+import json
+import hashlib
+from datetime import datetime
 
 # Truco para imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from sklearn.ensemble import GradientBoostingClassifier
-from sklearn.model_selection import TimeSeriesSplit, RandomizedSearchCV
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (activa HalvingRandomSearchCV)
+from sklearn.model_selection import TimeSeriesSplit, RandomizedSearchCV, HalvingRandomSearchCV
 from sklearn.metrics import accuracy_score, classification_report, log_loss
-from feature_eng import prepare_data
+from sklearn.inspection import permutation_importance
+from sklearn.base import clone
+from feature_eng import prepare_data, prepare_leagues
+from leagues import DEFAULT_LEAGUE, league_paths
+from inference import CompiledForest, save_compiled_model
+from snapshots import write_snapshot, file_hash
+from registry import prune_versions, register_model
+from profiling import stage, profiled
 
 # Configuración
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -22,30 +35,45 @@ MODEL_DIR = os.path.join(BASE_DIR, "data")
 MODEL_PATH = os.path.join(MODEL_DIR, "model_winner.pkl")
 os.makedirs(MODEL_DIR, exist_ok=True)
 
-def train_and_evaluate():
-    logger.info("🚀 INICIANDO ENTRENAMIENTO 'NIVEL EXPERTO'...")
-    
-    # 1. Cargar datos
-    df = prepare_data(train_mode=True)
-    if df.empty:
-        logger.error("❌ No hay datos. Ejecuta 'src/stats_scraper.py' primero.")
-        return
+# Modos de entrenamiento:
+# - "full": GradientBoosting exacto + RandomizedSearchCV (20 candidatos x 5 folds)
+# - "fast": HistGradientBoosting (histogramas + early stopping) + búsqueda por halving
+TRAINING_MODES = ("full", "fast")
 
-    # 2. Separación Temporal Estricta
-    # 85% para entrenar/optimizar, 15% para la prueba de fuego final
-    split_idx = int(len(df) * 0.85)
-    train_df = df.iloc[:split_idx]
-    test_df = df.iloc[split_idx:]
-    
-    logger.info(f"📊 Dataset Total: {len(df)} partidos")
-    logger.info(f"   🔸 Entrenamiento y Optimización: {len(train_df)} partidos")
-    logger.info(f"   🔸 Validación Final (Futuro):    {len(test_df)} partidos")
+def build_search(mode="full"):
+    """Devuelve el buscador de hiperparámetros para el modo elegido."""
+    # Configuración de Validación Cruzada Temporal
+    tscv = TimeSeriesSplit(n_splits=5)
 
-    features = [c for c in df.columns if c not in ['date', 'home_team', 'away_team', 'TARGET']]
-    X_train = train_df[features]
-    y_train = train_df['TARGET']
-    X_test = test_df[features]
-    y_test = test_df['TARGET']
+    if mode == "fast":
+        # Árboles sobre histogramas: mucho más rápido y con early stopping interno
+        # (se para solo cuando la validación deja de mejorar)
+        hgb = HistGradientBoostingClassifier(
+            max_iter=300, early_stopping=True, validation_fraction=0.15,
+            n_iter_no_change=15, scoring='loss', random_state=42
+        )
+        param_dist = {
+            'learning_rate': [0.01, 0.03, 0.05, 0.1],
+            'max_depth': [3, 4, 5],
+            'max_leaf_nodes': [7, 15, 31],
+            'min_samples_leaf': [10, 20, 40],
+            'l2_regularization': [0.0, 0.1, 1.0],
+        }
+        # Successive halving: muchos candidatos con pocos datos y solo los mejores
+        # pasan a la siguiente ronda con más datos
+        return HalvingRandomSearchCV(
+            estimator=hgb,
+            param_distributions=param_dist,
+            n_candidates=20,
+            factor=3,
+            resource='n_samples',
+            min_resources='exhaust',
+            scoring='neg_log_loss',
+            cv=tscv,
+            n_jobs=-1,
+            random_state=42,
+            verbose=1
+        )
 
     # 3. DEFINICIÓN DEL BUSCADOR DE HIPERPARÁMETROS
     # En lugar de valores fijos, damos rangos para que la IA busque lo mejor
@@ -60,13 +88,8 @@ def train_and_evaluate():
     # Modelo base que aprende de sus errores, aprende de cada arbol de manera secuencial
     gbm = GradientBoostingClassifier(random_state=42)
 
-    # Configuración de Validación Cruzada Temporal
-    tscv = TimeSeriesSplit(n_splits=5)
-
-    logger.info("🧠 Buscando la configuración perfecta (Grid Search)... Esto tomará unos segundos.")
-    
     # prueba automáticamente combinaciones con RandomizedSearchCV para encontrar la configuración matemática perfecta
-    search = RandomizedSearchCV(
+    return RandomizedSearchCV(
         estimator=gbm,
         param_distributions=param_dist,
         n_iter=20,              # Probar 20 combinaciones distintas
@@ -77,17 +100,212 @@ def train_and_evaluate():
         verbose=1
     )
 
-    search.fit(X_train, y_train)
-    
-    best_model = search.best_estimator_
+def feature_importance(model, X_test, y_test):
+    """Importancia de cada variable (HistGradientBoosting no trae feature_importances_)."""
+    if hasattr(model, 'feature_importances_'):
+        return model.feature_importances_
+    result = permutation_importance(model, X_test, y_test, scoring='neg_log_loss', n_repeats=5, random_state=42)
+    return result.importances_mean
+
+# --- EXPORTACIÓN A FORMATO COMPILADO (solo NumPy) ---
+def compiled_dir_for(model_path):
+    """data/model_winner.pkl -> data/model_winner_compiled/"""
+    return os.path.splitext(model_path)[0] + "_compiled"
+
+def _model_trees(model):
+    """Recorre los árboles del modelo: (feature, threshold, left, right, missing_left, value, clase, escala, profundidad)."""
+    if isinstance(model, GradientBoostingClassifier):
+        if model.estimators_.shape[1] == 1:
+            raise ValueError("Solo se exportan modelos multiclase (1/X/2)")
+        for stage in model.estimators_:
+            for k, est in enumerate(stage):
+                t = est.tree_
+                is_leaf = t.children_left == -1
+                yield (np.where(is_leaf, -1, t.feature), t.threshold, t.children_left, t.children_right,
+                       t.missing_go_to_left, t.value[:, 0, 0], k, model.learning_rate, t.max_depth)
+    elif isinstance(model, HistGradientBoostingClassifier):
+        for iteration in model._predictors:
+            for k, predictor in enumerate(iteration):
+                nodes = predictor.nodes
+                if nodes['is_categorical'].any():
+                    raise ValueError("Los splits categóricos no se pueden exportar")
+                is_leaf = nodes['is_leaf'] == 1
+                yield (np.where(is_leaf, -1, nodes['feature_idx']), nodes['num_threshold'], nodes['left'],
+                       nodes['right'], nodes['missing_go_to_left'], nodes['value'], k, 1.0, nodes['depth'].max())
+    else:
+        raise ValueError(f"Modelo no soportado para exportar: {type(model).__name__}")
+
+def flatten_model(model, X_check):
+    """Aplana todos los árboles en arrays contiguos y comprueba que predice igual que sklearn."""
+    parts = {name: [] for name in ['feature', 'threshold', 'left', 'right', 'missing_left', 'value']}
+    roots, tree_class, tree_scale = [], [], []
+    offset, max_depth = 0, 0
+    for feature, threshold, left, right, missing_left, value, k, scale, depth in _model_trees(model):
+        n_nodes = len(feature)
+        is_leaf = feature < 0
+        parts['feature'].append(feature.astype(np.int32))
+        parts['threshold'].append(np.asarray(threshold, dtype=np.float64))
+        parts['left'].append(np.where(is_leaf, -1, np.asarray(left, dtype=np.int64) + offset).astype(np.int32))
+        parts['right'].append(np.where(is_leaf, -1, np.asarray(right, dtype=np.int64) + offset).astype(np.int32))
+        parts['missing_left'].append(np.asarray(missing_left, dtype=np.uint8))
+        parts['value'].append(np.asarray(value, dtype=np.float64))
+        roots.append(offset)
+        tree_class.append(k)
+        tree_scale.append(scale)
+        max_depth = max(max_depth, int(depth))
+        offset += n_nodes
+
+    arrays = {name: np.concatenate(chunks) for name, chunks in parts.items()}
+    arrays.update({
+        'roots': np.asarray(roots, dtype=np.int32),
+        'tree_class': np.asarray(tree_class, dtype=np.int32),
+        'tree_scale': np.asarray(tree_scale, dtype=np.float64),
+        'baseline': np.zeros(len(model.classes_)),
+    })
+    meta = {
+        'model_type': type(model).__name__,
+        'classes': [int(c) for c in model.classes_],
+        'feature_names': [str(f) for f in model.feature_names_in_],
+        'max_depth': max_depth,
+        'n_trees': len(roots),
+    }
+
+    # La predicción inicial (prior de cada clase) = decision_function - suma de los árboles
+    forest = CompiledForest(arrays, meta)
+    arrays['baseline'] = np.mean(model.decision_function(X_check) - forest.decision_function(X_check), axis=0)
+    forest = CompiledForest(arrays, meta)
+    if not np.allclose(forest.predict_proba(X_check), model.predict_proba(X_check), rtol=0, atol=1e-9):
+        raise ValueError("❌ El modelo compilado no reproduce predict_proba de sklearn")
+    return arrays, meta
+
+@profiled("train.export_compiled", rows=None)
+def export_compiled_model(model, X_check, out_dir):
+    arrays, meta = flatten_model(model, X_check)
+    save_compiled_model(arrays, meta, out_dir)
+    logger.info(f"📦 Modelo compilado ({meta['n_trees']} árboles) guardado en: {out_dir}")
+    return out_dir
+
+# --- REENTRENAMIENTO EN CALIENTE ---
+# Junto al modelo guardamos los mejores hiperparámetros y la huella de los datos.
+# Si desde el último entrenamiento han llegado pocos partidos, no repetimos la búsqueda:
+# reentrenamos con los parámetros guardados (o nada, si los datos son idénticos).
+# Las referencias son las de la última BÚSQUEDA completa ('search_n_rows', 'search_log_loss'),
+# no las del último reajuste: si no, podrían ir desplazándose un poco cada noche sin rehacerla nunca.
+RETUNE_GROWTH = 0.10     # Rehacer la búsqueda si el dataset crece más de un 10%
+LOSS_TOLERANCE = 0.02    # ... o si el log-loss del holdout empeora más de esto
+
+def meta_path_for(model_path):
+    """data/model_winner.pkl -> data/model_winner_meta.json"""
+    return os.path.splitext(model_path)[0] + "_meta.json"
+
+def data_fingerprint(df):
+    """Huella (sha256) del dataset de entrenamiento completo."""
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return hashlib.sha256(row_hashes.tobytes()).hexdigest()
+
+def load_training_meta(model_path=MODEL_PATH):
+    path = meta_path_for(model_path)
+    if not os.path.exists(path) or not os.path.exists(model_path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_training_meta(meta, model_path=MODEL_PATH):
+    with open(meta_path_for(model_path), 'w') as f:
+        json.dump(meta, f, indent=2, default=str)
+
+def choose_training_path(meta, mode, fingerprint, n_rows, force_search=False):
+    """Decide entre 'reuse' (datos idénticos), 'refit' (pocos datos nuevos) o 'search'."""
+    if force_search or meta is None or meta.get('mode') != mode:
+        return 'search'
+    if meta.get('fingerprint') == fingerprint:
+        return 'reuse'
+    if n_rows > meta.get('search_n_rows', meta.get('n_rows', 0)) * (1 + RETUNE_GROWTH):
+        return 'search'
+    return 'refit'
+
+def search_baseline(meta):
+    """Log-loss del holdout de la última búsqueda (metas antiguas: el último guardado)."""
+    return meta.get('search_log_loss', meta['log_loss'])
+
+def fit_with_search(mode, X_train, y_train):
+    search = build_search(mode)
+    logger.info("🧠 Buscando la configuración perfecta (Grid Search)... Esto tomará unos segundos.")
+    with stage("train.search", rows=len(X_train), mode=mode):
+        search.fit(X_train, y_train)
     logger.info(f"✅ Mejor configuración encontrada: {search.best_params_}")
+    return search.best_estimator_, search.best_params_
+
+def fit_with_params(mode, params, X_train, y_train):
+    model = clone(build_search(mode).estimator).set_params(**params)
+    logger.info(f"♻️ Reentrenando con los hiperparámetros guardados: {params}")
+    with stage("train.refit", rows=len(X_train), mode=mode):
+        return model.fit(X_train, y_train)
+
+@profiled("train.total", rows=None)
+def train_and_evaluate(mode="full", model_path=MODEL_PATH, force_search=False,
+                       input_path="data/laliga_advanced_stats.csv", league=None, data=None):
+    """
+    Entrena y evalúa un modelo. Con 'league' las rutas (histórico, modelo, instantáneas)
+    salen de la carpeta de esa liga; con 'data' se usan features ya calculadas.
+    """
+    if mode not in TRAINING_MODES:
+        raise ValueError(f"Modo de entrenamiento desconocido: {mode} (usa {TRAINING_MODES})")
+    paths = league_paths(league or DEFAULT_LEAGUE, MODEL_DIR)
+    if league:
+        model_path, input_path = paths['model'], paths['history']
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    logger.info(f"🚀 INICIANDO ENTRENAMIENTO 'NIVEL EXPERTO' (modo {mode}, liga {league or DEFAULT_LEAGUE})...")
+    start = time.perf_counter()
+    
+    # 1. Cargar datos
+    df = data if data is not None else prepare_data(input_path, train_mode=True)
+    if df.empty:
+        logger.error("❌ No hay datos. Ejecuta 'src/stats_scraper.py' primero.")
+        return
+
+    # 2. Separación Temporal Estricta
+    # 85% para entrenar/optimizar, 15% para la prueba de fuego final
+    split_idx = int(len(df) * 0.85)
+    train_df = df.iloc[:split_idx]
+    test_df = df.iloc[split_idx:]
+    
+    logger.info(f"📊 Dataset Total: {len(df)} partidos")
+    logger.info(f"   🔸 Entrenamiento y Optimización: {len(train_df)} partidos")
+    logger.info(f"   🔸 Validación Final (Futuro):    {len(test_df)} partidos")
+
+    features = [c for c in df.columns if c not in ['date', 'home_team', 'away_team', 'TARGET']]
+    X_train = train_df[features]
+    y_train = train_df['TARGET']
+    X_test = test_df[features]
+    y_test = test_df['TARGET']
+
+    # 3. ¿Hace falta buscar hiperparámetros otra vez?
+    meta = load_training_meta(model_path) if model_path else None
+    fingerprint = data_fingerprint(df)
+    path = choose_training_path(meta, mode, fingerprint, len(df), force_search)
+    logger.info(f"🧭 Ruta de entrenamiento: {path.upper()}")
+    
+    fit_start = time.perf_counter()
+    if path == 'reuse':
+        best_model, best_params = joblib.load(model_path), meta['best_params']
+    elif path == 'refit':
+        best_params = meta['best_params']
+        best_model = fit_with_params(mode, best_params, X_train, y_train)
+        refit_loss = log_loss(y_test, best_model.predict_proba(X_test), labels=[0, 1, 2])
+        if refit_loss > search_baseline(meta) + LOSS_TOLERANCE:
+            logger.info(f"📉 El log-loss empeoró ({search_baseline(meta):.4f} -> {refit_loss:.4f}), se rehace la búsqueda.")
+            path = 'search'
+    if path == 'search':
+        best_model, best_params = fit_with_search(mode, X_train, y_train)
+    fit_seconds = time.perf_counter() - fit_start
 
     # 4. Evaluación Final en datos nunca vistos (Test Set)
     predictions = best_model.predict(X_test)
     probs = best_model.predict_proba(X_test)
     
     acc = accuracy_score(y_test, predictions)
-    loss = log_loss(y_test, probs)
+    loss = log_loss(y_test, probs, labels=[0, 1, 2])
     
     print("\n" + "="*40)
     print(f"🏆 RESULTADOS DEL MODELO EXPERTO")
@@ -102,15 +320,78 @@ def train_and_evaluate():
     # 5. Análisis de Importancia (Qué mira la IA)
     importance = pd.DataFrame({
         'Variable': features,
-        'Importancia': best_model.feature_importances_
+        'Importancia': feature_importance(best_model, X_test, y_test)
     }).sort_values('Importancia', ascending=False)
     
     print("\n⭐ FACTORES CLAVE (Top 5):")
     print(importance.head(5).to_string(index=False))
 
-    # 6. Guardar
-    joblib.dump(best_model, MODEL_PATH)
-    logger.info(f"\n💾 Cerebro optimizado guardado en: {MODEL_PATH}")
+    # 6. Guardar (modelo + hiperparámetros y huella de los datos para la próxima vez)
+    if model_path and path != 'reuse':
+        joblib.dump(best_model, model_path)
+        logger.info(f"\n💾 Cerebro optimizado guardado en: {model_path}")
+    # Versión compilada para la app (solo NumPy, sin pickle ni sklearn)
+    if model_path and (path != 'reuse' or not os.path.exists(compiled_dir_for(model_path))):
+        export_compiled_model(best_model, X_test, compiled_dir_for(model_path))
+    # Instantánea de predicciones del calendario con este modelo
+    if model_path:
+        with stage("train.snapshot"):
+            write_snapshot(best_model, file_hash(model_path), paths['predictions'],
+                           paths['fixtures'], paths['history'], paths['state'])
+    
+    total_seconds = time.perf_counter() - start
+    result = {
+        'league': league or DEFAULT_LEAGUE,
+        'mode': mode,
+        'path': path,
+        'accuracy': acc,
+        'log_loss': loss,
+        'fit_seconds': fit_seconds,
+        'total_seconds': total_seconds,
+        'best_params': best_params,
+    }
+    if model_path and path != 'reuse':
+        training_meta = {
+            **result,
+            'fingerprint': fingerprint,
+            'n_rows': len(df),
+            'last_date': df['date'].max(),
+            'features': features,
+            'trained_at': datetime.now().isoformat(timespec='seconds'),
+            # Referencias para decidir cuándo rehacer la búsqueda: solo cambian al buscar
+            'search_log_loss': loss if path == 'search' else search_baseline(meta),
+            'search_n_rows': len(df) if path == 'search' else meta.get('search_n_rows', meta['n_rows']),
+        }
+        save_training_meta(training_meta, model_path)
+        # Versión en el registro (para comparar o volver atrás) y poda de las antiguas
+        if model_path == paths['model']:
+            league_code = league or DEFAULT_LEAGUE
+            result['version'] = register_model(model_path, compiled_dir_for(model_path), training_meta, league_code)
+            prune_versions(league_code)
+    logger.info(f"⏱️ Entrenamiento ({mode}, ruta {path}): ajuste {fit_seconds:.1f}s, total {total_seconds:.1f}s")
+    return result
+
+def train_leagues(leagues, mode="full", force_search=False, max_workers=None):
+    """Features de todas las ligas en paralelo (un proceso por liga) y un modelo por liga."""
+    features = prepare_leagues(leagues, max_workers=max_workers)
+    results = []
+    for league in leagues:
+        if features[league].empty:
+            logger.error(f"❌ Sin datos para {league}. Ejecuta 'src/stats_scraper.py --leagues {league}'.")
+            continue
+        results.append(train_and_evaluate(mode=mode, force_search=force_search, league=league, data=features[league]))
+    return results
 
 if __name__ == "__main__":
-    train_and_evaluate()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Entrena el modelo de LaLiga")
+    parser.add_argument("--mode", choices=TRAINING_MODES, default="full",
+                        help="full: GradientBoosting + RandomizedSearchCV | fast: HistGradientBoosting + halving")
+    parser.add_argument("--retune", action="store_true",
+                        help="Rehacer la búsqueda de hiperparámetros aunque haya pocos datos nuevos")
+    parser.add_argument("--leagues", nargs="+", default=[DEFAULT_LEAGUE],
+                        help="Ligas a entrenar (códigos de Football-Data: SP1, E0, I1...)")
+    args = parser.parse_args()
+    if args.leagues == [DEFAULT_LEAGUE]:
+        train_and_evaluate(mode=args.mode, force_search=args.retune)
+    else:
+        train_leagues(args.leagues, mode=args.mode, force_search=args.retune)
@@ -0,0 +1,214 @@
+# Pipeline diario en un solo proceso: python -m src
+# 1. Descarga histórico y calendario A LA VEZ (asyncio + hilos: ambos esperan a la red).
+#    Cada hilo solo escribe sus propios ficheros; la base de datos y el estado de equipos
+#    se actualizan después, en serie (con --verify-state se comprueba además el estado
+#    incremental contra una reconstrucción completa; es lento, solo para depurar)
+# 2. Huella (sha256) de lo descargado por liga y comparación con la última ejecución
+# 3. Solo si cambió el histórico: features + entrenamiento (+ instantánea de predicciones)
+#    Si solo cambió el calendario: nueva instantánea con el modelo compilado (sin sklearn)
+# 4. Si no cambió nada, no se entrena ni hay nada que commitear
+# Uso: python -m src [--leagues SP1 E0] [--mode full] [--force] [--no-download] [--verify-state]
+import pandas as pd
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Truco para imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from api_client import fetch_fixtures, sync_fixtures
+from leagues import LEAGUES, DEFAULT_LEAGUE, league_paths, fixtures_url
+from profiling import stage
+from snapshots import file_hash, write_snapshot
+from stats_scraper import N_SEASONS, persist_league, update_league
+from teams import quiet_unknown_teams
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PIPELINE_STATE_PATH = "data/pipeline_state.json"
+
+@contextmanager
+def timed(timings, name, **extra):
+    """Mide una etapa: queda en 'timings' (resumen final) y en el perfil si está activo."""
+    start = time.perf_counter()
+    with stage(f"pipeline.{name}", **extra):
+        yield
+    timings.append((name, time.perf_counter() - start))
+
+# --- 1. DESCARGAS ---
+def download_histories(leagues, n_seasons=None):
+    for league in leagues:
+        update_league(league, n_seasons or N_SEASONS, persist=False)
+
+def download_fixtures(leagues, incremental=False):
+    for league in leagues:
+        base_url, output_path = fixtures_url(league), league_paths(league)['fixtures']
+        if base_url is None:
+            logger.warning(f"⚠️ {LEAGUES[league]['name']} no está disponible en la API, sin calendario.")
+            continue
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with quiet_unknown_teams(league != DEFAULT_LEAGUE):
+            if incremental:
+                sync_fixtures(base_url, output_path, league=league, persist=False)
+            else:
+                fetch_fixtures(base_url, output_path, league, persist=False)
+
+async def download_all(leagues, timings, n_seasons=None, incremental=False):
+    """Histórico y calendario en paralelo (las dos descargas son independientes)."""
+    async def run(name, func, *args):
+        # La etapa se mide dentro del hilo (su propia pila de etapas; sin memoria fuera del hilo principal)
+        def work():
+            with timed(timings, name):
+                func(*args)
+        await asyncio.to_thread(work)
+    await asyncio.gather(run("download_history", download_histories, leagues, n_seasons),
+                         run("download_fixtures", download_fixtures, leagues, incremental))
+
+def persist_downloads(leagues, verify_state=False):
+    """
+    Escrituras compartidas de lo descargado, de una en una y ya sin hilos: base de datos
+    (histórico y calendario) y estado de equipos. Con verify_state el estado se compara
+    con una reconstrucción completa (anula la ventaja del incremental: solo para depurar).
+    """
+    from feature_eng import load_match_history, verify_team_state
+    from match_db import store
+    from storage import load_history
+    for league in leagues:
+        paths = league_paths(league)
+        with quiet_unknown_teams(league != DEFAULT_LEAGUE):
+            if os.path.exists(paths['history']):
+                persist_league(league, load_history(paths['history']))
+                if verify_state:
+                    verify_team_state(load_match_history(paths['history']), paths['state'])
+            if os.path.exists(paths['fixtures']):
+                store('fixtures', pd.read_csv(paths['fixtures']), league)
+
+# --- 2. HUELLAS ---
+def fingerprint(league):
+    """Huella del histórico y del calendario de una liga (y si hay modelo entrenado)."""
+    paths = league_paths(league)
+    return {
+        'history': file_hash(paths['history']) if os.path.exists(paths['history']) else None,
+        'fixtures': file_hash(paths['fixtures']) if os.path.exists(paths['fixtures']) else None,
+        'model': file_hash(paths['model']) if os.path.exists(paths['model']) else None,
+    }
+
+def load_pipeline_state(path=PIPELINE_STATE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_pipeline_state(state, path=PIPELINE_STATE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+def plan_league(current, previous, force=False):
+    """
+    Qué hay que hacer con una liga:
+    - 'train': histórico nuevo (o sin modelo, o forzado)
+    - 'snapshot': solo ha cambiado el calendario
+    - 'skip': nada nuevo
+    """
+    if current['history'] is None:
+        return 'skip'  # Sin datos no se puede hacer nada (la descarga ya avisó)
+    if force or current['model'] is None or previous is None or current['history'] != previous.get('history'):
+        return 'train'
+    if current['fixtures'] != previous.get('fixtures'):
+        return 'snapshot'
+    return 'skip'
+
+# --- 3. ENTRENAMIENTO / INSTANTÁNEAS ---
+def train(leagues, mode="full", force_search=False):
+    from models import train_and_evaluate, train_leagues  # Import tardío: sklearn solo si se entrena
+    if leagues == [DEFAULT_LEAGUE]:
+        return [train_and_evaluate(mode=mode, force_search=force_search)]
+    return train_leagues(leagues, mode=mode, force_search=force_search)
+
+def refresh_snapshot(league):
+    from inference import load_compiled_model
+    paths = league_paths(league)
+    if not os.path.exists(os.path.join(paths['compiled'], "meta.json")):
+        logger.warning(f"⚠️ {league}: no hay modelo compilado, no se puede actualizar la instantánea.")
+        return None
+    with quiet_unknown_teams(league != DEFAULT_LEAGUE):
+        return write_snapshot(load_compiled_model(paths['compiled']), file_hash(paths['model']),
+                              paths['predictions'], paths['fixtures'], paths['history'], paths['state'])
+
+def run_pipeline(leagues=(DEFAULT_LEAGUE,), mode="full", force=False, force_search=False,
+                 download=True, n_seasons=None, incremental=False, state_path=PIPELINE_STATE_PATH,
+                 verify_state=False):
+    """
+    Ejecuta el pipeline completo. Devuelve (cambió algo, plan por liga, tiempos por etapa).
+    """
+    leagues = list(leagues)
+    timings = []
+    start = time.perf_counter()
+
+    if download:
+        asyncio.run(download_all(leagues, timings, n_seasons, incremental))
+        with timed(timings, "persist"):
+            persist_downloads(leagues, verify_state)
+
+    with timed(timings, "fingerprint"):
+        previous = load_pipeline_state(state_path)
+        current = {league: fingerprint(league) for league in leagues}
+        plan = {league: plan_league(current[league], previous.get(league), force) for league in leagues}
+    for league, action in plan.items():
+        logger.info(f"🧭 {league}: {action.upper()}")
+
+    to_train = [league for league in leagues if plan[league] == 'train']
+    if to_train:
+        with timed(timings, "train", leagues=to_train):
+            train(to_train, mode, force_search)
+    for league in [league for league in leagues if plan[league] == 'snapshot']:
+        with timed(timings, f"snapshot_{league}"):
+            refresh_snapshot(league)
+
+    changed = any(action != 'skip' for action in plan.values())
+    if changed:
+        # Huellas después de entrenar (el modelo también forma parte de la huella)
+        previous.update({league: fingerprint(league) for league in leagues if plan[league] != 'skip'})
+        save_pipeline_state(previous, state_path)
+    timings.append(("total", time.perf_counter() - start))
+    return changed, plan, timings
+
+def write_github_output(changed, path=None):
+    """En GitHub Actions, deja 'changed=true/false' para saltarse el commit."""
+    path = path or os.environ.get("GITHUB_OUTPUT")
+    if path:
+        with open(path, 'a') as f:
+            f.write(f"changed={'true' if changed else 'false'}\n")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src", description="Pipeline diario: descargas, entrenamiento y predicciones")
+    parser.add_argument("--leagues", nargs="+", choices=list(LEAGUES), default=[DEFAULT_LEAGUE])
+    parser.add_argument("--mode", choices=["full", "fast"], default="full")
+    parser.add_argument("--force", action="store_true", help="Entrenar aunque no haya datos nuevos")
+    parser.add_argument("--retune", action="store_true", help="Rehacer la búsqueda de hiperparámetros")
+    parser.add_argument("--no-download", action="store_true", help="Usar los ficheros que ya hay en disco")
+    parser.add_argument("--seasons", type=int, default=None, help="Temporadas de histórico a descargar")
+    parser.add_argument("--incremental", action="store_true", help="Calendario: solo la ventana de fechas cercana")
+    parser.add_argument("--verify-state", action="store_true",
+                        help="Depuración: comparar el estado incremental con una reconstrucción completa")
+    args = parser.parse_args(argv)
+
+    changed, plan, timings = run_pipeline(args.leagues, args.mode, args.force, args.retune,
+                                          not args.no_download, args.seasons, args.incremental,
+                                          verify_state=args.verify_state)
+    print("\n⏱️ TIEMPOS POR ETAPA")
+    for name, seconds in timings:
+        print(f"   {name:<20} {seconds:8.2f}s")
+    print("✅ Hay cambios que guardar." if changed else "💤 Sin datos nuevos: nada que entrenar ni commitear.")
+    write_github_output(changed)
+    return changed
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# Instrumentación opcional por etapas del pipeline (tiempo, CPU, memoria, filas).
+# Desactivada por defecto: se activa con la variable de entorno LALIGA_PROFILE=1
+# (o llamando a enable()). Cada etapa escribe una línea JSON en PROFILE_PATH y,
+# con LALIGA_PROFILE_CPROFILE=1, un volcado de cProfile por etapa en PROFILE_DIR.
+# tracemalloc encarece bastante el código con muchas asignaciones: para medir solo
+# tiempos fiables, LALIGA_PROFILE_MEMORY=0 (peak_mb queda vacío). La memoria solo se
+# mide en el hilo principal (las etapas de otros hilos dejan peak_mb vacío).
+#
+#   with stage("features.h2h") as s:
+#       df['h2h_balance'] = calculate_h2h_balance(df)
+#       s.rows = len(df)
+#
+#   @profiled("train.fit")
+#   def fit(...): ...
+#
+# Resumen: python src/profiling.py [data/profiles/stages.jsonl]
+import pandas as pd
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+PROFILE_DIR = os.environ.get("LALIGA_PROFILE_DIR", "data/profiles")
+PROFILE_PATH = os.path.join(PROFILE_DIR, "stages.jsonl")
+
+_CONFIG = {
+    'enabled': os.environ.get("LALIGA_PROFILE", "") not in ("", "0"),
+    'cprofile': os.environ.get("LALIGA_PROFILE_CPROFILE", "") not in ("", "0"),
+    'memory': os.environ.get("LALIGA_PROFILE_MEMORY", "1") not in ("", "0"),
+    'path': PROFILE_PATH,
+}
+_LOCAL = threading.local()   # Pila de etapas abiertas (por hilo)
+_WRITE_LOCK = threading.Lock()
+
+def enable(path=PROFILE_PATH, cprofile=False, memory=True):
+    _CONFIG.update(enabled=True, cprofile=cprofile, memory=memory, path=path)
+
+def disable():
+    _CONFIG['enabled'] = False
+
+def is_enabled():
+    return _CONFIG['enabled']
+
+def _stack():
+    if not hasattr(_LOCAL, 'stack'):
+        _LOCAL.stack = []
+    return _LOCAL.stack
+
+def count_rows(result):
+    """Filas de un resultado típico del pipeline (DataFrame, array o tupla que empieza por uno)."""
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    if isinstance(result, (pd.DataFrame, pd.Series)) or hasattr(result, 'shape'):
+        return len(result)
+    return None
+
+class _NullStage:
+    """Etapa vacía: lo que se usa cuando la instrumentación está apagada."""
+    rows = None
+    extra = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+class Stage:
+    def __init__(self, name, rows=None, **extra):
+        self.name = name
+        self.rows = rows
+        self.extra = extra
+        self.peak = 0
+
+    def __enter__(self):
+        stack = _stack()
+        self.parent = stack[-1] if stack else None
+        # tracemalloc es global: la etapa exterior lo arranca y las interiores
+        # reinician el pico (guardando antes el de la exterior para no perderlo).
+        # Solo en el hilo principal: desde otros hilos se mezclarían los picos de todos
+        self._memory = _CONFIG['memory'] and threading.current_thread() is threading.main_thread()
+        if self._memory:
+            self._owns_tracing = not tracemalloc.is_tracing()
+            if self._owns_tracing:
+                tracemalloc.start()
+            elif self.parent is not None:
+                self.parent.peak = max(self.parent.peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+            self._mem_start = tracemalloc.get_traced_memory()[0]
+
+        # Solo un cProfile activo a la vez: se perfila la etapa más exterior
+        self._profiler = None
+        if _CONFIG['cprofile'] and not any(s._profiler for s in stack):
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        stack.append(self)
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        if self._profiler is not None:
+            self._profiler.disable()
+        _stack().pop()
+        peak_mb = None
+        if self._memory:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            if self._owns_tracing:
+                tracemalloc.stop()
+            elif self.parent is not None:
+                self.parent.peak = max(self.parent.peak, self.peak)
+            peak_mb = round((self.peak - self._mem_start) / 1e6, 3)
+
+        record = {
+            'ts': datetime.now().isoformat(timespec='milliseconds'),
+            'stage': self.name,
+            'parent': self.parent.name if self.parent is not None else None,
+            'wall_s': round(wall, 6),
+            'cpu_s': round(cpu, 6),
+            'peak_mb': peak_mb,
+            'rows': self.rows,
+            'ok': exc_type is None,
+            'pid': os.getpid(),
+            **self.extra,
+        }
+        if self._profiler is not None:
+            record['cprofile'] = self._dump_profile()
+        write_record(record)
+        return False
+
+    def _dump_profile(self):
+        out_dir = os.path.dirname(_CONFIG['path']) or "."
+        os.makedirs(out_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        path = os.path.join(out_dir, f"{self.name}_{stamp}_{os.getpid()}.prof")
+        self._profiler.dump_stats(path)
+        return path
+
+def write_record(record):
+    path = _CONFIG['path']
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    line = json.dumps(record, default=str) + "\n"
+    with _WRITE_LOCK, open(path, 'a') as f:
+        f.write(line)
+
+def stage(name, rows=None, **extra):
+    """Context manager de una etapa con nombre (no hace nada si la instrumentación está apagada)."""
+    if not _CONFIG['enabled']:
+        return _NULL_STAGE
+    return Stage(name, rows, **extra)
+
+def profiled(name, rows=count_rows):
+    """Decorador: mide la función como etapa 'name'; las filas salen de rows(resultado)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _CONFIG['enabled']:
+                return func(*args, **kwargs)
+            with Stage(name) as s:
+                result = func(*args, **kwargs)
+                s.rows = rows(result) if rows else None
+            return result
+        return wrapper
+    return decorator
+
+def load_records(path=PROFILE_PATH):
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return pd.read_json(path, lines=True)
+
+def summarize(path=PROFILE_PATH):
+    """Resumen por etapa: nº de ejecuciones, tiempo medio/máximo, CPU y pico de memoria."""
+    records = load_records(path)
+    if records.empty:
+        return records
+    return records.groupby('stage').agg(
+        runs=('wall_s', 'size'),
+        wall_mean_s=('wall_s', 'mean'),
+        wall_max_s=('wall_s', 'max'),
+        cpu_mean_s=('cpu_s', 'mean'),
+        peak_max_mb=('peak_mb', 'max'),
+        rows_last=('rows', 'last'),
+    ).sort_values('wall_mean_s', ascending=False)
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else PROFILE_PATH
+    summary = summarize(path)
+    if summary.empty:
+        print(f"⚠️ No hay mediciones en {path} (activa LALIGA_PROFILE=1)")
+    else:
+        print(f"⏱️ ETAPAS ({path})")
+        print(summary.to_string(float_format=lambda x: f"{x:.4f}"))
@@ -0,0 +1,238 @@
+# Registro de versiones de modelos: cada entrenamiento que produce un modelo nuevo se
+# guarda en su propia carpeta (pickle + versión compilada + meta.json con métricas,
+# features, huella de los datos y fecha), así se pueden comparar y volver atrás.
+#   data/models/<versión>/               (LaLiga; resto de ligas en data/leagues/<código>/models/)
+#   data/models/ACTIVE                   versión que está ahora en data/model_winner.pkl
+# La versión es <fecha>_<hash del pickle>: el hash es el mismo 'model_hash' de las instantáneas.
+# Las versiones no se suben al repo (.gitignore): cada copia haría crecer el historial de
+# git aunque luego se poden. Solo se commitea el modelo activo (data/model_winner.pkl).
+# Los modelos se cargan a través de una caché LRU en memoria acotada por tamaño
+# (LALIGA_MODEL_CACHE_MB, por defecto 256 MB) compartida por la app y el backtest.
+# Uso: python src/registry.py [--league SP1] list | activate <versión> | prune [--keep 5] | register
+import pandas as pd
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+# Truco para imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from inference import ARRAYS, load_compiled_model
+from leagues import DATA_DIR, DEFAULT_LEAGUE, LEAGUES, league_paths
+from snapshots import file_hash
+
+logger = logging.getLogger(__name__)
+
+KEEP_VERSIONS = 5        # Versiones que se conservan al podar (la activa nunca se borra)
+MODEL_CACHE_MAX_BYTES = int(float(os.environ.get("LALIGA_MODEL_CACHE_MB", "256")) * 1e6)
+ACTIVE_FILE = "ACTIVE"
+# Rutas absolutas (como en models.py): el registro es el mismo se lance desde donde se lance
+DATA_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), DATA_DIR)
+
+def registry_dir(league=DEFAULT_LEAGUE):
+    return league_paths(league, DATA_ROOT)['registry']
+
+def version_paths(league, version):
+    base = os.path.join(registry_dir(league), version)
+    return {'dir': base, 'model': os.path.join(base, "model.pkl"),
+            'compiled': os.path.join(base, "compiled"), 'meta': os.path.join(base, "meta.json")}
+
+def list_versions(league=DEFAULT_LEAGUE):
+    """Versiones guardadas, de la más antigua a la más reciente."""
+    base = registry_dir(league)
+    if not os.path.isdir(base):
+        return []
+    return sorted(v for v in os.listdir(base) if os.path.exists(os.path.join(base, v, "meta.json")))
+
+def load_version_meta(league, version):
+    with open(version_paths(league, version)['meta']) as f:
+        return json.load(f)
+
+def versions_table(league=DEFAULT_LEAGUE):
+    """Una fila por versión con sus métricas (y cuál está activa)."""
+    active = active_version(league)
+    rows = [{'version': v, 'active': v == active, **load_version_meta(league, v)} for v in list_versions(league)]
+    cols = ['version', 'active', 'trained_at', 'mode', 'accuracy', 'log_loss', 'n_rows', 'last_date', 'fingerprint']
+    table = pd.DataFrame(rows)
+    if 'fingerprint' in table.columns:
+        table['fingerprint'] = table['fingerprint'].str[:12]
+    return table[[c for c in cols if c in table.columns]] if rows else pd.DataFrame(columns=cols)
+
+def active_version(league=DEFAULT_LEAGUE):
+    path = os.path.join(registry_dir(league), ACTIVE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read().strip() or None
+
+def _set_active(league, version):
+    with open(os.path.join(registry_dir(league), ACTIVE_FILE), 'w') as f:
+        f.write(version + "\n")
+
+def register_model(model_path, compiled_dir, meta, league=DEFAULT_LEAGUE, activate=True):
+    """
+    Copia el modelo (pickle + compilado) a una versión nueva con su meta.json.
+    Si el mismo pickle ya está registrado, devuelve esa versión sin duplicarla.
+    """
+    model_hash = file_hash(model_path)
+    for version in list_versions(league):
+        if version.endswith(f"_{model_hash}"):
+            if activate:
+                _set_active(league, version)
+            return version
+
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    version = f"{stamp}_{model_hash}"
+    paths = version_paths(league, version)
+    tmp = paths['dir'] + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    shutil.copy2(model_path, os.path.join(tmp, "model.pkl"))
+    if compiled_dir and os.path.isdir(compiled_dir):
+        shutil.copytree(compiled_dir, os.path.join(tmp, "compiled"))
+    with open(os.path.join(tmp, "meta.json"), 'w') as f:
+        json.dump({**meta, 'version': version, 'model_hash': model_hash}, f, indent=2, default=str)
+    os.replace(tmp, paths['dir'])  # La versión aparece completa o no aparece
+    if activate:
+        _set_active(league, version)
+    logger.info(f"🗂️ Modelo registrado: {league}/{version}")
+    return version
+
+def activate_version(league, version):
+    """
+    Vuelve a poner en producción una versión (copia su pickle, compilado y meta a las
+    rutas de siempre). Devuelve las rutas activas.
+    """
+    from models import meta_path_for  # Import tardío: models arrastra sklearn
+    if version not in list_versions(league):
+        raise ValueError(f"Versión desconocida para {league}: {version}")
+    source, live = version_paths(league, version), league_paths(league, DATA_ROOT)
+    shutil.copy2(source['model'], live['model'])
+    if os.path.isdir(source['compiled']):
+        shutil.rmtree(live['compiled'], ignore_errors=True)
+        shutil.copytree(source['compiled'], live['compiled'])
+    meta = {k: v for k, v in load_version_meta(league, version).items() if k not in ('version', 'model_hash')}
+    with open(meta_path_for(live['model']), 'w') as f:
+        json.dump(meta, f, indent=2, default=str)
+    _set_active(league, version)
+    logger.info(f"⏪ {league}: versión activa {version}")
+    return live
+
+def prune_versions(league=DEFAULT_LEAGUE, keep=KEEP_VERSIONS):
+    """Borra las versiones más antiguas hasta dejar 'keep' (la activa se conserva siempre)."""
+    versions = list_versions(league)
+    active = active_version(league)
+    removable = [v for v in versions[:max(len(versions) - keep, 0)] if v != active]
+    for version in removable:
+        shutil.rmtree(version_paths(league, version)['dir'], ignore_errors=True)
+        MODEL_CACHE.discard(league, version)
+    if removable:
+        logger.info(f"🧹 {league}: {len(removable)} versiones antiguas borradas ({len(versions) - len(removable)} quedan)")
+    return removable
+
+# --- CARGA CON CACHÉ LRU ACOTADA POR MEMORIA ---
+def _model_bytes(model, path):
+    # Compilado: tamaño real de sus arrays | pickle de sklearn: aproximamos con el fichero
+    arrays = [getattr(model, name) for name in ARRAYS if hasattr(model, name)]
+    return sum(a.nbytes for a in arrays) if arrays else os.path.getsize(path)
+
+class ModelCache:
+    """Modelos cargados (liga, versión, tipo) -> modelo; se descartan los menos usados si no caben."""
+
+    def __init__(self, max_bytes=MODEL_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()   # clave -> (modelo, bytes)
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+        model, size = load()  # Fuera del lock: una carga lenta no bloquea al resto
+        with self._lock:
+            self.misses += 1
+            if key not in self.entries:
+                self.entries[key] = (model, size)
+                self.total += size
+            self.entries.move_to_end(key)
+            # Nunca se descarta la que se acaba de pedir, aunque ella sola no quepa
+            while self.total > self.max_bytes and len(self.entries) > 1:
+                _, (_, old_size) = self.entries.popitem(last=False)
+                self.total -= old_size
+        return model
+
+    def discard(self, league, version):
+        with self._lock:
+            for key in [k for k in self.entries if k[:2] == (league, version)]:
+                self.total -= self.entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.total = 0
+
+MODEL_CACHE = ModelCache()
+
+def load_version(league=DEFAULT_LEAGUE, version=None, compiled=True, cache=MODEL_CACHE):
+    """
+    Modelo de una versión (por defecto la activa) desde la caché LRU o de disco.
+    compiled=True: modelo aplanado (solo NumPy); False: pickle de sklearn.
+    """
+    version = version or active_version(league) or (list_versions(league) or [None])[-1]
+    if version is None:
+        raise FileNotFoundError(f"No hay modelos registrados para {league}")
+    paths = version_paths(league, version)
+    compiled = compiled and os.path.exists(os.path.join(paths['compiled'], "meta.json"))
+
+    def load():
+        if compiled:
+            model = load_compiled_model(paths['compiled'])
+            return model, _model_bytes(model, paths['model'])
+        import joblib
+        return joblib.load(paths['model']), os.path.getsize(paths['model'])
+    return cache.get((league, version, 'compiled' if compiled else 'pickle'), load)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Registro de versiones de modelos")
+    parser.add_argument("--league", choices=list(LEAGUES), default=DEFAULT_LEAGUE)
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("list", help="Versiones con sus métricas")
+    activate = sub.add_parser("activate", help="Poner en producción una versión (rollback)")
+    activate.add_argument("version")
+    prune = sub.add_parser("prune", help="Borrar versiones antiguas")
+    prune.add_argument("--keep", type=int, default=KEEP_VERSIONS)
+    sub.add_parser("register", help="Registrar el modelo que hay ahora en producción")
+    args = parser.parse_args()
+
+    paths = league_paths(args.league, DATA_ROOT)
+    if args.command == "activate":
+        activate_version(args.league, args.version)
+        # Las predicciones deben ser las de la versión activa
+        from snapshots import write_snapshot
+        write_snapshot(load_compiled_model(paths['compiled']), file_hash(paths['model']), paths['predictions'],
+                       paths['fixtures'], paths['history'], paths['state'])
+    elif args.command == "prune":
+        prune_versions(args.league, args.keep)
+    elif args.command == "register":
+        from models import load_training_meta
+        if not os.path.exists(paths['model']):
+            sys.exit(f"❌ No hay modelo en {paths['model']}")
+        meta = load_training_meta(paths['model']) or {'league': args.league}
+        meta.setdefault('trained_at', datetime.fromtimestamp(os.path.getmtime(paths['model'])).isoformat(timespec='seconds'))
+        print(f"🗂️ {register_model(paths['model'], paths['compiled'], meta, args.league)}")
+    table = versions_table(args.league)
+    print(f"\n🗂️ {LEAGUES[args.league]['name']}: {len(table)} versiones en {registry_dir(args.league)}")
+    if not table.empty:
+        print(table.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
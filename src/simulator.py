@@ -0,0 +1,209 @@
+# Simulador Monte Carlo de la temporada: a partir del calendario (partidos ya jugados
+# con su resultado real + partidos pendientes con las probabilidades del modelo) juega
+# el resto de la liga cientos de miles de veces con operaciones NumPy por lotes
+# (ningún bucle de Python por partido) y cuenta dónde acaba cada equipo.
+# Uso: python src/simulator.py [--sims 100000] [--workers 4] [--league SP1]
+import pandas as pd
+import numpy as np
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Truco para imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from leagues import DEFAULT_LEAGUE, LEAGUES, league_paths
+from snapshots import SNAPSHOT_KEY, load_latest_snapshot
+from storage import load_history
+from teams import canonical_teams, quiet_unknown_teams
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+N_SIMULATIONS = 100_000
+BATCH_SIZE = 10_000          # Simulaciones por lote (acota la memoria: lote x partidos)
+# Zonas de la tabla (LaLiga): campeón, Champions, Europa (Europa League + Conference), descenso
+TITLE_SPOTS = 1
+CHAMPIONS_SPOTS = 4
+EUROPE_SPOTS = 7
+RELEGATION_SPOTS = 3
+DEFAULT_RATES = (0.45, 0.27, 0.28)  # 1/X/2 si no hay histórico para estimarlo
+
+def parse_results(played):
+    """Goles local/visitante de 'real_result' ('2-1')."""
+    goals = played['real_result'].astype(str).str.extract(r'^\s*(\d+)\s*-\s*(\d+)\s*$').astype(float)
+    return goals[0].to_numpy(), goals[1].to_numpy()
+
+def base_rates(history_path):
+    """Frecuencia histórica de 1/X/2 (para partidos sin predicción del modelo)."""
+    history = load_history(history_path) if history_path else pd.DataFrame()
+    if history.empty:
+        return np.array(DEFAULT_RATES)
+    diff = np.sign(history['home_score'].astype(int) - history['away_score'].astype(int))
+    return np.array([(diff > 0).mean(), (diff == 0).mean(), (diff < 0).mean()])
+
+def build_season(fixtures, predictions=None, fallback=DEFAULT_RATES):
+    """
+    Prepara los arrays de la simulación:
+    - teams: nombres; base_points / base_gd: puntos y diferencia de goles de lo ya jugado
+    - home / away: índice de equipo de cada partido pendiente; probs: (pendientes, 3) con 1/X/2
+    """
+    fixtures = fixtures.copy()
+    fixtures['matchday'] = pd.to_numeric(fixtures['matchday'], errors='coerce').fillna(0).astype(int)
+    # Mismos nombres canónicos que en las instantáneas de predicciones
+    for col in ['home_team', 'away_team']:
+        fixtures[col] = np.asarray(canonical_teams(fixtures[col]).astype(str))
+    teams = np.array(sorted(set(fixtures['home_team'].astype(str)) | set(fixtures['away_team'].astype(str))))
+    home_idx = np.searchsorted(teams, fixtures['home_team'].astype(str))
+    away_idx = np.searchsorted(teams, fixtures['away_team'].astype(str))
+
+    # 1. Lo jugado: puntos y goles reales
+    home_goals, away_goals = parse_results(fixtures)
+    played = (fixtures['status'] == 'FINISHED').to_numpy() & ~np.isnan(home_goals)
+    hg, ag = home_goals[played], away_goals[played]
+    home_pts = np.where(hg > ag, 3, np.where(hg == ag, 1, 0))
+    away_pts = np.where(ag > hg, 3, np.where(hg == ag, 1, 0))
+    n_teams = len(teams)
+    base_points = (np.bincount(home_idx[played], home_pts, n_teams) +
+                   np.bincount(away_idx[played], away_pts, n_teams)).astype(np.int32)
+    base_gd = (np.bincount(home_idx[played], hg - ag, n_teams) +
+               np.bincount(away_idx[played], ag - hg, n_teams))
+
+    # 2. Lo pendiente: probabilidades del modelo (o las tasas base si no hay predicción)
+    pending = fixtures.loc[~played, SNAPSHOT_KEY].reset_index(drop=True)
+    probs = np.tile(np.asarray(fallback, dtype=np.float64), (len(pending), 1))
+    if predictions is not None and not predictions.empty:
+        preds = predictions.reset_index(drop=True).drop_duplicates(SNAPSHOT_KEY).set_index(SNAPSHOT_KEY)
+        found = pending.set_index(SNAPSHOT_KEY).index.isin(preds.index)
+        keys = pd.MultiIndex.from_frame(pending[found])
+        probs[found] = preds.loc[keys, ['p1', 'pX', 'p2']].to_numpy()
+        if (~found).any():
+            logger.warning(f"⚠️ {int((~found).sum())} partidos sin predicción: se usan las tasas base {np.round(fallback, 3)}")
+    probs = probs / probs.sum(axis=1, keepdims=True)
+
+    return {
+        'teams': teams, 'base_points': base_points, 'base_gd': base_gd,
+        'home': home_idx[~played], 'away': away_idx[~played], 'probs': probs,
+        'n_played': int(played.sum()),
+    }
+
+def simulate_counts(season, n_sims, seed=0, batch_size=BATCH_SIZE):
+    """
+    Juega n_sims finales de temporada y devuelve los contadores agregados:
+    position_counts (equipos x puestos) y points_counts (equipos x puntos finales).
+    """
+    rng = np.random.default_rng(seed)
+    teams, probs = season['teams'], season['probs']
+    n_teams, n_pending = len(teams), len(probs)
+    max_points = int(season['base_points'].max()) + 3 * n_pending + 1
+
+    # Matrices partido -> equipo: sumar los puntos de cada simulación es un producto de matrices
+    home_onehot = np.zeros((n_pending, n_teams), dtype=np.float32)
+    away_onehot = np.zeros((n_pending, n_teams), dtype=np.float32)
+    home_onehot[np.arange(n_pending), season['home']] = 1
+    away_onehot[np.arange(n_pending), season['away']] = 1
+    cut_home = probs[:, 0].astype(np.float32)
+    cut_draw = (probs[:, 0] + probs[:, 1]).astype(np.float32)
+
+    # Desempate: puntos, luego diferencia de goles de lo jugado, luego azar
+    # (clave lexicográfica: 1 punto pesa más que cualquier diferencia de goles)
+    tiebreak = season['base_gd'] - season['base_gd'].min()
+    points_weight = tiebreak.max() + 1
+
+    position_counts = np.zeros((n_teams, n_teams), dtype=np.int64)
+    points_counts = np.zeros((n_teams, max_points), dtype=np.int64)
+    team_offsets = np.arange(n_teams) * max_points
+    for start in range(0, n_sims, batch_size):
+        n = min(batch_size, n_sims - start)
+        u = rng.random((n, n_pending), dtype=np.float32)
+        home_win = u < cut_home
+        draw = ~home_win & (u < cut_draw)
+        home_pts = 3 * home_win + draw                    # (n, pendientes)
+        away_pts = 3 * (~home_win & ~draw) + draw
+        points = (season['base_points'] + home_pts.astype(np.float32) @ home_onehot
+                  + away_pts.astype(np.float32) @ away_onehot).astype(np.int32)  # (n, equipos)
+
+        key = points * points_weight + tiebreak + rng.random((n, n_teams)) * 0.5
+        order = np.argsort(-key, axis=1)                  # order[s, puesto] = equipo
+        position_counts += np.bincount((order * n_teams + np.arange(n_teams)).ravel(),
+                                       minlength=n_teams * n_teams).reshape(n_teams, n_teams)
+        points_counts += np.bincount((points + team_offsets).ravel(),
+                                     minlength=n_teams * max_points).reshape(n_teams, max_points)
+    return position_counts, points_counts
+
+def _simulate_chunk(args):
+    season, n_sims, seed = args
+    return simulate_counts(season, n_sims, seed)
+
+def simulate_season(season, n_sims=N_SIMULATIONS, workers=1, seed=42):
+    """Reparte las simulaciones entre procesos (cada uno con su semilla) y suma los contadores."""
+    if workers <= 1:
+        return simulate_counts(season, n_sims, seed)
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    chunks = [n_sims // workers + (i < n_sims % workers) for i in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_simulate_chunk, [(season, n, s) for n, s in zip(chunks, seeds)]))
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+def summarize_simulation(season, position_counts, points_counts):
+    """Tabla por equipo: puntos actuales y esperados, probabilidades por zona y reparto de puestos."""
+    n_sims = position_counts[0].sum()
+    n_teams = len(season['teams'])
+    pos_probs = position_counts / n_sims
+    points_axis = np.arange(points_counts.shape[1])
+    cdf = points_counts.cumsum(axis=1) / n_sims
+    table = pd.DataFrame({
+        'team': season['teams'],
+        'points_now': season['base_points'],
+        'exp_points': (points_counts * points_axis).sum(axis=1) / n_sims,
+        'points_p10': (cdf < 0.10).sum(axis=1),
+        'points_p90': (cdf < 0.90).sum(axis=1),
+        'exp_position': (pos_probs * np.arange(1, n_teams + 1)).sum(axis=1),
+        'p_title': pos_probs[:, :TITLE_SPOTS].sum(axis=1),
+        'p_champions': pos_probs[:, :CHAMPIONS_SPOTS].sum(axis=1),
+        'p_europe': pos_probs[:, :EUROPE_SPOTS].sum(axis=1),
+        'p_relegation': pos_probs[:, n_teams - RELEGATION_SPOTS:].sum(axis=1),
+    })
+    positions = pd.DataFrame(pos_probs, columns=[f"pos_{i}" for i in range(1, n_teams + 1)])
+    return pd.concat([table, positions], axis=1).sort_values('exp_points', ascending=False).reset_index(drop=True)
+
+def run_simulation(league=DEFAULT_LEAGUE, n_sims=N_SIMULATIONS, workers=1, seed=42):
+    """Calendario + última instantánea de predicciones de la liga -> tabla de probabilidades."""
+    paths = league_paths(league)
+    if not os.path.exists(paths['fixtures']):
+        logger.error(f"❌ No hay calendario. Ejecuta src/api_client.py --leagues {league}")
+        return pd.DataFrame()
+    fixtures = pd.read_csv(paths['fixtures'])
+    predictions = load_latest_snapshot(paths['predictions'])
+    if predictions is None:
+        logger.warning("⚠️ Sin instantánea de predicciones (entrena con src/models.py): todo con tasas base.")
+    with quiet_unknown_teams(league != DEFAULT_LEAGUE):
+        season = build_season(fixtures, predictions, base_rates(paths['history']))
+
+    start = time.perf_counter()
+    position_counts, points_counts = simulate_season(season, n_sims, workers, seed)
+    logger.info(f"🎲 {n_sims} temporadas simuladas ({len(season['probs'])} partidos pendientes, "
+                f"{season['n_played']} jugados) en {time.perf_counter() - start:.2f}s con {workers} proceso(s)")
+    return summarize_simulation(season, position_counts, points_counts)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulación Monte Carlo del resto de la temporada")
+    parser.add_argument("--league", choices=list(LEAGUES), default=DEFAULT_LEAGUE)
+    parser.add_argument("--sims", type=int, default=N_SIMULATIONS)
+    parser.add_argument("--workers", type=int, default=1, help="Procesos entre los que repartir las simulaciones")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="CSV donde guardar la tabla completa (con el reparto de puestos)")
+    args = parser.parse_args()
+
+    table = run_simulation(args.league, args.sims, args.workers, args.seed)
+    if not table.empty:
+        print(f"\n🏆 {LEAGUES[args.league]['name'].upper()}: PROYECCIÓN DE LA CLASIFICACIÓN")
+        cols = ['team', 'points_now', 'exp_points', 'points_p10', 'points_p90', 'exp_position',
+                'p_title', 'p_champions', 'p_europe', 'p_relegation']
+        print(table[cols].to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+        if args.output:
+            table.to_csv(args.output, index=False)
+            logger.info(f"💾 Tabla guardada en {args.output}")
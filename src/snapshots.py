@@ -0,0 +1,160 @@
+# Instantáneas de predicciones: tras entrenar guardamos las probabilidades de cada
+# partido del calendario junto con la huella del modelo y de los datos.
+# La app las sirve directamente y cada fichero deja constancia de lo que el modelo
+# predijo ANTES de cada partido (las filas ya empezadas no se vuelven a predecir).
+import pandas as pd
+import numpy as np
+import hashlib
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+
+# Truco para imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from feature_eng import prepare_upcoming_matches, STATE_PATH
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = "data/predictions"
+KEEP_SNAPSHOTS = 10   # Ficheros que se conservan (la última ya arrastra las predicciones congeladas)
+FIXTURES_PATH = "data/laliga_fixtures.csv"
+HISTORY_PATH = "data/laliga_advanced_stats.csv"
+SNAPSHOT_KEY = ['matchday', 'home_team', 'away_team']
+SNAPSHOT_COLUMNS = SNAPSHOT_KEY + ['utc_date', 'p1', 'pX', 'p2', 'pred', 'pre_kickoff',
+                                   'generated_at', 'model_hash', 'data_hash']
+PRED_CODES = np.array(['1', 'X', '2'])
+
+def file_hash(*paths):
+    """sha256 (12 caracteres) del contenido de uno o varios ficheros."""
+    digest = hashlib.sha256()
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+def build_snapshot(model, fixtures_path=FIXTURES_PATH, history_path=HISTORY_PATH, model_hash="",
+                   state_path=STATE_PATH, matchday=None):
+    """
+    Predice todo el calendario de una vez y devuelve la tabla de la instantánea
+    (con 'matchday', solo los partidos de esa jornada).
+    """
+    fixtures = pd.read_csv(fixtures_path)
+    X_pred, matches = prepare_upcoming_matches(fixtures, history_path, state_path=state_path, matchday=matchday)
+    if X_pred.empty:
+        return pd.DataFrame(columns=SNAPSHOT_COLUMNS)
+
+    probs = model.predict_proba(X_pred)
+    now = datetime.now(timezone.utc)
+    kickoff = pd.to_datetime(matches['utc_date'], utc=True)
+    snapshot = pd.DataFrame({
+        'matchday': pd.to_numeric(matches['matchday'], errors='coerce').fillna(0).astype(int),
+        'home_team': matches['home_team'].astype(str),
+        'away_team': matches['away_team'].astype(str),
+        'utc_date': matches['utc_date'],
+        'p1': probs[:, 0], 'pX': probs[:, 1], 'p2': probs[:, 2],
+        'pred': PRED_CODES[np.argmax(probs, axis=1)],
+        'pre_kickoff': (kickoff > now).to_numpy(),
+        'generated_at': now.isoformat(timespec='seconds'),
+        'model_hash': model_hash,
+        'data_hash': file_hash(fixtures_path, history_path),
+    })
+    return snapshot.reset_index(drop=True)
+
+def result_codes(results):
+    """'2-1' -> '1', '0-0' -> 'X', '0-3' -> '2' (None si el partido no tiene resultado)."""
+    goals = pd.Series(results, dtype=object).astype(str).str.extract(r'^\s*(\d+)\s*-\s*(\d+)\s*$').astype(float)
+    diff = np.sign(goals[0] - goals[1]).to_numpy()
+    codes = np.where(diff > 0, '1', np.where(diff < 0, '2', 'X')).astype(object)
+    codes[np.isnan(diff)] = None
+    return codes
+
+def freeze_started_matches(snapshot, previous):
+    """Los partidos que ya empezaron conservan la predicción que tenían en la instantánea anterior."""
+    if previous is None or previous.empty or snapshot.empty:
+        return snapshot
+    started = pd.to_datetime(snapshot['utc_date'], utc=True) <= datetime.now(timezone.utc)
+    keep = previous.set_index(SNAPSHOT_KEY)
+    keys = pd.MultiIndex.from_frame(snapshot[SNAPSHOT_KEY])
+    frozen = started.to_numpy() & keys.isin(keep.index)
+    if frozen.any():
+        old = keep.reindex(keys[frozen])
+        for col in SNAPSHOT_COLUMNS[3:]:
+            snapshot.loc[frozen, col] = old[col].astype(snapshot[col].dtype).to_numpy()
+    return snapshot
+
+def snapshot_hashes(snapshot):
+    """
+    (model_hash, data_hash) con los que se generó la instantánea. Van en el nombre del
+    fichero: si todos los partidos ya empezaron, todas las filas están congeladas y
+    conservan los de instantáneas anteriores. En ficheros antiguos (sin data_hash en el
+    nombre) se usan los de las filas más recientes.
+    """
+    if 'hashes' in snapshot.attrs:
+        return snapshot.attrs['hashes']
+    latest = snapshot.loc[snapshot['generated_at'] == snapshot['generated_at'].max()].iloc[0]
+    return latest['model_hash'], latest['data_hash']
+
+def snapshot_name(model_hash, data_hash, stamp=None):
+    stamp = stamp or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    return f"predictions_{stamp}_{model_hash}_{data_hash}.csv"
+
+def snapshot_paths(snapshot_dir=SNAPSHOT_DIR):
+    if not os.path.isdir(snapshot_dir):
+        return []
+    return sorted(os.path.join(snapshot_dir, f) for f in os.listdir(snapshot_dir)
+                  if f.startswith("predictions_") and f.endswith(".csv"))
+
+def load_snapshot(path):
+    snapshot = pd.read_csv(path, dtype={'pred': str, 'model_hash': str, 'data_hash': str})
+    snapshot = snapshot.set_index('matchday', drop=False).sort_index()
+    parts = os.path.basename(path)[:-len(".csv")].split("_")
+    if len(parts) == 4:  # predictions_<fecha>_<modelo>_<datos>
+        snapshot.attrs['hashes'] = (parts[2], parts[3])
+    return snapshot
+
+def load_latest_snapshot(snapshot_dir=SNAPSHOT_DIR):
+    """Última instantánea indexada por jornada (None si no hay ninguna)."""
+    paths = snapshot_paths(snapshot_dir)
+    return load_snapshot(paths[-1]) if paths else None
+
+def write_snapshot(model, model_hash, snapshot_dir=SNAPSHOT_DIR,
+                   fixtures_path=FIXTURES_PATH, history_path=HISTORY_PATH, state_path=STATE_PATH):
+    """
+    Escribe data/predictions/predictions_<fecha>_<modelo>_<datos>.csv.
+    Si el modelo y los datos son los mismos que en la última, no se crea versión nueva.
+    Se conservan las KEEP_SNAPSHOTS más recientes.
+    """
+    previous = load_latest_snapshot(snapshot_dir)
+    data_hash = file_hash(fixtures_path, history_path)
+    if previous is not None and not previous.empty and snapshot_hashes(previous) == (model_hash, data_hash):
+        logger.info("📸 Predicciones sin cambios (mismo modelo y mismos datos).")
+        return snapshot_paths(snapshot_dir)[-1]
+
+    snapshot = build_snapshot(model, fixtures_path, history_path, model_hash, state_path)
+    snapshot = freeze_started_matches(snapshot, previous.reset_index(drop=True) if previous is not None else None)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    path = os.path.join(snapshot_dir, snapshot_name(model_hash, data_hash))
+    snapshot[SNAPSHOT_COLUMNS].to_csv(path, index=False)
+    logger.info(f"📸 Instantánea de predicciones guardada: {path} ({len(snapshot)} partidos)")
+    prune_snapshots(snapshot_dir)
+    return path
+
+def prune_snapshots(snapshot_dir=SNAPSHOT_DIR, keep=KEEP_SNAPSHOTS):
+    """Borra las instantáneas más antiguas hasta dejar 'keep' (las congeladas viven en la última)."""
+    paths = snapshot_paths(snapshot_dir)
+    removable = paths[:max(len(paths) - keep, 0)]
+    for path in removable:
+        os.remove(path)
+    if removable:
+        logger.info(f"🧹 {len(removable)} instantáneas antiguas borradas ({len(paths) - len(removable)} quedan)")
+    return removable
+
+if __name__ == "__main__":
+    # Regenera la instantánea con el modelo compilado actual (sin sklearn)
+    from inference import load_compiled_model, COMPILED_DIR
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    write_snapshot(load_compiled_model(COMPILED_DIR), file_hash("data/model_winner.pkl"))
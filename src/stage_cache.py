@@ -0,0 +1,135 @@
+# Caché en disco de las etapas del pipeline de features.
+# Cada etapa guarda su salida bajo una clave que es el hash de sus entradas (contenido
+# de los ficheros o claves de las etapas previas) y de sus parámetros. Si nada cambia,
+# la etapa es una lectura; si cambia un parámetro, solo se recalculan las etapas que
+# dependen de él. El tamaño total está acotado: se borran primero las menos usadas.
+#   LALIGA_CACHE=0          -> desactivada (se calcula todo siempre)
+#   LALIGA_CACHE_DIR        -> carpeta (por defecto .cache/stages)
+#   LALIGA_CACHE_MAX_MB     -> tamaño máximo (por defecto 512 MB)
+import pandas as pd
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get("LALIGA_CACHE_DIR", os.path.join(".cache", "stages"))
+CACHE_MAX_BYTES = int(float(os.environ.get("LALIGA_CACHE_MAX_MB", "512")) * 1e6)
+
+_CONFIG = {'enabled': os.environ.get("LALIGA_CACHE", "1") not in ("", "0")}
+
+# Estadísticas de la sesión (aciertos / fallos por etapa)
+CACHE_STATS = {'hits': 0, 'misses': 0}
+
+def enable_cache():
+    _CONFIG['enabled'] = True
+
+def disable_cache():
+    _CONFIG['enabled'] = False
+
+def is_cache_enabled():
+    return _CONFIG['enabled']
+
+def hash_files(*paths):
+    """sha256 del contenido de los ficheros que existan (16 caracteres)."""
+    digest = hashlib.sha256()
+    for path in paths:
+        if path and os.path.exists(path):
+            digest.update(os.path.basename(path).encode())
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+def stage_key(name, *parts, **params):
+    """Clave de una etapa: su nombre, las claves de sus entradas y sus parámetros."""
+    payload = json.dumps([name, list(parts), params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+def _entry_path(name, key, cache_dir):
+    return os.path.join(cache_dir, f"{name}_{key}.pkl")
+
+def cached(name, key, compute, cache_dir=None, max_bytes=None, enabled=None):
+    """
+    Devuelve la salida de la etapa 'name' para la clave 'key': la lee de disco si existe
+    y si no la calcula con compute(), la guarda y aplica el límite de tamaño.
+    """
+    enabled = _CONFIG['enabled'] if enabled is None else enabled
+    if not enabled:
+        return compute()
+    cache_dir = cache_dir or CACHE_DIR
+    path = _entry_path(name, key, cache_dir)
+    if os.path.exists(path):
+        try:
+            result = pd.read_pickle(path)
+            os.utime(path)  # Marca de uso reciente para el desalojo
+            CACHE_STATS['hits'] += 1
+            logger.debug(f"💾 Caché {name}: acierto ({key})")
+            return result
+        except Exception as e:  # Fichero a medio escribir o de otra versión de pandas
+            logger.warning(f"⚠️ Entrada de caché ilegible ({path}): {e}. Se recalcula.")
+
+    CACHE_STATS['misses'] += 1
+    result = compute()
+    os.makedirs(cache_dir, exist_ok=True)
+    # Escritura atómica: nunca se lee un pickle a medias (varios procesos comparten la carpeta)
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    os.close(fd)
+    try:
+        pd.to_pickle(result, tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    evict(cache_dir, CACHE_MAX_BYTES if max_bytes is None else max_bytes)
+    return result
+
+def cache_entries(cache_dir=None):
+    """Entradas de la caché (ruta, tamaño, último uso), de la más antigua a la más reciente."""
+    cache_dir = cache_dir or CACHE_DIR
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".pkl"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            info = os.stat(path)
+        except FileNotFoundError:  # Otro proceso la acaba de borrar
+            continue
+        entries.append((path, info.st_size, info.st_mtime))
+    return sorted(entries, key=lambda e: e[2])
+
+def evict(cache_dir=None, max_bytes=CACHE_MAX_BYTES):
+    """Borra las entradas usadas hace más tiempo hasta quedar por debajo de max_bytes."""
+    entries = cache_entries(cache_dir)
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for path, size, _ in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    if removed:
+        logger.info(f"🧹 Caché: {removed} entradas desalojadas ({total / 1e6:.1f} MB en uso)")
+    return removed
+
+def clear_cache(cache_dir=None):
+    for path, _, _ in cache_entries(cache_dir):
+        os.remove(path)
+
+if __name__ == "__main__":
+    entries = cache_entries()
+    total = sum(size for _, size, _ in entries)
+    print(f"💾 Caché de etapas en {CACHE_DIR}: {len(entries)} entradas, {total / 1e6:.2f} MB "
+          f"(límite {CACHE_MAX_BYTES / 1e6:.0f} MB)")
+    for path, size, mtime in reversed(entries[-20:]):
+        print(f"   {time.strftime('%Y-%m-%d %H:%M', time.localtime(mtime))}  {size / 1e3:8.1f} KB  {os.path.basename(path)}")
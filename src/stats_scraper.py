@@ -3,8 +3,24 @@ import logging
 import os
 import requests
 import io
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import sys
 import numpy as np
-from datetime import datetime
+from datetime import date, datetime
+
+# Truco para imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from feature_eng import sync_team_state, normalize_names
+from storage import save_history
+from match_db import store
+from teams import canonical_teams, quiet_unknown_teams
+from leagues import LEAGUES, DEFAULT_LEAGUE, league_paths, season_end, season_urls, recent_seasons
+from profiling import stage, profiled
 
 # Configuración de Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -13,105 +29,152 @@ logger = logging.getLogger(__name__)
 DATA_DIR = "data"
 os.makedirs(DATA_DIR, exist_ok=True)
 
-# URL Temporadas (Actual y Pasada)
-# Football-Data.co.uk es la fuente más fiable y rápida
-FD_URLS = [
-    "https://www.football-data.co.uk/mmz4281/2526/SP1.csv", # 25/26
-    "https://www.football-data.co.uk/mmz4281/2425/SP1.csv", # 24/25
-    "https://www.football-data.co.uk/mmz4281/2324/SP1.csv", # 23/24
-    "https://www.football-data.co.uk/mmz4281/2223/SP1.csv", # 22/23
-]
-
-# Mapeo de Nombres (Para estandarizar con tu sistema)
-NAME_MAPPING = {
-    # Actuales 2025/26
-    "Ath Bilbao": "Athletic Bilbao", "Athletic Club": "Athletic Bilbao",
-    "Ath Madrid": "Atletico Madrid", "Atlético de Madrid": "Atletico Madrid",
-    "Espanol": "Espanyol", "RCD Espanyol": "Espanyol",
-    "Celta": "Celta de Vigo", "Celta Vigo": "Celta de Vigo",
-    "Betis": "Real Betis", "Real Betis Balompie": "Real Betis",
-    "Sociedad": "Real Sociedad", "Real Sociedad de Futbol": "Real Sociedad",
-    "Real Madrid": "Real Madrid",
-    "Barcelona": "Barcelona", "FC Barcelona": "Barcelona",
-    "Girona": "Girona", "Girona FC": "Girona",
-    "Valencia": "Valencia", "Valencia CF": "Valencia",
-    "Mallorca": "Mallorca", "RCD Mallorca": "Mallorca",
-    "Osasuna": "Osasuna", "CA Osasuna": "Osasuna",
-    "Sevilla": "Sevilla", "Sevilla FC": "Sevilla",
-    "Villarreal": "Villarreal", "Villarreal CF": "Villarreal",
-    "Alaves": "Alaves", "Deportivo Alavés": "Alaves",
-    "Las Palmas": "Las Palmas", "UD Las Palmas": "Las Palmas",
-    "Leganes": "Leganes", "CD Leganés": "Leganes",
-    "Valladolid": "Real Valladolid", "Real Valladolid CF": "Real Valladolid",
-    "Getafe": "Getafe", "Getafe CF": "Getafe",
-    "Rayo Vallecano": "Rayo Vallecano", "Rayo": "Rayo Vallecano", "Vallecano": "Rayo Vallecano",
+# URL Temporadas (Actual y Pasadas) de LaLiga: la actual (según la fecha, ver leagues.current_season) y las 3 anteriores
+# Football-Data.co.uk es la fuente más fiable y rápida (otras ligas: ver leagues.py)
+FD_URLS = season_urls(DEFAULT_LEAGUE)
+N_SEASONS = len(FD_URLS)
+
+# Columnas que nos interesan del CSV de Football-Data
+# FTHG/AG: Goles, HS/AS: Tiros, HST/AST: Tiros Puerta, HC/AC: Córners, HY/AY: Amarillas
+COLS_NEEDED = ['Date', 'HomeTeam', 'AwayTeam', 'FTHG', 'FTAG', 
+               'HS', 'AS', 'HST', 'AST', 'HC', 'AC', 'HY', 'AY', 'HR', 'AR']
+
+# Caché en disco de los CSV originales (las temporadas cerradas no cambian nunca)
+RAW_DIR = os.path.join(DATA_DIR, "raw")
+REQUEST_TIMEOUT = 15
+MAX_RETRIES = 3
+
+def build_session(pool_size=len(FD_URLS)):
+    """Sesión HTTP con reintentos y backoff para errores temporales del servidor."""
+    session = requests.Session()
+    retry = Retry(total=MAX_RETRIES, backoff_factor=0.5,
+                  status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET"])
+    adapter = HTTPAdapter(max_retries=retry, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    # User-Agent para evitar bloqueos básicos (aunque FD es muy permisivo)
+    session.headers.update({"User-Agent": "Mozilla/5.0"})
+    return session
+
+def raw_cache_paths(url, raw_dir=RAW_DIR):
+    """data/raw/<temporada>_<división>.csv y su .json con ETag/Last-Modified."""
+    season, division = url.split('/')[-2], url.split('/')[-1].replace('.csv', '')
+    base = os.path.join(raw_dir, f"{season}_{division}")
+    return base + ".csv", base + ".json"
+
+def _save_meta(meta_path, meta):
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+
+def download_season(url, session, raw_dir=RAW_DIR):
+    """
+    Devuelve el CSV crudo (bytes) de una temporada usando la caché en disco.
+    - Temporada cerrada (la caché se descargó o comprobó DESPUÉS de acabar la temporada):
+      no se hace ninguna petición.
+    - Resto: GET condicional (If-None-Match / If-Modified-Since); con 304 se usa la caché.
+      Así una temporada guardada a medias se vuelve a comprobar una vez tras el cambio de temporada.
+    """
+    csv_path, meta_path = raw_cache_paths(url, raw_dir)
+    cached = None
+    meta = {}
+    if os.path.exists(csv_path):
+        with open(csv_path, 'rb') as f:
+            cached = f.read()
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+    
+    season = url.split('/')[-2]
+    closed_on = season_end(season).isoformat()
+    if cached is not None and meta.get('fetched_at', '') >= closed_on:
+        logger.info(f"   📦 Caché: {season} (temporada cerrada)")
+        return cached
+
+    headers = {}
+    if cached is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+    
+    try:
+        response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        logger.error(f"   ❌ Error con {url}: {e}")
+        return cached
     
-    # Históricos (Últimos 10 años) - IMPORTANTE AÑADIR ESTOS
-    "Cadiz": "Cadiz",
-    "Granada": "Granada",
-    "Almeria": "Almeria",
-    "Elche": "Elche",
-    "Levante": "Levante",
-    "Eibar": "Eibar",
-    "Huesca": "Huesca",
-    "Sp Gijon": "Sporting Gijon", "Sporting de Gijón": "Sporting Gijon",
-    "La Coruna": "Deportivo La Coruna", "Deportivo": "Deportivo La Coruna",
-    "Malaga": "Malaga",
-    "Oviedo": "Real Oviedo",
-    "Santander": "Racing Santander",
-    "Zaragoza": "Real Zaragoza",
-    "Tenerife": "Tenerife",
-    "Cordoba": "Cordoba"
-}
-
-def fetch_technical_stats():
-    """Descarga, une y limpia datos de Football-Data."""
+    fetched_at = date.today().isoformat()
+    if response.status_code == 304 and cached is not None:
+        logger.info(f"   📦 Sin cambios: {season} (304)")
+        _save_meta(meta_path, {**meta, 'fetched_at': fetched_at})
+        return cached
+    if response.status_code != 200:
+        logger.warning(f"   ⚠️ Fallo descarga ({response.status_code}): {url}")
+        return cached
+    
+    os.makedirs(raw_dir, exist_ok=True)
+    with open(csv_path, 'wb') as f:
+        f.write(response.content)
+    _save_meta(meta_path, {'url': url,
+                           'etag': response.headers.get('ETag'),
+                           'last_modified': response.headers.get('Last-Modified'),
+                           'fetched_at': fetched_at})
+    return response.content
+
+def parse_season(content):
+    """Lee solo las columnas de COLS_NEEDED directamente de los bytes descargados."""
+    df = pd.read_csv(io.BytesIO(content), usecols=lambda c: c in COLS_NEEDED, encoding='utf-8')
+    # Filtrar filas vacías (partidos no jugados no tienen goles FTHG)
+    if 'FTHG' not in df.columns:
+        return pd.DataFrame()
+    return df[df['FTHG'].notna()]
+
+@profiled("scraper.fetch")
+def fetch_technical_stats(urls=FD_URLS, raw_dir=RAW_DIR):
+    """
+    Descarga (en paralelo), une y limpia datos de Football-Data.
+    Las temporadas ya cerradas salen de la caché en disco (ver download_season).
+    """
     logger.info("📥 Descargando datos técnicos de Football-Data...")
     all_dfs = []
     
-    for url in FD_URLS:
+    session = build_session(pool_size=max(len(urls), 1))
+    with stage("scraper.download", seasons=len(urls)), ThreadPoolExecutor(max_workers=len(urls) or 1) as pool:
+        contents = list(pool.map(
+            lambda url: download_season(url, session, raw_dir=raw_dir), urls
+        ))
+    
+    for url, content in zip(urls, contents):
+        if content is None:
+            continue
         try:
-            # User-Agent para evitar bloqueos básicos (aunque FD es muy permisivo)
-            headers = {"User-Agent": "Mozilla/5.0"}
-            response = requests.get(url, headers=headers)
-            
-            if response.status_code == 200:
-                # Decodificar y leer CSV
-                df = pd.read_csv(io.StringIO(response.content.decode('utf-8')))
-                
-                # Filtrar filas vacías (partidos no jugados no tienen goles FTHG)
-                if 'FTHG' in df.columns:
-                    df = df[df['FTHG'].notna()]
-                    logger.info(f"   ✅ Descargado: {url.split('/')[-2]} ({len(df)} partidos)")
-                    all_dfs.append(df)
-            else:
-                logger.warning(f"   ⚠️ Fallo descarga ({response.status_code}): {url}")
-                
+            df = parse_season(content)
         except Exception as e:
-            logger.error(f"   ❌ Error con {url}: {e}")
+            logger.error(f"   ❌ Error leyendo {url}: {e}")
+            continue
+        if not df.empty:
+            logger.info(f"   ✅ Temporada: {url.split('/')[-2]} ({len(df)} partidos)")
+            all_dfs.append(df)
 
     if not all_dfs:
         logger.error("❌ No se pudo descargar ningún dato.")
         return pd.DataFrame()
 
-    # Unir todos los dataframes
+    # Unir todos los dataframes (ya vienen solo con las columnas clave)
     df_final = pd.concat(all_dfs, ignore_index=True)
     
-    # Seleccionar columnas clave
-    # FTHG/AG: Goles, HS/AS: Tiros, HST/AST: Tiros Puerta, HC/AC: Córners, HY/AY: Amarillas
-    cols_needed = ['Date', 'HomeTeam', 'AwayTeam', 'FTHG', 'FTAG', 
-                   'HS', 'AS', 'HST', 'AST', 'HC', 'AC', 'HY', 'AY', 'HR', 'AR']
-    
-    # Filtrar solo las columnas que existen
-    cols_present = [c for c in cols_needed if c in df_final.columns]
+    # Mismo orden de columnas que COLS_NEEDED
+    cols_present = [c for c in COLS_NEEDED if c in df_final.columns]
     df_final = df_final[cols_present].copy()
     
     # Normalizar Fechas
     df_final['Date'] = pd.to_datetime(df_final['Date'], dayfirst=True, errors='coerce')
     
     # Normalizar Nombres de Equipos
-    df_final['HomeTeam'] = df_final['HomeTeam'].map(NAME_MAPPING).fillna(df_final['HomeTeam'])
-    df_final['AwayTeam'] = df_final['AwayTeam'].map(NAME_MAPPING).fillna(df_final['AwayTeam'])
+    n = len(df_final)
+    teams = canonical_teams(np.concatenate([df_final['HomeTeam'].to_numpy(dtype=object),
+                                            df_final['AwayTeam'].to_numpy(dtype=object)]))
+    df_final['HomeTeam'], df_final['AwayTeam'] = teams[:n], teams[n:]
     
     # Renombrar columnas al estándar de tu proyecto (snake_case)
     df_final.rename(columns={
@@ -133,19 +196,56 @@ def fetch_technical_stats():
     
     return df_final
 
-def main():
-    df = fetch_technical_stats()
-    
-    if not df.empty:
-        # Guardar CSV
-        output_path = os.path.join(DATA_DIR, "laliga_advanced_stats.csv")
-        df.to_csv(output_path, index=False)
+def update_league(league=DEFAULT_LEAGUE, n_seasons=N_SEASONS, persist=True):
+    """
+    Descarga y guarda el histórico de una liga en su carpeta (ver leagues.league_paths).
+    Con persist=False solo se escriben el CSV y el .feather: la base de datos y el estado
+    de equipos quedan para persist_league (el pipeline los hace después de las descargas).
+    """
+    paths = league_paths(league)
+    logger.info(f"🏆 {LEAGUES[league]['name']} ({league}), {n_seasons} temporadas")
+    # El registro de equipos solo cubre LaLiga: en otras ligas no avisamos de nombres desconocidos
+    with quiet_unknown_teams(league != DEFAULT_LEAGUE):
+        df = fetch_technical_stats(season_urls(league, recent_seasons(n_seasons)))
+        if df.empty:
+            logger.error(f"❌ El proceso falló para {league}. No se generó el archivo.")
+            return df
+        
+        # Guardar en formato columnar tipado (+ exportación CSV para el repo)
+        output_path = paths['history']
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with stage("scraper.save", rows=len(df), league=league):
+            df = save_history(df, output_path)
         
         logger.info(f"✅ BASE DE DATOS FINAL CREADA: {len(df)} partidos.")
         logger.info(f"💾 Guardado en: {output_path}")
-        logger.info("Métricas disponibles: Goles, Tiros, Tiros a Puerta, Córners, Tarjetas.")
-    else:
-        logger.error("❌ El proceso falló. No se generó el archivo.")
+        if persist:
+            persist_league(league, df)
+    return df
+
+def persist_league(league, df):
+    """Base de datos local y estado incremental de cada equipo a partir del histórico guardado."""
+    paths = league_paths(league)
+    with quiet_unknown_teams(league != DEFAULT_LEAGUE):
+        # Misma información en la base de datos local (solo se escriben los partidos que cambian)
+        with stage("scraper.db", rows=len(df), league=league):
+            store('matches', df, league)
+        
+        # Actualizar el estado incremental de cada equipo con los partidos nuevos
+        with stage("scraper.team_state", rows=len(df), league=league):
+            state = sync_team_state(normalize_names(df.copy()), state_path=paths['state'])
+        logger.info(f"🧮 Estado de equipos actualizado: {len(state)} equipos.")
+    return state
+
+def main(leagues=(DEFAULT_LEAGUE,), n_seasons=N_SEASONS):
+    for league in leagues:
+        update_league(league, n_seasons)
+    logger.info("Métricas disponibles: Goles, Tiros, Tiros a Puerta, Córners, Tarjetas.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Descarga el histórico de Football-Data")
+    parser.add_argument("--leagues", nargs="+", choices=list(LEAGUES), default=[DEFAULT_LEAGUE],
+                        help="Ligas a descargar (códigos de Football-Data)")
+    parser.add_argument("--seasons", type=int, default=N_SEASONS, help="Número de temporadas hacia atrás")
+    args = parser.parse_args()
+    main(args.leagues, args.seasons)
\ No newline at end of file
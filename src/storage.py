@@ -0,0 +1,102 @@
+# Almacenamiento columnar del histórico (Feather / Arrow IPC sin comprimir).
+# Guardamos el histórico con tipos explícitos (enteros pequeños, equipos categóricos,
+# fechas nativas) y lo leemos con memory-map, sin volver a parsear CSV ni fechas.
+# El CSV se sigue exportando para el repo y como alternativa si falta pyarrow.
+# El .feather guarda en sus metadatos el tamaño y el sha256 del CSV del que sale: solo se
+# usa si el CSV sigue siendo ese (las fechas de modificación no valen tras un git checkout).
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import os
+
+from teams import canonical_teams
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # Sin pyarrow seguimos funcionando con CSV
+    pa = None
+    feather = None
+
+HISTORY_CSV = "data/laliga_advanced_stats.csv"
+SOURCE_KEY = b"laliga.source_csv"   # Metadatos del .feather: {'size', 'sha256'} del CSV
+
+# Esquema explícito del histórico (columna -> tipo)
+HISTORY_SCHEMA = {
+    'date': 'datetime64[ns]',
+    'home_team': 'category', 'away_team': 'category',
+    'home_score': 'int8', 'away_score': 'int8',
+    'home_shots': 'int16', 'away_shots': 'int16',
+    'home_shots_on_target': 'int16', 'away_shots_on_target': 'int16',
+    'home_corners': 'int8', 'away_corners': 'int8',
+    'home_yellow': 'int8', 'away_yellow': 'int8',
+    'home_red': 'int8', 'away_red': 'int8',
+}
+
+def columnar_path(csv_path):
+    """data/x.csv -> data/x.feather"""
+    return os.path.splitext(csv_path)[0] + ".feather"
+
+def apply_history_schema(df):
+    """Convierte el histórico a los tipos del esquema (las columnas con huecos quedan en float32)."""
+    df = df[[c for c in HISTORY_SCHEMA if c in df.columns]].copy()
+    df['date'] = pd.to_datetime(df['date']).astype('datetime64[ns]')
+
+    # Nombres canónicos del registro: local y visitante comparten categorías y el
+    # código de cada categoría es el ID del equipo
+    n = len(df)
+    teams = canonical_teams(np.concatenate([df['home_team'].to_numpy(dtype=object),
+                                            df['away_team'].to_numpy(dtype=object)]))
+    df['home_team'], df['away_team'] = teams[:n], teams[n:]
+
+    for col, dtype in HISTORY_SCHEMA.items():
+        if col not in df.columns or dtype in ('category', 'datetime64[ns]'):
+            continue
+        df[col] = df[col].astype('float32') if df[col].isna().any() else df[col].astype(dtype)
+    return df.reset_index(drop=True)
+
+def csv_fingerprint(csv_path):
+    """Tamaño y sha256 del CSV (lo que se guarda en los metadatos del .feather)."""
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return {'size': os.path.getsize(csv_path), 'sha256': digest.hexdigest()}
+
+def save_history(df, csv_path=HISTORY_CSV):
+    """Guarda el histórico en formato columnar y exporta también el CSV."""
+    typed = apply_history_schema(df)
+    typed.to_csv(csv_path, index=False)
+    if feather is not None:
+        # Con la huella del CSV recién escrito. Sin compresión: es lo que permite leerlo
+        # con memory-map sin copias
+        table = pa.Table.from_pandas(typed, preserve_index=False)
+        metadata = {**(table.schema.metadata or {}), SOURCE_KEY: json.dumps(csv_fingerprint(csv_path)).encode()}
+        feather.write_feather(table.replace_schema_metadata(metadata), columnar_path(csv_path),
+                              compression='uncompressed')
+    return typed
+
+def _feather_matches_csv(table, csv_path):
+    if not os.path.exists(csv_path):
+        return True  # Solo hay .feather
+    source = (table.schema.metadata or {}).get(SOURCE_KEY)
+    if source is None:
+        return False  # .feather antiguo, sin huella: no sabemos de qué CSV sale
+    source = json.loads(source)
+    # El tamaño descarta casi todo sin leer el CSV; el hash confirma
+    return source['size'] == os.path.getsize(csv_path) and source == csv_fingerprint(csv_path)
+
+def load_history(csv_path=HISTORY_CSV):
+    """
+    Lee el histórico ya tipado. Usa el .feather (memory-map) si se generó a partir del
+    CSV actual; si no, parsea el CSV y aplica el esquema.
+    """
+    path = columnar_path(csv_path)
+    if feather is not None and os.path.exists(path):
+        table = feather.read_table(path, memory_map=True)
+        if _feather_matches_csv(table, csv_path):
+            return table.to_pandas()
+    if not os.path.exists(csv_path):
+        return pd.DataFrame()
+    return apply_history_schema(pd.read_csv(csv_path))
@@ -0,0 +1,204 @@
+# Registro único de equipos: cualquier alias (Football-Data, API, nombres propios)
+# se resuelve a un ID entero estable con una sola búsqueda vectorizada.
+# Los equipos que no están en el registro (otras ligas, ascendidos nuevos) reciben IDs a
+# partir de len(TEAMS) por orden de aparición y se guardan en data/team_ids.csv: así un
+# club tiene el mismo ID en el histórico, el estado y el calendario, y entre ejecuciones.
+import pandas as pd
+import numpy as np
+import csv
+import logging
+import os
+import tempfile
+import threading
+import unicodedata
+from contextlib import contextmanager
+
+try:
+    import fcntl  # Bloqueo entre procesos del fichero de IDs (no existe en Windows)
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Nombre canónico -> alias conocidos.
+# El ID de cada equipo es su posición en esta lista: añadir siempre AL FINAL, nunca reordenar.
+TEAM_ALIASES = {
+    "Alaves": ["Deportivo Alavés", "Deportivo Alaves"],
+    "Almeria": ["UD Almería", "UD Almeria"],
+    "Athletic Bilbao": ["Ath Bilbao", "Athletic Club"],
+    "Atletico Madrid": ["Ath Madrid", "Atlético de Madrid", "Club Atlético de Madrid"],
+    "Barcelona": ["FC Barcelona"],
+    "Cadiz": ["Cádiz CF", "Cadiz CF"],
+    "Celta de Vigo": ["Celta", "Celta Vigo", "RC Celta de Vigo"],
+    "Cordoba": ["Córdoba CF", "Cordoba CF"],
+    "Deportivo La Coruna": ["La Coruna", "Deportivo", "RC Deportivo La Coruña", "RC Deportivo"],
+    "Eibar": ["SD Eibar"],
+    "Elche": ["Elche CF"],
+    "Espanyol": ["Espanol", "RCD Espanyol", "RCD Espanyol de Barcelona"],
+    "Getafe": ["Getafe CF"],
+    "Girona": ["Girona FC"],
+    "Granada": ["Granada CF"],
+    "Huesca": ["SD Huesca"],
+    "Las Palmas": ["UD Las Palmas"],
+    "Leganes": ["CD Leganés"],
+    "Levante": ["Levante UD"],
+    "Malaga": ["Málaga CF", "Malaga CF"],
+    "Mallorca": ["RCD Mallorca"],
+    "Osasuna": ["CA Osasuna"],
+    "Racing Santander": ["Santander", "Real Racing Club de Santander", "Racing"],
+    "Rayo Vallecano": ["Rayo", "Vallecano", "Rayo Vallecano de Madrid"],
+    "Real Betis": ["Betis", "Real Betis Balompie", "Real Betis Balompié"],
+    "Real Madrid": ["Real Madrid CF"],
+    "Real Oviedo": ["Oviedo"],
+    "Real Sociedad": ["Sociedad", "Real Sociedad de Futbol", "Real Sociedad de Fútbol"],
+    "Real Valladolid": ["Valladolid", "Real Valladolid CF"],
+    "Real Zaragoza": ["Zaragoza"],
+    "Sevilla": ["Sevilla FC"],
+    "Sporting Gijon": ["Sp Gijon", "Sporting de Gijón", "Real Sporting de Gijón"],
+    "Tenerife": ["CD Tenerife"],
+    "Valencia": ["Valencia CF"],
+    "Villarreal": ["Villarreal CF"],
+}
+
+TEAMS = list(TEAM_ALIASES)
+
+def _alias_key(name):
+    # Comparación sin tildes, mayúsculas ni espacios sobrantes
+    name = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode('ascii')
+    return " ".join(name.casefold().split())
+
+# Registro "compilado": clave normalizada -> ID
+ALIAS_TO_ID = {}
+for team_id, (team, aliases) in enumerate(TEAM_ALIASES.items()):
+    for alias in [team] + aliases:
+        ALIAS_TO_ID[_alias_key(alias)] = team_id
+
+# --- EQUIPOS SIN REGISTRAR (IDs persistentes) ---
+DATA_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+EXTRA_TEAMS_PATH = os.environ.get("LALIGA_TEAM_IDS", os.path.join(DATA_ROOT, "team_ids.csv"))
+_EXTRA = {'path': None, 'names': []}   # Nombres sin registrar en orden de ID (len(TEAMS) + posición)
+_EXTRA_LOCK = threading.Lock()
+
+def _read_extra(f):
+    f.seek(0)
+    rows = list(csv.reader(f))[1:]
+    return [name for _, name in sorted((int(team_id), name) for team_id, name in rows)]
+
+def extra_team_ids(names, path=None):
+    """
+    IDs de equipos sin registrar. Los que aún no tienen se añaden al final del fichero
+    (con bloqueo, por si otro proceso está añadiendo a la vez): los IDs nunca cambian.
+    """
+    path = path or EXTRA_TEAMS_PATH
+    with _EXTRA_LOCK:
+        if _EXTRA['path'] != path:
+            _EXTRA.update(path=path, names=[])
+        known = {name: len(TEAMS) + k for k, name in enumerate(_EXTRA['names'])}
+        if all(name in known for name in names):
+            return known
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'a+', newline='', encoding='utf-8') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                current = _read_extra(f)  # Lo que hayan añadido otros procesos
+                new = [name for name in dict.fromkeys(names) if name not in set(current)]
+                writer = csv.writer(f)
+                if not current and f.tell() == 0:
+                    writer.writerow(['team_id', 'name'])
+                writer.writerows([len(TEAMS) + len(current) + k, name] for k, name in enumerate(new))
+                f.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        _EXTRA['names'] = current + new
+        return {name: len(TEAMS) + k for k, name in enumerate(_EXTRA['names'])}
+
+@contextmanager
+def temporary_team_ids():
+    """
+    Tabla de IDs en un fichero temporal mientras dure el bloque (benchmarks con equipos
+    inventados): así no se quedan para siempre en data/team_ids.csv. Los procesos hijos la
+    heredan por la variable de entorno.
+    """
+    global EXTRA_TEAMS_PATH
+    previous, previous_env = EXTRA_TEAMS_PATH, os.environ.get("LALIGA_TEAM_IDS")
+    with tempfile.TemporaryDirectory() as tmp:
+        EXTRA_TEAMS_PATH = os.environ["LALIGA_TEAM_IDS"] = os.path.join(tmp, "team_ids.csv")
+        try:
+            yield EXTRA_TEAMS_PATH
+        finally:
+            EXTRA_TEAMS_PATH = previous
+            if previous_env is None:
+                os.environ.pop("LALIGA_TEAM_IDS", None)
+            else:
+                os.environ["LALIGA_TEAM_IDS"] = previous_env
+
+def is_canonical(categories):
+    """Si unas categorías (p. ej. de un .feather) siguen el registro: su posición es el ID de hoy."""
+    categories = list(categories)
+    if categories[:len(TEAMS)] != TEAMS:
+        return False
+    extra = categories[len(TEAMS):]
+    ids = extra_team_ids(extra) if extra else {}
+    return all(ids[name] == len(TEAMS) + k for k, name in enumerate(extra))
+
+def canonical_teams(values):
+    """
+    Resuelve una serie de nombres a un Categorical cuyas categorías son TEAMS (+ los
+    equipos sin registrar, ver extra_team_ids): el código de cada fila ES el ID del equipo.
+    Solo se busca cada nombre distinto una vez. Los nombres desconocidos se avisan por log.
+    """
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+    lut = np.array([ALIAS_TO_ID.get(_alias_key(u), -1) for u in uniques], dtype=np.int32)
+    unknown = sorted({str(u).strip() for u, i in zip(uniques, lut) if i < 0})
+    categories = TEAMS
+    if unknown:
+        logger.warning(f"⚠️ Equipos sin registrar en teams.py: {unknown}")
+        extra = extra_team_ids(unknown)
+        lut = np.array([i if i >= 0 else extra[str(u).strip()] for u, i in zip(uniques, lut)], dtype=np.int32)
+        # Hasta el mayor ID usado (las categorías de en medio pueden no aparecer)
+        categories = TEAMS + list(extra)[:max(extra[name] for name in unknown) - len(TEAMS) + 1]
+    ids = np.where(codes >= 0, lut[codes] if len(lut) else -1, -1)
+    return pd.Categorical.from_codes(ids, categories=categories)
+
+def resolve_team_ids(values):
+    """IDs enteros (int16) de cada nombre; -1 para valores nulos."""
+    return np.asarray(canonical_teams(values).codes, dtype=np.int16)
+
+def find_unknown_teams(values):
+    """Nombres que no están en el registro (sin contar nulos)."""
+    uniques = pd.Series(values).dropna().unique()
+    return sorted({str(u).strip() for u in uniques if _alias_key(u) not in ALIAS_TO_ID})
+
+_QUIET = {'depth': 0, 'level': logging.NOTSET}
+_QUIET_LOCK = threading.Lock()
+
+@contextmanager
+def quiet_unknown_teams(quiet=True):
+    """
+    Silencia el aviso de equipos sin registrar. El registro solo cubre LaLiga:
+    en el resto de ligas todos los nombres son "desconocidos" y el aviso no aporta nada.
+    Se puede usar desde varios hilos a la vez: el nivel original vuelve al salir el último.
+    """
+    if not quiet:
+        yield
+        return
+    with _QUIET_LOCK:
+        if _QUIET['depth'] == 0:
+            _QUIET['level'] = logger.level
+            logger.setLevel(logging.ERROR)
+        _QUIET['depth'] += 1
+    try:
+        yield
+    finally:
+        with _QUIET_LOCK:
+            _QUIET['depth'] -= 1
+            if _QUIET['depth'] == 0:
+                logger.setLevel(_QUIET['level'])
+
+def canonical_name(name):
+    """Nombre canónico de un único alias (o el propio nombre si no está registrado)."""
+    team_id = ALIAS_TO_ID.get(_alias_key(name))
+    return TEAMS[team_id] if team_id is not None else str(name).strip()
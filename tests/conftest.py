@@ -0,0 +1,57 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Truco para imports: los módulos de src/ se importan sin paquete, como en la app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import teams
+
+
+@pytest.fixture(autouse=True)
+def team_ids_path(tmp_path, monkeypatch):
+    """Cada test con su propia tabla de IDs de equipos sin registrar (no toca data/)."""
+    path = str(tmp_path / "team_ids.csv")
+    monkeypatch.setattr(teams, "EXTRA_TEAMS_PATH", path)
+    return path
+
+
+class LocalServer:
+    """Servidor HTTP local que responde en orden las respuestas de 'responses' y guarda cada petición."""
+
+    def __init__(self, httpd):
+        self.httpd = httpd
+        self.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+        self.responses = []  # (status, cabeceras, cuerpo en bytes)
+        self.seen = []       # (ruta con query, cabeceras) de cada petición recibida
+
+    def reply(self, status=200, headers=None, body=b""):
+        self.responses.append((status, headers or {}, body))
+
+
+@pytest.fixture
+def http_server():
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            server.seen.append((self.path, dict(self.headers)))
+            status, headers, body = server.responses.pop(0) if server.responses else (404, {}, b"")
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server = LocalServer(httpd)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    httpd.shutdown()
+    httpd.server_close()
@@ -0,0 +1,122 @@
+import json
+import time
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+import requests
+
+import api_client
+from api_client import (FIXTURE_COLUMNS, REQUESTS_PER_MINUTE, TokenBucket, _api_request, sync_fixtures,
+                        upsert_fixtures)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Esperas pedidas por el cliente: reloj simulado que solo avanza al dormir."""
+    waits, clock = [], [0.0]
+
+    def sleep(seconds):
+        waits.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(api_client, "time", SimpleNamespace(sleep=sleep, monotonic=lambda: clock[0]))
+    return waits
+
+
+def fast_limiter():
+    return TokenBucket(rate=1000.0, capacity=10)
+
+
+def real_limiter():
+    # Misma configuración que RATE_LIMITER (sin compartir sus fichas con otros tests)
+    return TokenBucket(rate=REQUESTS_PER_MINUTE / 60.0, capacity=REQUESTS_PER_MINUTE)
+
+
+def api_match(match_id, matchday, utc_date, home, away, status="SCHEDULED", score=(None, None)):
+    return {"id": match_id, "matchday": matchday, "utcDate": utc_date, "status": status,
+            "homeTeam": {"name": home}, "awayTeam": {"name": away},
+            "score": {"fullTime": {"home": score[0], "away": score[1]}}}
+
+
+@pytest.mark.parametrize("make_limiter", [fast_limiter, real_limiter])
+def test_429_waits_for_counter_reset_once(http_server, sleeps, make_limiter):
+    http_server.reply(429, {"X-RequestCounter-Reset": "7", "X-Requests-Available-Minute": "0"})
+    http_server.reply(200, {"Content-Type": "application/json"}, b'{"matches": []}')
+
+    response = _api_request(f"{http_server.url}/matches", limiter=make_limiter())
+    assert response.json() == {"matches": []}
+    # Lo que dice la API (no el backoff exponencial), y solo una vez: la espera es la del limitador
+    assert sum(sleeps) == pytest.approx(7.0)
+    assert len(http_server.seen) == 2
+    assert http_server.seen[0][1]["X-Auth-Token"] == api_client.API_KEY
+
+
+def test_exhausted_quota_delays_next_request(http_server, sleeps):
+    # Respuesta correcta pero sin peticiones restantes: la siguiente espera al reinicio
+    http_server.reply(200, {"X-RequestCounter-Reset": "5", "X-Requests-Available-Minute": "0"}, b"{}")
+    http_server.reply(200, {}, b"{}")
+    limiter = TokenBucket(rate=1.0, capacity=10)
+    _api_request(f"{http_server.url}/matches", limiter=limiter)
+    assert sleeps == []
+    _api_request(f"{http_server.url}/matches", limiter=limiter)
+    assert sum(sleeps) == pytest.approx(5.0)
+
+
+def test_429_without_reset_backs_off_through_the_limiter(http_server, sleeps):
+    http_server.reply(429)
+    http_server.reply(200, {}, b"{}")
+    _api_request(f"{http_server.url}/matches", limiter=real_limiter())
+    assert sum(sleeps) == pytest.approx(1.0)  # 2 ** 0
+
+
+def test_429_real_clock_waits_the_reset(http_server):
+    # Reloj real y limitador con la cuota de producción: 1 s de reinicio = ~1 s de espera, no 2
+    http_server.reply(429, {"X-RequestCounter-Reset": "1", "X-Requests-Available-Minute": "0"})
+    http_server.reply(200, {}, b"{}")
+    start = time.monotonic()
+    _api_request(f"{http_server.url}/matches", limiter=real_limiter())
+    assert 0.9 <= time.monotonic() - start < 1.8
+
+
+def test_server_errors_back_off_and_give_up(http_server, sleeps, monkeypatch):
+    monkeypatch.setattr(api_client, "MAX_RETRIES", 2)
+    for _ in range(3):
+        http_server.reply(503)
+    with pytest.raises(requests.HTTPError):
+        _api_request(f"{http_server.url}/matches", limiter=fast_limiter())
+    assert sleeps == [1, 2]
+
+
+def test_sync_fixtures_upserts_by_match_id(http_server, tmp_path):
+    output_path = str(tmp_path / "fixtures.csv")
+    pd.DataFrame([
+        [1, 1, "2026-08-15T17:30:00Z", "15/08 19:30", "FINISHED", "Alaves", "Getafe", "3-0"],
+        [2, 1, "2026-08-15T19:30:00Z", "15/08 21:30", "SCHEDULED", "Sevilla", "Rayo Vallecano", "-"],
+    ], columns=FIXTURE_COLUMNS).to_csv(output_path, index=False)
+
+    # La ventana trae el partido 2 ya jugado y uno nuevo (el 3)
+    body = {"matches": [
+        api_match(2, 1, "2026-08-15T19:30:00Z", "Sevilla FC", "Rayo Vallecano de Madrid", "FINISHED", (2, 1)),
+        api_match(3, 2, "2026-08-22T19:00:00Z", "FC Barcelona", "Real Madrid CF"),
+    ]}
+    http_server.reply(200, {"Content-Type": "application/json"}, json.dumps(body).encode())
+
+    merged = sync_fixtures(f"{http_server.url}/matches", output_path, date_from="2026-08-14",
+                           date_to="2026-08-23", persist=False)
+    assert "dateFrom=2026-08-14" in http_server.seen[0][0] and "dateTo=2026-08-23" in http_server.seen[0][0]
+
+    saved = pd.read_csv(output_path).set_index("match_id")
+    assert list(saved.index) == [1, 2, 3]
+    assert len(merged) == 3
+    assert saved.loc[1, "real_result"] == "3-0"  # Fuera de la ventana: intacto
+    assert (saved.loc[2, "status"], saved.loc[2, "real_result"]) == ("FINISHED", "2-1")
+    assert (saved.loc[3, "home_team"], saved.loc[3, "away_team"]) == ("Barcelona", "Real Madrid")
+
+
+def test_upsert_fixtures_keeps_latest_version():
+    old = pd.DataFrame({"match_id": [1, 2], "matchday": [1, 1], "utc_date": ["a", "b"], "status": ["SCHEDULED"] * 2})
+    new = pd.DataFrame({"match_id": [2], "matchday": [1], "utc_date": ["b"], "status": ["FINISHED"]})
+    merged = upsert_fixtures(old, new)
+    assert list(merged["match_id"]) == [1, 2]
+    assert list(merged["status"]) == ["SCHEDULED", "FINISHED"]
@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# app.py importa sus módulos como paquete (src.*): hace falta la raíz del repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+def make_fixtures():
+    rows = [(1, 'Alaves', 'Cadiz', 'FINISHED', '2-0'), (1, 'Almeria', 'Barcelona', 'FINISHED', '1-1'),
+            (1, 'Cordoba', 'Celta de Vigo', 'FINISHED', '0-1'), (2, 'Cadiz', 'Almeria', 'TIMED', '-')]
+    fixtures = pd.DataFrame(rows, columns=['matchday', 'home_team', 'away_team', 'status', 'real_result'])
+    return fixtures.assign(date_str="14/03 19:00")
+
+
+def make_preds():
+    # Jornada 1: acierta la primera, falla la segunda, y la tercera se predijo ya empezado
+    preds = pd.DataFrame({'matchday': [1, 1, 1, 2], 'home_team': ['Alaves', 'Almeria', 'Cordoba', 'Cadiz'],
+                          'away_team': ['Cadiz', 'Barcelona', 'Celta de Vigo', 'Almeria'],
+                          'p1': [0.6, 0.5, 0.2, 0.4], 'pX': [0.3, 0.3, 0.2, 0.3], 'p2': [0.1, 0.2, 0.6, 0.3],
+                          'pred': ['1', '1', '2', '1'], 'pre_kickoff': [True, True, False, True]})
+    return preds.set_index('matchday', drop=False)
+
+
+@pytest.fixture
+def markdown(monkeypatch):
+    calls = []
+    monkeypatch.setattr(app.st, "markdown", lambda body, **kwargs: calls.append(body))
+    return calls
+
+
+def test_matchday_matches_only_selected_matchday():
+    matches = app.matchday_matches(make_fixtures(), make_preds(), 1)
+    assert len(matches) == 3 and set(matches['matchday']) == {1}
+    assert list(matches['pred']) == ['1', '1', '2'] and 'real_result' in matches.columns
+    assert app.matchday_matches(make_fixtures(), make_preds(), 3).empty
+
+
+def test_accuracy_counts_only_pre_kickoff_predictions(markdown):
+    app.show_accuracy(app.matchday_matches(make_fixtures(), make_preds(), 1))
+    assert len(markdown) == 1 and "<b>1/2</b>" in markdown[0]
+    app.show_accuracy(app.matchday_matches(make_fixtures(), make_preds(), 2))  # Nada jugado: sin marcador
+    assert len(markdown) == 1
+
+
+def test_cards_render_as_one_html_payload(markdown):
+    app.render_cards(app.matchday_matches(make_fixtures(), make_preds(), 1))
+    assert len(markdown) == 1 and markdown[0].count('class="match-card"') == 3
+    assert "FINALIZADO" in markdown[0] and "2-0" in markdown[0]
+
+
+def test_card_html_shows_live_score():
+    card = app.card_html("14/03 19:00", "IN_PLAY", "Cadiz", "Almeria", "1-0", 0.4, 0.3, 0.3, "1")
+    assert "EN JUEGO" in card and "1-0" in card and "(40%)" in card
+    assert ">vs<" in app.card_html("21/03 19:00", "TIMED", "Cadiz", "Almeria", "-", 0.4, 0.3, 0.3, "1")
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+from threadpoolctl import threadpool_info
+
+import backtest
+from backtest import (DEFAULT_PARAMS, assign_matchdays, assign_seasons, build_folds,
+                      expected_calibration_error, run_backtest)
+from benchmark import generate_synthetic_league
+from storage import save_history
+
+
+def test_matchdays_group_friday_to_monday():
+    dates = pd.Series(pd.to_datetime(["2024-08-16", "2024-08-19", "2024-08-20", "2024-08-23"]))  # Vie, Lun, Mar, Vie
+    matchdays = assign_matchdays(dates)
+    assert matchdays[0] == matchdays[1] == pd.Timestamp("2024-08-13")
+    assert matchdays[2] == matchdays[3] == pd.Timestamp("2024-08-20")
+
+
+def test_seasons_run_july_to_june():
+    dates = pd.Series(pd.to_datetime(["1999-08-20", "2000-05-01", "2024-07-01", "2025-06-30"]))
+    assert list(assign_seasons(dates)) == ["1999/00", "1999/00", "2024/25", "2024/25"]
+
+
+def test_build_folds():
+    matchdays = np.array([0, 0, 1, 1, 1, 2, 3, 3, 4])
+    assert build_folds(matchdays, min_train=2) == [(2, 5), (5, 6), (6, 8), (8, 9)]
+    assert build_folds(matchdays, min_train=2, step=2) == [(2, 6), (6, 9)]
+    assert build_folds(matchdays, min_train=100) == []
+
+
+def test_calibration_error():
+    y = np.array([0, 1, 2, 0])
+    assert expected_calibration_error(y, np.eye(3)[y]) == 0.0
+    # Siempre 100% al local: el tramo alto acierta 2 de 4 y el bajo (p=0) falla 2 de 8 -> (2 + 2) / 12
+    assert expected_calibration_error(y, np.tile([1.0, 0.0, 0.0], (4, 1))) == pytest.approx(1 / 3)
+
+
+@pytest.fixture
+def league_csv(tmp_path):
+    path = str(tmp_path / "history.csv")
+    save_history(generate_synthetic_league(n_teams=6, n_seasons=3, seed=3), path)
+    return path
+
+
+def test_walk_forward_predicts_only_after_training_window(league_csv):
+    predictions, report = run_backtest(mode="fast", workers=1, min_train=60, step=2,
+                                       input_path=league_csv, params=DEFAULT_PARAMS['fast'])
+    assert not predictions.empty
+    np.testing.assert_allclose(predictions[['p1', 'pX', 'p2']].sum(axis=1), 1.0)
+    # El primer fold entrena con al menos min_train partidos (filas ordenadas por fecha)
+    assert predictions.index.min() >= 60
+    assert report['matches'].sum() == len(predictions)
+    assert set(report.columns) >= {'season', 'accuracy', 'log_loss', 'brier', 'ece'}
+    assert report['log_loss'].notna().all()
+
+
+def test_parallel_backtest_matches_serial(league_csv):
+    kwargs = dict(mode="fast", min_train=60, step=4, input_path=league_csv, params=DEFAULT_PARAMS['fast'])
+    serial, _ = run_backtest(workers=1, **kwargs)
+    parallel, _ = run_backtest(workers=2, **kwargs)
+    pd.testing.assert_frame_equal(serial, parallel)
+
+
+def test_worker_caps_openmp_threads():
+    backtest._init_worker(None, None, "fast", {}, threads=1)
+    try:
+        openmp = [p for p in threadpool_info() if p['user_api'] == 'openmp']
+        assert openmp and all(p['num_threads'] == 1 for p in openmp)
+    finally:
+        backtest._WORKER.pop('thread_limits').restore_original_limits()
+        backtest._WORKER.clear()
@@ -0,0 +1,57 @@
+import os
+
+import pandas as pd
+
+import teams
+from benchmark import (benchmark_pipeline, compare_with_baseline, generate_synthetic_fixtures,
+                       generate_synthetic_league, load_results, save_results)
+
+
+def test_synthetic_league_is_a_double_round_robin():
+    history = generate_synthetic_league(n_teams=6, n_seasons=2, n_leagues=2, seed=1)
+    assert len(history) == 2 * 2 * 6 * 5
+    assert history['date'].is_monotonic_increasing
+    assert not (history['home_team'] == history['away_team']).any()
+    # Cada pareja juega una vez en cada campo por temporada
+    pairs = history.groupby(['home_team', 'away_team']).size()
+    assert (pairs == 2).all() and len(pairs) == 2 * 6 * 5
+
+
+def test_synthetic_fixtures_follow_history():
+    history = generate_synthetic_league(n_teams=6, n_seasons=1)
+    fixtures = generate_synthetic_fixtures(history, n_matchdays=2)
+    assert list(fixtures.groupby('matchday').size()) == [3, 3]
+    assert pd.to_datetime(fixtures['utc_date']).min() > pd.Timestamp(history['date'].max()).tz_localize("UTC")
+    assert set(fixtures['home_team']) | set(fixtures['away_team']) <= set(history['home_team'])
+
+
+def test_compare_with_baseline_flags_regressions():
+    key = {'suite': 'pipeline', 'n_teams': 20, 'n_seasons': 2, 'n_leagues': 1, 'n_matches': 760}
+    baseline = pd.DataFrame([{**key, 'stage': 'h2h', 'seconds': 1.0, 'peak_mb': 10.0},
+                             {**key, 'stage': 'rest_days', 'seconds': 1.0, 'peak_mb': 10.0},
+                             {**key, 'stage': 'prepare_data', 'seconds': 1.0, 'peak_mb': 10.0}])
+    results = pd.DataFrame([{**key, 'stage': 'h2h', 'seconds': 1.1, 'peak_mb': 10.0},        # Dentro de la tolerancia
+                            {**key, 'stage': 'rest_days', 'seconds': 2.0, 'peak_mb': 10.0},  # Más lento
+                            {**key, 'stage': 'prepare_data', 'seconds': 0.5, 'peak_mb': 20.0},  # Más memoria
+                            {**key, 'stage': 'train_fast', 'seconds': 9.0, 'peak_mb': 1.0}])  # Sin base
+    merged = compare_with_baseline(results, baseline, tolerance=0.25).set_index('stage')
+    assert merged['regression'].to_dict() == {'h2h': False, 'rest_days': True, 'prepare_data': True}
+
+
+def test_results_round_trip(tmp_path):
+    results = pd.DataFrame([{'suite': 'pipeline', 'stage': 'h2h', 'seconds': 0.5, 'peak_mb': 1.5}])
+    path = str(tmp_path / "bench" / "results.json")
+    save_results(results, path)
+    pd.testing.assert_frame_equal(load_results(path), results)
+
+
+def test_benchmark_pipeline_leaves_team_registry_untouched(tmp_path):
+    # Las ligas extra usan nombres inventados: sus IDs van a un registro temporal
+    registry = teams.EXTRA_TEAMS_PATH
+    results = benchmark_pipeline(sizes=((6, 2, 2),), stages=['rolling_stats', 'h2h', 'prepare_data'],
+                                 memory=False, compiled_dir=str(tmp_path / "missing"))
+    assert list(results['stage']) == ['rolling_stats', 'h2h', 'prepare_data']
+    assert (results['n_matches'] == 2 * 2 * 6 * 5).all() and (results['seconds'] > 0).all()
+    assert teams.EXTRA_TEAMS_PATH == registry
+    if os.path.exists(registry):
+        assert not pd.read_csv(registry)['name'].str.startswith('L1 ').any()
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark import generate_synthetic_fixtures, generate_synthetic_league, generate_synthetic_matches
+from feature_eng import (BANK_COLS, STATE_FEATURES, build_team_rows, build_team_state, calculate_h2h_balance,
+                         calculate_rolling_stats, check_state_consistency, get_h2h_balance, load_team_state,
+                         normalize_names, prepare_upcoming_matches, rolling_feature_bank, sync_team_state,
+                         team_state_features, verify_team_state)
+from storage import save_history
+from teams import quiet_unknown_teams
+
+
+# --- H2H: versión vectorizada == fila a fila ---
+@pytest.mark.parametrize("n_matches, n_teams", [(400, 4), (600, 20), (600, 40)])
+def test_h2h_matches_row_by_row(n_matches, n_teams):
+    # 4 equipos: muchas parejas repetidas el mismo día; 40: equipos sin registrar
+    with quiet_unknown_teams():
+        df = normalize_names(generate_synthetic_matches(n_matches, n_teams=n_teams, seed=n_teams))
+        legacy = df.apply(lambda row: get_h2h_balance(row, df), axis=1).to_numpy()
+        fast = calculate_h2h_balance(df)
+    np.testing.assert_allclose(fast, legacy)
+
+
+def test_h2h_without_history_is_neutral():
+    df = generate_synthetic_matches(1, n_teams=2)
+    assert list(calculate_h2h_balance(df)) == [1.5]
+    assert len(calculate_h2h_balance(df.iloc[:0])) == 0
+
+
+# --- BANCO RODANTE (lfilter / sumas acumuladas) == pandas por equipo ---
+def _history_with_gaps(seed=3):
+    df = generate_synthetic_league(n_teams=10, n_seasons=3, seed=seed)
+    # Estadísticas que faltan en algunos partidos (como en los CSV de Football-Data)
+    rng = np.random.default_rng(seed)
+    for col in ['home_shots', 'away_corners']:
+        df.loc[rng.random(len(df)) < 0.1, col] = np.nan
+    return df
+
+
+def _prior(grouped, func):
+    return grouped.transform(lambda x: func(x.shift(1))).fillna(0.0)
+
+
+def test_rolling_bank_matches_pandas():
+    df = _history_with_gaps()
+    bank = rolling_feature_bank(df)
+    rows = build_team_rows(df)
+    rows['season'] = rows['date'].dt.year - (rows['date'].dt.month < 7)
+    assert bank.index.equals(rows.index)
+
+    for col in BANK_COLS:
+        by_team = rows.groupby('team')[col]
+        for span in (3, 5, 10):
+            expected = _prior(by_team, lambda x: x.ewm(span=span, min_periods=1).mean())
+            np.testing.assert_allclose(bank[f'ewm{span}_{col}'], expected, err_msg=f'ewm{span}_{col}')
+        expected = _prior(by_team, lambda x: x.rolling(3, min_periods=1).sum())
+        np.testing.assert_allclose(bank[f'sum3_{col}'], expected, err_msg=f'sum3_{col}')
+        expected = _prior(rows.groupby(['team', 'season'])[col], lambda x: x.expanding().mean())
+        np.testing.assert_allclose(bank[f'season_{col}'], expected, err_msg=f'season_{col}')
+
+
+def test_rolling_stats_match_legacy_formula():
+    df = _history_with_gaps(seed=5)
+    stats = calculate_rolling_stats(df, window=5)
+    rows = build_team_rows(df)
+    for col in ['points', 'goals_for', 'goals_against', 'attack_power']:
+        expected = _prior(rows.groupby('team')[col], lambda x: x.ewm(span=5, min_periods=1).mean())
+        np.testing.assert_allclose(stats[f'avg_{col}'], expected)
+    expected = _prior(rows.groupby('team')['points'], lambda x: x.rolling(3, min_periods=1).sum())
+    np.testing.assert_allclose(stats['form_streak'], expected)
+
+
+# --- ESTADO INCREMENTAL == RECONSTRUCCIÓN COMPLETA ---
+def _sorted_history(seed=7):
+    history = normalize_names(_history_with_gaps(seed))
+    return history.sort_values('date', kind='stable').reset_index(drop=True)
+
+
+def _assert_same_state(state, history):
+    pd.testing.assert_frame_equal(team_state_features(state), team_state_features(build_team_state(history)))
+
+
+def test_incremental_rows_match_full_recalculation():
+    assert check_state_consistency(_sorted_history())
+
+
+@pytest.mark.parametrize("missing", ["last", "middle"])
+def test_sync_team_state_matches_rebuild(tmp_path, missing):
+    history = _sorted_history()
+    state_path = str(tmp_path / "team_state.csv")
+    # 'last': un partido de la última jornada llega tarde (otros equipos ya jugaron ese día)
+    # 'middle': falta un partido antiguo, solo se puede reconstruir
+    drop = len(history) - 1 if missing == "last" else len(history) // 2
+    sync_team_state(history.drop(index=drop), state_path=state_path)
+
+    state = sync_team_state(history, state_path=state_path)
+    _assert_same_state(state, history)
+    _assert_same_state(load_team_state(state_path), history)
+    assert verify_team_state(history, state_path)
+
+    # Volver a sincronizar sin partidos nuevos no cambia nada
+    _assert_same_state(sync_team_state(history, state_path=state_path), history)
+
+
+def test_verify_team_state_repairs_a_stale_state(tmp_path):
+    history = _sorted_history()
+    state_path = str(tmp_path / "team_state.csv")
+    state = build_team_state(history)
+    state['num_points'] *= 2  # Estado corrupto (p. ej. un partido contado dos veces)
+    state.to_csv(state_path)
+
+    assert not verify_team_state(history, state_path)
+    assert verify_team_state(history, state_path)
+    np.testing.assert_allclose(team_state_features(load_team_state(state_path))[STATE_FEATURES],
+                               team_state_features(build_team_state(history))[STATE_FEATURES])
+
+
+# --- PREDICCIÓN POR JORNADA: lo mismo que el calendario entero, solo esa jornada ---
+def test_prepare_upcoming_single_matchday_matches_full_calendar(tmp_path):
+    history = generate_synthetic_league(n_teams=6, n_seasons=2, seed=8)
+    history_path, state_path = str(tmp_path / "history.csv"), str(tmp_path / "team_state.csv")
+    save_history(history, history_path)
+    fixtures = generate_synthetic_fixtures(history, n_matchdays=3)
+
+    X_all, matches_all = prepare_upcoming_matches(fixtures, history_path, state_path=state_path)
+    X_md, matches_md = prepare_upcoming_matches(fixtures, history_path, state_path=state_path, matchday=2)
+    assert set(matches_md['matchday']) == {2} and len(X_md) == 3
+    pd.testing.assert_frame_equal(X_md, X_all.loc[matches_all['matchday'] == 2])
+    assert prepare_upcoming_matches(fixtures, history_path, state_path=state_path, matchday=9)[0].empty
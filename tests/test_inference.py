@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
+
+from inference import load_compiled_model, save_compiled_model
+from models import flatten_model
+
+
+def _dataset(n_rows, seed, missing=0.0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n_rows, 6)), columns=[f"f{i}" for i in range(6)])
+    score = X["f0"] - X["f1"] + 0.5 * X["f2"] * X["f3"] + rng.normal(scale=0.5, size=n_rows)
+    y = np.digitize(score, [-0.5, 0.5])  # 0 = visitante, 1 = empate, 2 = local
+    if missing:
+        X = X.mask(rng.random(X.shape) < missing)
+    return X, y
+
+
+MODELS = {
+    "gradient_boosting": (GradientBoostingClassifier(n_estimators=30, max_depth=3, random_state=0), 0.0),
+    "hist_gradient_boosting": (HistGradientBoostingClassifier(max_iter=30, max_depth=4, random_state=0), 0.1),
+}
+
+
+@pytest.mark.parametrize("name", list(MODELS))
+@pytest.mark.parametrize("mmap", [True, False])
+def test_compiled_forest_matches_sklearn(name, mmap, tmp_path):
+    model, missing = MODELS[name]
+    X, y = _dataset(600, seed=1, missing=missing)
+    model.fit(X, y)
+    arrays, meta = flatten_model(model, X.iloc[:100])
+    save_compiled_model(arrays, meta, str(tmp_path))
+    forest = load_compiled_model(str(tmp_path), mmap=mmap)
+
+    # Filas nuevas (no las usadas para calcular la predicción inicial), con huecos en HGB
+    X_new, _ = _dataset(300, seed=2, missing=missing)
+    np.testing.assert_allclose(forest.predict_proba(X_new), model.predict_proba(X_new), rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(forest.predict(X_new), model.predict(X_new))
+    # Columnas en otro orden: se seleccionan por nombre, como en sklearn
+    np.testing.assert_allclose(forest.predict_proba(X_new[X_new.columns[::-1]]), model.predict_proba(X_new),
+                               rtol=0, atol=1e-9)
+    assert list(forest.classes_) == list(model.classes_)
+
+
+def test_binary_models_are_not_exported():
+    X, y = _dataset(200, seed=3)
+    model = GradientBoostingClassifier(n_estimators=5, random_state=0).fit(X, (y == 2).astype(int))
+    with pytest.raises(ValueError):
+        flatten_model(model, X)
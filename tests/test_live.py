@@ -0,0 +1,76 @@
+import functools
+import json
+
+import pandas as pd
+import pytest
+
+import live
+from api_client import TokenBucket, api_get_if_changed
+from live import LivePoller, active_window
+
+NOW = pd.Timestamp("2026-03-14 18:30", tz="UTC")
+KEY = (27, 'Alaves', 'Cadiz')
+
+
+def api_body(status, score):
+    match = {"id": 1, "matchday": 27, "utcDate": "2026-03-14T18:00:00Z", "status": status,
+             "homeTeam": {"name": "Alaves"}, "awayTeam": {"name": "Cadiz"},
+             "score": {"fullTime": {"home": score[0], "away": score[1]}}}
+    return json.dumps({"matches": [match]}).encode()
+
+
+@pytest.fixture
+def poller(tmp_path, http_server, monkeypatch):
+    # Limitador propio: el compartido de api_client lo gastan otros tests
+    monkeypatch.setattr(live, "api_get_if_changed",
+                        functools.partial(api_get_if_changed, limiter=TokenBucket(rate=1000.0, capacity=10)))
+    fixtures_path = tmp_path / "fixtures.csv"
+    pd.DataFrame({'matchday': [27, 28], 'utc_date': ["2026-03-14T18:00:00Z", "2026-03-21T18:00:00Z"],
+                  'status': ['TIMED', 'TIMED'], 'home_team': ['Alaves', 'Cadiz'], 'away_team': ['Cadiz', 'Alaves'],
+                  'real_result': [None, None]}).to_csv(fixtures_path, index=False)
+    return LivePoller(base_url=f"{http_server.url}/matches", fixtures_path=str(fixtures_path))
+
+
+def test_active_window():
+    fixtures = pd.DataFrame({'utc_date': ["2026-03-14T14:00:00Z", "2026-03-14T18:00:00Z", "2026-03-14T18:35:00Z",
+                                          "2026-03-14T19:00:00Z", "2026-03-14T18:00:00Z"],
+                             'status': ['TIMED', 'IN_PLAY', 'TIMED', 'TIMED', 'FINISHED']})
+    # Empezó hace 4h30 (ya acabó), en juego, empieza en 5 min, empieza en 30 min, terminado
+    assert list(active_window(fixtures, NOW).index) == [1, 2]
+
+
+def test_conditional_polling(poller, http_server):
+    http_server.reply(200, {"ETag": '"v1"', "Content-Type": "application/json"}, api_body("IN_PLAY", (1, 0)))
+    http_server.reply(304, {"ETag": '"v1"'})
+    http_server.reply(200, {"ETag": '"v2"', "Content-Type": "application/json"}, api_body("IN_PLAY", (1, 0)))
+    http_server.reply(200, {"ETag": '"v3"', "Content-Type": "application/json"}, api_body("FINISHED", (2, 0)))
+
+    assert poller.poll_once(NOW) == [KEY]
+    assert poller.snapshot() == (1, {KEY: {'status': 'IN_PLAY', 'real_result': '1-0'}})
+    assert "If-None-Match" not in http_server.seen[0][1]
+    assert "status=IN_PLAY%2CPAUSED%2CFINISHED" in http_server.seen[0][0]
+
+    # 304: sin cuerpo, sin cambios y se conserva el ETag
+    assert poller.poll_once(NOW) == []
+    assert http_server.seen[1][1]["If-None-Match"] == '"v1"'
+    assert poller.etag == '"v1"' and poller.version == 1
+
+    # Respuesta nueva con los mismos datos: ETag nuevo pero la versión no sube
+    assert poller.poll_once(NOW) == []
+    assert poller.etag == '"v2"' and poller.version == 1
+
+    assert poller.poll_once(NOW) == [KEY] and poller.version == 2
+    assert poller.requests == 4
+
+
+def test_no_requests_without_matches_in_window(poller, http_server):
+    assert poller.poll_once(pd.Timestamp("2026-03-10 12:00", tz="UTC")) == []
+    assert http_server.seen == [] and poller.requests == 0
+
+
+def test_apply_overlays_live_state(poller, http_server):
+    http_server.reply(200, {"ETag": '"v1"', "Content-Type": "application/json"}, api_body("IN_PLAY", (0, 1)))
+    poller.poll_once(NOW)
+    fixtures = poller.apply(pd.read_csv(poller.fixtures_path))
+    assert list(fixtures['status']) == ['IN_PLAY', 'TIMED']
+    assert fixtures.loc[0, 'real_result'] == '0-1' and pd.isna(fixtures.loc[1, 'real_result'])
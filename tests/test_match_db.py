@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+
+import match_db
+from benchmark import generate_synthetic_league
+from feature_eng import get_h2h_balance, lookup_h2h_balance
+from match_db import league_teams, store, table_counts, upsert_fixture_rows, upsert_matches
+from teams import resolve_team_ids
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "matches.db")
+
+
+@pytest.fixture
+def history():
+    return generate_synthetic_league(n_teams=6, n_seasons=2, seed=11)
+
+
+def test_reingesting_a_season_only_touches_changed_rows(db_path, history):
+    assert upsert_matches(history, db_path=db_path) == (len(history), 0)
+    assert upsert_matches(history, db_path=db_path) == (0, 0)   # Idempotente
+
+    changed = history.copy()
+    changed.loc[5, 'home_corners'] += 1                          # Corrección de una estadística
+    extra = changed.iloc[[0]].assign(date=changed['date'].max() + pd.Timedelta(days=7))
+    assert upsert_matches(pd.concat([changed, extra]), db_path=db_path) == (1, 1)
+    assert table_counts(db_path=db_path)['matches'] == len(history) + 1
+
+
+def test_leagues_do_not_collide(db_path, history):
+    upsert_matches(history, league="SP1", db_path=db_path)
+    assert upsert_matches(history, league="E0", db_path=db_path) == (len(history), 0)
+    assert table_counts("E0", db_path)['matches'] == table_counts("SP1", db_path)['matches']
+
+
+def test_teams_keep_registry_ids(db_path, history):
+    upsert_matches(history, db_path=db_path)
+    teams = league_teams(db_path=db_path)
+    assert len(teams) == 6
+    assert list(teams['team_id']) == [int(i) for i in resolve_team_ids(teams['name'])]
+
+
+def test_fixture_upsert_updates_status_and_result(db_path):
+    fixtures = pd.DataFrame({'match_id': [1, 2], 'matchday': [1, 1], 'utc_date': ["2026-03-14T18:00:00Z"] * 2,
+                             'date_str': ["14/03 19:00"] * 2, 'status': ['TIMED', 'TIMED'],
+                             'home_team': ['Alaves', 'Almeria'], 'away_team': ['Cadiz', 'Barcelona'],
+                             'real_result': ['-', '-']})
+    assert upsert_fixture_rows(fixtures, db_path=db_path) == (2, 0)
+    assert upsert_fixture_rows(fixtures, db_path=db_path) == (0, 0)
+    fixtures.loc[0, ['status', 'real_result']] = ['FINISHED', '2-1']
+    assert upsert_fixture_rows(fixtures, db_path=db_path) == (0, 1)
+    result = match_db._query("SELECT status, real_result FROM fixtures WHERE match_id = 1", [], db_path)
+    assert result.iloc[0].tolist() == ['FINISHED', '2-1']
+
+
+def test_pair_lookup_matches_dataframe_h2h(db_path, history):
+    upsert_matches(history, db_path=db_path)
+    for row in history.iloc[[25, 45, -1]].to_dict('records'):
+        assert lookup_h2h_balance(row['home_team'], row['away_team'], row['date'], db_path=db_path) == \
+            pytest.approx(get_h2h_balance(row, history))
+    # Sin precedentes: valor neutro
+    first = history.iloc[0]
+    assert lookup_h2h_balance(first['home_team'], first['away_team'], first['date'], db_path=db_path) == 1.5
+
+
+def test_store_only_warns_on_database_errors(tmp_path, history):
+    # Una carpeta no es una base de datos: se avisa y el que llama sigue
+    assert store('matches', history, db_path=str(tmp_path)) is None
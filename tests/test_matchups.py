@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import matchups
+from benchmark import generate_synthetic_fixtures, generate_synthetic_league
+from feature_eng import prepare_matchups, prepare_upcoming_matches
+from matchups import as_matchups, league_matrix, matrix_table, predict_matchups, probability_matrix
+from storage import save_history
+
+
+class FeatureModel:
+    """Modelo de prueba: probabilidades deterministas a partir de las dos primeras features."""
+
+    def predict_proba(self, X):
+        scores = np.column_stack([X.iloc[:, 0], np.zeros(len(X)), X.iloc[:, 1]]).astype(float)
+        exp = np.exp(scores - scores.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+@pytest.fixture
+def league(tmp_path):
+    history = generate_synthetic_league(n_teams=6, n_seasons=2, seed=9)
+    paths = {'history': str(tmp_path / "history.csv"), 'state': str(tmp_path / "team_state.csv"),
+             'fixtures': str(tmp_path / "fixtures.csv"), 'compiled': str(tmp_path / "compiled")}
+    save_history(history, paths['history'])
+    generate_synthetic_fixtures(history, n_matchdays=1).to_csv(paths['fixtures'], index=False)
+    return history, paths
+
+
+def test_as_matchups_pads_missing_dates():
+    df = as_matchups([("Alaves", "Cadiz"), ("Cadiz", "Alaves", "2026-05-01")])
+    assert list(df.columns) == ['home_team', 'away_team', 'date']
+    assert df['date'].isna().tolist() == [True, False]
+
+
+def test_matchups_use_the_same_features_as_fixtures(league):
+    _, paths = league
+    fixtures = pd.read_csv(paths['fixtures'])
+    X_fix, _ = prepare_upcoming_matches(fixtures, paths['history'], state_path=paths['state'])
+    X_mu, _ = prepare_matchups(fixtures[['home_team', 'away_team']].assign(date=fixtures['utc_date']),
+                               paths['history'], paths['state'])
+    pd.testing.assert_frame_equal(X_mu.reset_index(drop=True), X_fix[X_mu.columns].reset_index(drop=True))
+
+
+def test_probability_matrix(league):
+    history, paths = league
+    teams = sorted(set(history['home_team'])) + ["Equipo Nuevo"]
+    names, probs = probability_matrix(FeatureModel(), teams, "2026-05-01", paths['history'], paths['state'])
+    assert probs.shape == (7, 7, 3)
+    assert np.isnan(probs[np.arange(7), np.arange(7)]).all()              # Diagonal vacía
+    assert np.isnan(probs[6]).all() and np.isnan(probs[:, 6]).all()        # Sin histórico
+    known = probs[:6, :6][~np.eye(6, dtype=bool)]
+    np.testing.assert_allclose(known.sum(axis=1), 1.0)
+
+    # Cada celda es lo mismo que pedir ese cruce suelto
+    table = matrix_table(names, probs)
+    single = predict_matchups(FeatureModel(), [(names[1], names[3], "2026-05-01")], paths['history'], paths['state'])
+    cell = table[(table['home_team'] == names[1]) & (table['away_team'] == names[3])]
+    np.testing.assert_allclose(cell[['p1', 'pX', 'p2']].to_numpy(), single[['p1', 'pX', 'p2']].to_numpy())
+    assert single.loc[0, 'pred'] in ('1', 'X', '2')
+
+
+def test_league_matrix_is_memoized_until_files_change(league, monkeypatch):
+    history, paths = league
+    loads = []
+    monkeypatch.setattr(matchups, "league_paths", lambda league: paths)
+    monkeypatch.setattr(matchups, "load_compiled_model", lambda path: loads.append(path) or FeatureModel())
+    matchups._league_matrix.cache_clear()
+    try:
+        teams, first = league_matrix("SP1", date="2026-05-01")
+        assert len(teams) == 6 and not first.flags.writeable
+        assert league_matrix("SP1", date="2026-05-01")[1] is first and len(loads) == 1
+
+        save_history(history.iloc[:-3], paths['history'])   # Histórico nuevo: otra entrada
+        assert league_matrix("SP1", date="2026-05-01")[1] is not first and len(loads) == 2
+    finally:
+        matchups._league_matrix.cache_clear()
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import models
+from benchmark import generate_synthetic_league
+from feature_eng import prepare_data
+from models import RETUNE_GROWTH, choose_training_path, meta_path_for, search_baseline, train_and_evaluate
+from storage import save_history
+
+
+# --- ¿BUSCAR, REAJUSTAR O REUTILIZAR? ---
+META = {'mode': 'fast', 'fingerprint': 'abc', 'n_rows': 1000, 'search_n_rows': 1000,
+        'log_loss': 0.99, 'search_log_loss': 0.98, 'best_params': {'max_depth': 3}}
+
+
+@pytest.mark.parametrize("meta, mode, fingerprint, n_rows, force, expected", [
+    (None, 'fast', 'abc', 1000, False, 'search'),                         # Primer entrenamiento
+    (META, 'full', 'abc', 1000, False, 'search'),                         # Otro modo
+    (META, 'fast', 'abc', 1000, True, 'search'),                          # --retune
+    (META, 'fast', 'abc', 1000, False, 'reuse'),                          # Mismos datos
+    (META, 'fast', 'new', 1050, False, 'refit'),                          # Pocos partidos nuevos
+    (META, 'fast', 'new', int(1000 * (1 + RETUNE_GROWTH)) + 1, False, 'search'),
+    # El crecimiento se mide desde la última BÚSQUEDA, no desde el último reajuste
+    ({**META, 'n_rows': 1080, 'search_n_rows': 1000}, 'fast', 'new', 1120, False, 'search'),
+    ({'mode': 'fast', 'fingerprint': 'abc', 'n_rows': 1000}, 'fast', 'new', 1050, False, 'refit'),  # Meta antigua
+])
+def test_choose_training_path(meta, mode, fingerprint, n_rows, force, expected):
+    assert choose_training_path(meta, mode, fingerprint, n_rows, force) == expected
+
+
+def test_search_baseline_falls_back_to_last_loss():
+    assert search_baseline(META) == 0.98
+    assert search_baseline({'log_loss': 0.97}) == 0.97
+
+
+# --- REENTRENAMIENTO EN CALIENTE DE PRINCIPIO A FIN ---
+def test_warm_start_reuses_and_refits(tmp_path, monkeypatch):
+    # Sin instantáneas ni registro: solo el modelo y su meta en tmp_path
+    monkeypatch.setattr(models, "write_snapshot", lambda *args, **kwargs: None)
+    csv_path, model_path = str(tmp_path / "history.csv"), str(tmp_path / "model.pkl")
+    save_history(generate_synthetic_league(n_teams=10, n_seasons=3, seed=4), csv_path)
+    data = prepare_data(csv_path, train_mode=True)
+    older = data.iloc[:len(data) - 20].reset_index(drop=True)
+
+    first = train_and_evaluate(mode="fast", model_path=model_path, data=older)
+    assert first['path'] == 'search'
+    assert train_and_evaluate(mode="fast", model_path=model_path, data=older)['path'] == 'reuse'
+
+    # Unos pocos partidos nuevos: se reajusta con los mismos hiperparámetros
+    refit = train_and_evaluate(mode="fast", model_path=model_path, data=data)
+    assert refit['path'] in ('refit', 'search')  # 'search' si el log-loss empeoró demasiado
+    if refit['path'] == 'refit':
+        assert refit['best_params'] == first['best_params']
+    with open(meta_path_for(model_path)) as f:
+        meta = json.load(f)
+    assert meta['n_rows'] == len(data)
+    # La referencia de la búsqueda solo cambia al buscar
+    expected_search_rows = len(older) if refit['path'] == 'refit' else len(data)
+    assert meta['search_n_rows'] == expected_search_rows
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+import feature_eng
+import match_db
+import pipeline
+from pipeline import plan_league, run_pipeline, write_github_output
+
+DATA = {'history': 'h1', 'fixtures': 'f1', 'model': 'm1'}
+
+
+@pytest.mark.parametrize("current, previous, force, expected", [
+    ({**DATA, 'history': None}, DATA, True, 'skip'),       # Sin histórico no se hace nada
+    (DATA, None, False, 'train'),                          # Primera ejecución
+    ({**DATA, 'model': None}, DATA, False, 'train'),       # Sin modelo entrenado
+    ({**DATA, 'history': 'h2'}, DATA, False, 'train'),     # Histórico nuevo
+    (DATA, DATA, True, 'train'),                           # --force
+    ({**DATA, 'fixtures': 'f2'}, DATA, False, 'snapshot'), # Solo cambió el calendario
+    (DATA, DATA, False, 'skip'),
+])
+def test_plan_league(current, previous, force, expected):
+    assert plan_league(current, previous, force) == expected
+
+
+@pytest.fixture
+def fake_league(monkeypatch):
+    """Huellas controladas por el test; entrenar e instantáneas solo se anotan."""
+    prints = {'SP1': dict(DATA)}
+    calls = []
+    monkeypatch.setattr(pipeline, "fingerprint", lambda league: dict(prints[league]))
+    monkeypatch.setattr(pipeline, "train", lambda leagues, mode, force_search: calls.append(('train', leagues)))
+    monkeypatch.setattr(pipeline, "refresh_snapshot", lambda league: calls.append(('snapshot', league)))
+    return prints, calls
+
+
+def test_run_pipeline_only_works_when_something_changed(tmp_path, fake_league):
+    prints, calls = fake_league
+    state_path = str(tmp_path / "pipeline_state.json")
+    run = lambda: run_pipeline(['SP1'], download=False, state_path=state_path)
+
+    changed, plan, _ = run()
+    assert changed and plan == {'SP1': 'train'} and calls == [('train', ['SP1'])]
+    with open(state_path) as f:
+        assert json.load(f) == {'SP1': DATA}
+
+    changed, plan, timings = run()
+    assert not changed and plan == {'SP1': 'skip'} and len(calls) == 1
+    assert [name for name, _ in timings] == ['fingerprint', 'total']
+
+    prints['SP1']['fixtures'] = 'f2'
+    changed, plan, _ = run()
+    assert changed and plan == {'SP1': 'snapshot'} and calls[-1] == ('snapshot', 'SP1')
+    assert run()[1] == {'SP1': 'skip'}   # La huella nueva quedó guardada
+
+
+def test_persist_downloads_verifies_state_only_on_request(tmp_path, monkeypatch):
+    history = tmp_path / "history.csv"
+    history.write_text("date,home_team,away_team,home_score,away_score\n2024-08-16,Alaves,Cadiz,1,0\n")
+    paths = {'history': str(history), 'fixtures': str(tmp_path / "missing.csv"), 'state': str(tmp_path / "state.csv")}
+    verified = []
+    monkeypatch.setattr(pipeline, "league_paths", lambda league: paths)
+    monkeypatch.setattr(pipeline, "persist_league", lambda league, df: None)
+    monkeypatch.setattr(match_db, "store", lambda *args: None)
+    monkeypatch.setattr(feature_eng, "verify_team_state", lambda df, state_path: verified.append(state_path))
+
+    pipeline.persist_downloads(['SP1'])
+    assert verified == []
+    pipeline.persist_downloads(['SP1'], verify_state=True)
+    assert verified == [paths['state']]
+
+
+def test_github_output(tmp_path):
+    path = tmp_path / "github_output"
+    write_github_output(True, str(path))
+    write_github_output(False, str(path))
+    assert path.read_text() == "changed=true\nchanged=false\n"
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import profiling
+from profiling import load_records, profiled, stage, summarize
+
+
+@pytest.fixture
+def profile_path(tmp_path, monkeypatch):
+    """Instrumentación activada escribiendo en tmp_path (se restaura al acabar)."""
+    path = str(tmp_path / "profiles" / "stages.jsonl")
+    for key, value in {'enabled': True, 'cprofile': False, 'memory': True, 'path': path}.items():
+        monkeypatch.setitem(profiling._CONFIG, key, value)
+    return path
+
+
+def test_disabled_writes_nothing(tmp_path, monkeypatch):
+    path = str(tmp_path / "stages.jsonl")
+    monkeypatch.setitem(profiling._CONFIG, 'enabled', False)
+    monkeypatch.setitem(profiling._CONFIG, 'path', path)
+    with stage("quiet") as s:
+        s.rows = 5
+    assert profiled("quiet")(lambda: 1)() == 1
+    assert load_records(path).empty
+
+
+def test_nested_stages_write_one_json_line_each(profile_path):
+    with stage("outer", league="SP1") as outer:
+        with stage("inner") as inner:
+            block = np.ones(1_000_000)  # ~8 MB
+            inner.rows = len(block)
+        del block
+        outer.rows = 3
+    records = load_records(profile_path).set_index('stage')
+    assert list(records.index) == ['inner', 'outer']   # Se escribe al cerrar cada etapa
+    assert records.loc['inner', 'parent'] == 'outer' and pd.isna(records.loc['outer', 'parent'])
+    assert records.loc['inner', 'rows'] == 1_000_000 and records.loc['outer', 'rows'] == 3
+    assert records.loc['outer', 'league'] == 'SP1'
+    # El pico de la etapa interior también cuenta para la exterior
+    assert records.loc['inner', 'peak_mb'] >= 7.5 and records.loc['outer', 'peak_mb'] >= 7.5
+    assert records['ok'].all() and (records['wall_s'] >= 0).all()
+
+
+def test_failed_stage_is_recorded(profile_path):
+    with pytest.raises(ValueError):
+        with stage("broken"):
+            raise ValueError("boom")
+    assert not load_records(profile_path).iloc[0]['ok']
+
+
+def test_profiled_counts_rows_and_summarizes(profile_path):
+    @profiled("build")
+    def build(n):
+        return pd.DataFrame({'x': range(n)}), "extra"
+
+    for n in (3, 7):
+        assert len(build(n)[0]) == n
+    summary = summarize(profile_path)
+    assert summary.loc['build', 'runs'] == 2 and summary.loc['build', 'rows_last'] == 7
+
+
+def test_cprofile_dump_per_outer_stage(profile_path, monkeypatch):
+    monkeypatch.setitem(profiling._CONFIG, 'cprofile', True)
+    with stage("outer"):
+        with stage("inner"):
+            sum(range(1000))
+    records = load_records(profile_path).set_index('stage')
+    assert pd.isna(records.loc['inner', 'cprofile'])   # Solo un cProfile a la vez
+    assert records.loc['outer', 'cprofile'].endswith(".prof")
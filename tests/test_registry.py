@@ -0,0 +1,92 @@
+import json
+import os
+
+import joblib
+import pytest
+
+import registry
+from registry import (ModelCache, active_version, list_versions, load_version, prune_versions,
+                      register_model, versions_table)
+
+
+# --- CACHÉ LRU ACOTADA POR BYTES ---
+def loader(name, size, calls):
+    def load():
+        calls.append(name)
+        return name, size
+    return load
+
+
+def test_cache_hits_and_lru_eviction():
+    cache, calls = ModelCache(max_bytes=100), []
+    assert cache.get('a', loader('a', 40, calls)) == 'a'
+    assert cache.get('b', loader('b', 40, calls)) == 'b'
+    assert cache.get('a', loader('a', 40, calls)) == 'a'          # Acierto: 'a' pasa a ser la más reciente
+    assert (cache.hits, cache.misses, calls) == (1, 2, ['a', 'b'])
+
+    cache.get('c', loader('c', 40, calls))                          # No cabe: sale 'b' (la menos usada)
+    assert list(cache.entries) == ['a', 'c'] and cache.total == 80
+    cache.get('b', loader('b', 40, calls))
+    assert calls == ['a', 'b', 'c', 'b'] and list(cache.entries) == ['c', 'b']
+
+
+def test_cache_keeps_an_oversized_model_alone():
+    cache, calls = ModelCache(max_bytes=100), []
+    cache.get('small', loader('small', 10, calls))
+    assert cache.get('huge', loader('huge', 500, calls)) == 'huge'
+    assert list(cache.entries) == ['huge'] and cache.total == 500
+
+
+def test_cache_discard_drops_every_kind_of_a_version():
+    cache, calls = ModelCache(max_bytes=1000), []
+    for key in [('SP1', 'v1', 'compiled'), ('SP1', 'v1', 'pickle'), ('SP1', 'v2', 'compiled')]:
+        cache.get(key, loader(key, 10, calls))
+    cache.discard('SP1', 'v1')
+    assert list(cache.entries) == [('SP1', 'v2', 'compiled')] and cache.total == 10
+
+
+# --- VERSIONES EN DISCO ---
+@pytest.fixture
+def data_root(tmp_path, monkeypatch):
+    """Registro en tmp_path (nunca en data/models del repo)."""
+    monkeypatch.setattr(registry, "DATA_ROOT", str(tmp_path / "data"))
+    return tmp_path
+
+
+def make_model(path, value):
+    joblib.dump({'weights': value}, path)
+    return str(path)
+
+
+def test_register_model_dedups_same_pickle(data_root):
+    model_path = make_model(data_root / "model.pkl", 1)
+    version = register_model(model_path, None, {'mode': 'fast', 'log_loss': 0.98})
+    assert register_model(model_path, None, {'mode': 'fast'}) == version
+    assert list_versions() == [version] and active_version() == version
+    assert versions_table()['log_loss'].tolist() == [0.98]
+
+    other = register_model(make_model(data_root / "model.pkl", 2), None, {'mode': 'fast'}, activate=False)
+    assert list_versions() == sorted([version, other]) and active_version() == version
+
+
+def test_load_version_goes_through_cache(data_root):
+    version = register_model(make_model(data_root / "model.pkl", 7), None, {'mode': 'fast'})
+    cache = ModelCache()
+    assert load_version(version=version, cache=cache) == {'weights': 7}   # Sin compilado: pickle
+    assert load_version(cache=cache) is load_version(version=version, cache=cache)  # La activa
+    assert (cache.hits, cache.misses) == (2, 1)
+    with pytest.raises(FileNotFoundError):
+        load_version("E0", cache=cache)
+
+
+def test_prune_keeps_newest_and_active(data_root):
+    base = registry.registry_dir()
+    versions = [f"2026010{day}T000000_hash{day}" for day in range(1, 6)]
+    for version in versions:
+        os.makedirs(os.path.join(base, version))
+        with open(os.path.join(base, version, "meta.json"), 'w') as f:
+            json.dump({'mode': 'fast'}, f)
+    registry._set_active("SP1", versions[0])
+
+    assert prune_versions(keep=2) == versions[1:3]
+    assert list_versions() == [versions[0]] + versions[3:]
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulator import DEFAULT_RATES, base_rates, build_season, simulate_season, summarize_simulation
+from storage import save_history
+
+A, B, C, D = 'Alaves', 'Almeria', 'Barcelona', 'Cadiz'
+
+
+def make_fixtures():
+    # Jornada 1 jugada; jornadas 2 y 3 pendientes
+    rows = [(1, A, B, 'FINISHED', '2-0'), (1, C, D, 'FINISHED', '1-1'),
+            (2, A, C, 'SCHEDULED', None), (2, B, D, 'SCHEDULED', None),
+            (3, A, D, 'SCHEDULED', None), (3, B, C, 'SCHEDULED', None)]
+    return pd.DataFrame(rows, columns=['matchday', 'home_team', 'away_team', 'status', 'real_result'])
+
+
+def make_predictions(p):
+    pending = make_fixtures().iloc[2:]
+    return pending[['matchday', 'home_team', 'away_team']].assign(p1=p[0], pX=p[1], p2=p[2])
+
+
+def test_build_season_splits_played_and_pending():
+    season = build_season(make_fixtures(), make_predictions((0.5, 0.3, 0.2)).iloc[:3])
+    points = dict(zip(season['teams'], season['base_points']))
+    assert points == {A: 3, B: 0, C: 1, D: 1}
+    assert dict(zip(season['teams'], season['base_gd'])) == {A: 2, B: -2, C: 0, D: 0}
+    assert season['n_played'] == 2 and len(season['probs']) == 4
+    # El último partido no tiene predicción: tasas base normalizadas
+    np.testing.assert_allclose(season['probs'][:3], [[0.5, 0.3, 0.2]] * 3)
+    np.testing.assert_allclose(season['probs'][3], np.array(DEFAULT_RATES) / sum(DEFAULT_RATES))
+
+
+def test_certain_results_give_exact_table():
+    # Gana siempre el local: A y B ganan sus dos partidos en casa; C y D se quedan con 1 punto
+    season = build_season(make_fixtures(), make_predictions((1.0, 0.0, 0.0)))
+    table = summarize_simulation(season, *simulate_season(season, n_sims=500, seed=1)).set_index('team')
+    assert table['exp_points'].to_dict() == {A: 9.0, B: 6.0, C: 1.0, D: 1.0}
+    assert table.loc[A, 'p_title'] == 1.0 and table.loc[B, 'exp_position'] == 2.0
+    # C y D empatan a puntos y diferencia de goles: el desempate es al azar
+    assert table.loc[C, 'exp_position'] == pytest.approx(3.5, abs=0.1)
+
+
+def test_simulation_is_reproducible_and_normalized():
+    season = build_season(make_fixtures(), make_predictions((0.45, 0.25, 0.30)))
+    positions, points = simulate_season(season, n_sims=2_000, seed=7)
+    again, _ = simulate_season(season, n_sims=2_000, seed=7)
+    np.testing.assert_array_equal(positions, again)
+    assert (positions.sum(axis=0) == 2_000).all() and (positions.sum(axis=1) == 2_000).all()
+    assert (points.sum(axis=1) == 2_000).all()
+
+
+def test_workers_split_the_simulations():
+    season = build_season(make_fixtures(), make_predictions((0.45, 0.25, 0.30)))
+    positions, _ = simulate_season(season, n_sims=1_001, workers=2, seed=7)
+    assert (positions.sum(axis=0) == 1_001).all()
+
+
+def test_base_rates_from_history(tmp_path):
+    path = str(tmp_path / "history.csv")
+    history = pd.DataFrame({'date': pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04"]),
+                            'home_team': [A, B, C, D], 'away_team': [B, C, D, A],
+                            'home_score': [2, 1, 0, 0], 'away_score': [0, 1, 1, 3]})
+    save_history(history, path)
+    np.testing.assert_allclose(base_rates(path), [0.25, 0.25, 0.5])
+    np.testing.assert_allclose(base_rates(None), DEFAULT_RATES)
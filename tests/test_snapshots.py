@@ -0,0 +1,74 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+import snapshots
+from snapshots import (SNAPSHOT_COLUMNS, freeze_started_matches, load_latest_snapshot, prune_snapshots,
+                       result_codes, snapshot_name, snapshot_paths, write_snapshot)
+
+NOW = datetime.now(timezone.utc)
+
+
+def make_snapshot(p1, model_hash, generated_at="2026-01-01T00:00:00+00:00"):
+    """Dos partidos: uno ya jugado (ayer) y otro por jugar (mañana)."""
+    dates = [(NOW - timedelta(days=1)).isoformat(), (NOW + timedelta(days=1)).isoformat()]
+    return pd.DataFrame({
+        'matchday': [1, 2], 'home_team': ['A', 'C'], 'away_team': ['B', 'D'], 'utc_date': dates,
+        'p1': [p1, p1], 'pX': [0.3, 0.3], 'p2': [0.7 - p1, 0.7 - p1], 'pred': ['1', '1'],
+        'pre_kickoff': [False, True], 'generated_at': generated_at,
+        'model_hash': model_hash, 'data_hash': 'd',
+    })
+
+
+def test_freeze_started_matches_keeps_previous_prediction():
+    previous = make_snapshot(0.6, 'old', generated_at="2025-12-01T00:00:00+00:00")
+    fresh = freeze_started_matches(make_snapshot(0.4, 'new'), previous)
+    assert fresh.loc[0, 'p1'] == 0.6 and fresh.loc[0, 'model_hash'] == 'old'   # Ya empezó: congelado
+    assert fresh.loc[1, 'p1'] == 0.4 and fresh.loc[1, 'model_hash'] == 'new'   # Por jugar: nuevo
+    assert fresh.loc[0, 'generated_at'] == "2025-12-01T00:00:00+00:00"
+
+
+def test_freeze_without_previous_is_noop():
+    fresh = make_snapshot(0.4, 'new')
+    pd.testing.assert_frame_equal(freeze_started_matches(fresh.copy(), None), fresh)
+
+
+def test_result_codes():
+    assert list(result_codes(['2-1', '0-0', '0-3', None, 'aplazado'])) == ['1', 'X', '2', None, None]
+
+
+def test_write_snapshot_dedups_same_model_and_data(tmp_path, monkeypatch):
+    fixtures, history = tmp_path / "fixtures.csv", tmp_path / "history.csv"
+    fixtures.write_text("x\n1\n")
+    history.write_text("y\n2\n")
+    snapshot_dir = str(tmp_path / "predictions")
+    built = []
+
+    def fake_build(model, fixtures_path, history_path, model_hash, state_path):
+        built.append(model_hash)
+        return make_snapshot(0.5 if model_hash == 'm1' else 0.2, model_hash)
+
+    monkeypatch.setattr(snapshots, "build_snapshot", fake_build)
+    kwargs = dict(snapshot_dir=snapshot_dir, fixtures_path=str(fixtures), history_path=str(history))
+
+    first = write_snapshot(None, 'm1', **kwargs)
+    assert write_snapshot(None, 'm1', **kwargs) == first   # Mismo modelo y datos: sin versión nueva
+    assert built == ['m1'] and len(snapshot_paths(snapshot_dir)) == 1
+
+    # Otro modelo: fichero nuevo con el partido ya jugado congelado
+    monkeypatch.setattr(snapshots, "snapshot_name", lambda m, d: snapshot_name(m, d, stamp="99991231T000000"))
+    second = write_snapshot(None, 'm2', **kwargs)
+    assert second != first and len(snapshot_paths(snapshot_dir)) == 2
+    latest = load_latest_snapshot(snapshot_dir).reset_index(drop=True)
+    assert list(latest.columns) == SNAPSHOT_COLUMNS
+    assert list(latest['model_hash']) == ['m1', 'm2']
+    assert latest.attrs['hashes'][0] == 'm2'
+
+
+def test_prune_snapshots_keeps_most_recent(tmp_path):
+    for day in range(1, 6):
+        (tmp_path / snapshot_name('m', 'd', stamp=f"202601{day:02d}T000000")).write_text("matchday\n")
+    removed = prune_snapshots(str(tmp_path), keep=2)
+    assert [os.path.basename(p)[12:20] for p in removed] == ['20260101', '20260102', '20260103']
+    assert [os.path.basename(p)[12:20] for p in snapshot_paths(str(tmp_path))] == ['20260104', '20260105']
@@ -0,0 +1,90 @@
+import os
+
+import pandas as pd
+import pytest
+
+import stage_cache
+from benchmark import generate_synthetic_league
+from feature_eng import prepare_data
+from stage_cache import cache_entries, cached, evict, stage_key
+from storage import save_history
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    """Contadores de aciertos/fallos limpios para cada test."""
+    counters = {'hits': 0, 'misses': 0}
+    monkeypatch.setattr(stage_cache, "CACHE_STATS", counters)
+    return counters
+
+
+def counting(value):
+    calls = []
+    def compute():
+        calls.append(1)
+        return value
+    return compute, calls
+
+
+def test_hit_after_miss(tmp_path, stats):
+    compute, calls = counting(pd.DataFrame({'x': [1, 2]}))
+    first = cached("stage", "k1", compute, cache_dir=str(tmp_path), enabled=True)
+    second = cached("stage", "k1", compute, cache_dir=str(tmp_path), enabled=True)
+    pd.testing.assert_frame_equal(first, second)
+    assert len(calls) == 1 and stats == {'hits': 1, 'misses': 1}
+    cached("stage", "k2", compute, cache_dir=str(tmp_path), enabled=True)  # Otra clave: se calcula
+    assert len(calls) == 2 and len(cache_entries(str(tmp_path))) == 2
+
+
+def test_disabled_never_touches_disk(tmp_path, stats):
+    compute, calls = counting(1)
+    for _ in range(2):
+        cached("stage", "k", compute, cache_dir=str(tmp_path), enabled=False)
+    assert len(calls) == 2 and cache_entries(str(tmp_path)) == [] and stats['misses'] == 0
+
+
+def test_unreadable_entry_is_recomputed(tmp_path, stats):
+    (tmp_path / "stage_k.pkl").write_bytes(b"no es un pickle")
+    compute, calls = counting(42)
+    assert cached("stage", "k", compute, cache_dir=str(tmp_path), enabled=True) == 42
+    assert cached("stage", "k", compute, cache_dir=str(tmp_path), enabled=True) == 42
+    assert len(calls) == 1
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    for i, name in enumerate(["old", "mid", "new"]):
+        path = tmp_path / f"{name}.pkl"
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (1_000 + i, 1_000 + i))
+    # Leer "old" la convierte en la más reciente
+    os.utime(tmp_path / "old.pkl", (2_000, 2_000))
+    assert evict(str(tmp_path), max_bytes=200) == 1
+    assert sorted(os.listdir(tmp_path)) == ["new.pkl", "old.pkl"]
+    assert evict(str(tmp_path), max_bytes=200) == 0
+
+
+def test_stage_key_depends_on_inputs_and_params():
+    assert stage_key("rolling", "data1", window=5) == stage_key("rolling", "data1", window=5)
+    assert stage_key("rolling", "data1", window=5) != stage_key("rolling", "data1", window=10)
+    assert stage_key("rolling", "data1", window=5) != stage_key("rolling", "data2", window=5)
+
+
+def test_prepare_data_cache_matches_uncached(tmp_path, stats):
+    csv_path, cache_dir = str(tmp_path / "history.csv"), str(tmp_path / "cache")
+    history = generate_synthetic_league(n_teams=6, n_seasons=2, seed=5)
+    save_history(history, csv_path)
+    fresh = prepare_data(csv_path, cache=False)
+    cold = prepare_data(csv_path, cache=True, cache_dir=cache_dir)
+    warm = prepare_data(csv_path, cache=True, cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(cold, fresh)
+    pd.testing.assert_frame_equal(warm, fresh)
+    assert stats['hits'] == 1   # Caliente: solo se lee el cruce final
+
+    # Otra ventana: el descanso y el H2H siguen en la caché, las medias móviles no
+    misses = stats['misses']
+    prepare_data(csv_path, cache=True, cache_dir=cache_dir, window=3)
+    assert stats['misses'] == misses + 2 and stats['hits'] == 3
+
+    # Datos nuevos: todo se recalcula
+    save_history(history.iloc[:-5], csv_path)
+    assert len(prepare_data(csv_path, cache=True, cache_dir=cache_dir)) < len(fresh)
@@ -0,0 +1,92 @@
+import json
+
+from leagues import recent_seasons
+from stats_scraper import build_session, download_season, raw_cache_paths
+
+SEASON_CSV = b"Date,HomeTeam,AwayTeam,FTHG,FTAG\n15/08/2025,Girona,Rayo Vallecano,1,3\n"
+FULL_SEASON_CSV = SEASON_CSV + b"24/05/2026,Sevilla,Betis,2,2\n"
+
+
+def _read_meta(url, raw_dir):
+    with open(raw_cache_paths(url, raw_dir)[1]) as f:
+        return json.load(f)
+
+
+def test_current_season_uses_etag_and_304(http_server, tmp_path):
+    url = f"{http_server.url}/mmz4281/{recent_seasons(1)[0]}/SP1.csv"
+    raw_dir = str(tmp_path / "raw")
+    session = build_session(pool_size=1)
+
+    # Primera descarga: se guarda el CSV y su ETag en data/raw/
+    http_server.reply(200, {"ETag": '"v1"', "Last-Modified": "Sat, 16 Aug 2025 10:00:00 GMT"}, SEASON_CSV)
+    assert download_season(url, session, raw_dir=raw_dir) == SEASON_CSV
+    assert _read_meta(url, raw_dir)["etag"] == '"v1"'
+
+    # La temporada en curso nunca está cerrada: GET condicional, 304 y se usa la caché
+    http_server.reply(304)
+    assert download_season(url, session, raw_dir=raw_dir) == SEASON_CSV
+    headers = http_server.seen[-1][1]
+    assert headers["If-None-Match"] == '"v1"'
+    assert headers["If-Modified-Since"] == "Sat, 16 Aug 2025 10:00:00 GMT"
+    assert len(http_server.seen) == 2
+
+
+def test_closed_season_cached_after_its_end_is_not_requested(http_server, tmp_path):
+    url = f"{http_server.url}/mmz4281/2021/SP1.csv"
+    raw_dir = str(tmp_path / "raw")
+    session = build_session(pool_size=1)
+
+    http_server.reply(200, {"ETag": '"v1"'}, FULL_SEASON_CSV)
+    download_season(url, session, raw_dir=raw_dir)
+    assert download_season(url, session, raw_dir=raw_dir) == FULL_SEASON_CSV
+    assert len(http_server.seen) == 1
+
+
+def test_season_cached_mid_season_is_revalidated_once(http_server, tmp_path):
+    url = f"{http_server.url}/mmz4281/2021/SP1.csv"
+    raw_dir = str(tmp_path / "raw")
+    session = build_session(pool_size=1)
+
+    # Caché de marzo de 2021 (temporada a medias): tras el cambio de temporada se comprueba
+    http_server.reply(200, {"ETag": '"v1"'}, SEASON_CSV)
+    download_season(url, session, raw_dir=raw_dir)
+    meta = {**_read_meta(url, raw_dir), "fetched_at": "2021-03-01"}
+    with open(raw_cache_paths(url, raw_dir)[1], "w") as f:
+        json.dump(meta, f)
+
+    http_server.reply(200, {"ETag": '"v2"'}, FULL_SEASON_CSV)
+    assert download_season(url, session, raw_dir=raw_dir) == FULL_SEASON_CSV
+    assert http_server.seen[-1][1]["If-None-Match"] == '"v1"'
+    # Ya comprobada después del cierre: no se vuelve a pedir
+    assert download_season(url, session, raw_dir=raw_dir) == FULL_SEASON_CSV
+    assert len(http_server.seen) == 2
+
+
+def test_old_cache_without_date_is_revalidated_with_304(http_server, tmp_path):
+    url = f"{http_server.url}/mmz4281/2021/SP1.csv"
+    raw_dir = str(tmp_path / "raw")
+    session = build_session(pool_size=1)
+
+    http_server.reply(200, {"ETag": '"v1"'}, FULL_SEASON_CSV)
+    download_season(url, session, raw_dir=raw_dir)
+    meta = _read_meta(url, raw_dir)
+    del meta["fetched_at"]  # Caché de antes de guardar la fecha
+    with open(raw_cache_paths(url, raw_dir)[1], "w") as f:
+        json.dump(meta, f)
+
+    http_server.reply(304)
+    assert download_season(url, session, raw_dir=raw_dir) == FULL_SEASON_CSV
+    assert download_season(url, session, raw_dir=raw_dir) == FULL_SEASON_CSV
+    assert len(http_server.seen) == 2
+
+
+def test_download_season_keeps_cache_on_error(http_server, tmp_path):
+    url = f"{http_server.url}/mmz4281/{recent_seasons(1)[0]}/SP1.csv"
+    raw_dir = str(tmp_path / "raw")
+    session = build_session(pool_size=1)
+
+    http_server.reply(200, {"ETag": '"v1"'}, SEASON_CSV)
+    download_season(url, session, raw_dir=raw_dir)
+    # Un 404 (sin reintentos) no borra lo que ya teníamos
+    http_server.reply(404)
+    assert download_season(url, session, raw_dir=raw_dir) == SEASON_CSV
@@ -0,0 +1,52 @@
+import os
+
+import pandas as pd
+import pyarrow.feather as feather
+
+from benchmark import generate_synthetic_matches
+from storage import HISTORY_SCHEMA, SOURCE_KEY, columnar_path, csv_fingerprint, load_history, save_history
+
+
+def _saved_history(tmp_path, n_matches=50):
+    csv_path = str(tmp_path / "history.csv")
+    typed = save_history(generate_synthetic_matches(n_matches, seed=1), csv_path)
+    return csv_path, typed
+
+
+def test_round_trip_keeps_schema(tmp_path):
+    csv_path, typed = _saved_history(tmp_path)
+    loaded = load_history(csv_path)
+    pd.testing.assert_frame_equal(loaded, typed)
+    assert loaded['home_score'].dtype == HISTORY_SCHEMA['home_score']
+    assert isinstance(loaded['home_team'].dtype, pd.CategoricalDtype)
+    meta = feather.read_table(columnar_path(csv_path)).schema.metadata
+    assert SOURCE_KEY in meta
+
+
+def test_feather_ignored_when_csv_changes_with_same_size(tmp_path):
+    csv_path, typed = _saved_history(tmp_path)
+    # Mismo tamaño, otro contenido (p. ej. un resultado corregido en un git pull)
+    df = pd.read_csv(csv_path)
+    old_score = int(df.loc[0, 'home_score'])
+    df.loc[0, 'home_score'] = (old_score + 1) % 10
+    size = csv_fingerprint(csv_path)['size']
+    df.to_csv(csv_path, index=False)
+    assert csv_fingerprint(csv_path)['size'] == size
+
+    loaded = load_history(csv_path)
+    assert loaded.loc[0, 'home_score'] == (old_score + 1) % 10
+
+
+def test_feather_without_fingerprint_falls_back_to_csv(tmp_path):
+    csv_path, typed = _saved_history(tmp_path)
+    # .feather antiguo (sin huella) con datos que ya no son los del CSV
+    stale = typed.assign(home_score=typed['home_score'] + 1)
+    feather.write_feather(stale, columnar_path(csv_path), compression='uncompressed')
+    pd.testing.assert_frame_equal(load_history(csv_path), typed)
+
+
+def test_feather_only(tmp_path):
+    csv_path, typed = _saved_history(tmp_path)
+    os.remove(csv_path)
+    pd.testing.assert_frame_equal(load_history(csv_path), typed)
+    assert load_history(str(tmp_path / "missing.csv")).empty
@@ -0,0 +1,78 @@
+import os
+
+import pandas as pd
+
+from benchmark import generate_synthetic_fixtures, generate_synthetic_league
+from feature_eng import (load_match_history, prepare_matchups, prepare_upcoming_matches,
+                         sync_team_state, verify_team_state)
+from storage import save_history
+from teams import TEAMS, canonical_teams, quiet_unknown_teams, resolve_team_ids, temporary_team_ids
+
+
+def test_registered_teams_keep_their_index():
+    assert list(resolve_team_ids(["Barcelona", "Real Madrid"])) == [TEAMS.index("Barcelona"), TEAMS.index("Real Madrid")]
+    assert list(canonical_teams(["Barcelona"]).categories) == TEAMS
+
+
+def test_unregistered_ids_are_stable_across_calls(team_ids_path):
+    with quiet_unknown_teams():
+        first = dict(zip(["Zeta FC", "Alpha FC"], resolve_team_ids(["Zeta FC", "Alpha FC"])))
+        # Otro lote (con un equipo nuevo que ordena antes) no cambia los IDs ya dados
+        second = dict(zip(["Aaa FC", "Zeta FC"], resolve_team_ids(["Aaa FC", "Zeta FC"])))
+    assert second["Zeta FC"] == first["Zeta FC"]
+    assert len({*first.values(), second["Aaa FC"]}) == 3
+    assert min(first.values()) >= len(TEAMS)
+
+    # Persisten en disco: otro proceso (caché en memoria vacía) lee los mismos IDs
+    import teams
+    teams._EXTRA.update(path=None, names=[])
+    with quiet_unknown_teams():
+        assert resolve_team_ids(["Alpha FC"])[0] == first["Alpha FC"]
+    assert len(pd.read_csv(team_ids_path)) == 3
+
+
+def test_promoted_team_is_predicted(tmp_path):
+    # Liga sin registrar: 'L1 Team 00' baja en la 2ª temporada y sube 'L1 Team 20';
+    # en la 3ª vuelve 'L1 Team 00' y 'L1 Team 05' pasa a ser 'L1 Team 21'.
+    h = generate_synthetic_league(n_teams=20, n_seasons=3, n_leagues=2, seed=1)
+    h = h[h["home_team"].str.startswith("L1")].reset_index(drop=True)
+    cols = ["home_team", "away_team"]
+    s2, s3 = h["date"] >= "2001-08-01", h["date"] >= "2002-08-01"
+    h.loc[s2, cols] = h.loc[s2, cols].replace("L1 Team 00", "L1 Team 20")
+    h.loc[s3, cols] = h.loc[s3, cols].replace({"L1 Team 20": "L1 Team 00", "L1 Team 05": "L1 Team 21"})
+
+    hist_path, state_path = str(tmp_path / "history.csv"), str(tmp_path / "state.csv")
+    with quiet_unknown_teams():
+        save_history(h, hist_path)
+        sync_team_state(load_match_history(hist_path), state_path=state_path)
+        # Próxima temporada: vuelve a subir 'L1 Team 20' (último partido hace un año)
+        fixtures = generate_synthetic_fixtures(h[s3])
+        fixtures[cols] = fixtures[cols].replace("L1 Team 21", "L1 Team 20")
+
+        X, meta = prepare_upcoming_matches(fixtures, hist_path, state_path=state_path)
+        assert len(X) == len(fixtures)
+        promoted = (meta["home_team"] == "L1 Team 20") | (meta["away_team"] == "L1 Team 20")
+        assert promoted.any()
+        assert X[promoted.to_numpy()].notna().all().all()
+
+        M, _ = prepare_matchups(fixtures[cols].assign(date=None), hist_path, state_path)
+        assert len(M) == len(fixtures)
+
+        # Estado incremental con equipos sin registrar == reconstrucción completa
+        full = load_match_history(hist_path)
+        incremental = str(tmp_path / "incremental.csv")
+        sync_team_state(full[full["date"] < "2002-10-01"].reset_index(drop=True), state_path=incremental)
+        sync_team_state(full, state_path=incremental)
+        assert verify_team_state(full, incremental)
+
+
+def test_temporary_team_ids_leave_the_registry_untouched(team_ids_path):
+    import teams
+    with temporary_team_ids() as scratch:
+        with quiet_unknown_teams():
+            resolve_team_ids(["Team 999"])
+        assert os.environ["LALIGA_TEAM_IDS"] == scratch
+        assert len(pd.read_csv(scratch)) == 1
+    assert teams.EXTRA_TEAMS_PATH == team_ids_path
+    assert "LALIGA_TEAM_IDS" not in os.environ
+    assert not os.path.exists(team_ids_path)